@@ -0,0 +1,134 @@
+"""Benchmark de extremo a extremo de `qliktabs.run_once` contra el sitio simulado `qlik_mock`.
+
+Arranca `qlik_mock` en local, apunta los jobs de `export_jobs.json` a él y ejecuta
+`run_once` varias veces con Chrome headless (perfil 'produccion'), sin caché de
+sesión ni subidas a Google Sheets. De cada ejecución se toma la traza de
+`trazas` y se resume por paso (media, mínimo y máximo entre repeticiones), de
+modo que cada cambio de rendimiento se puede comparar con la misma línea base:
+
+	python benchmark_e2e.py --repeticiones 3 --latencia export=1.0 --salida base.json
+	python benchmark_e2e.py --repeticiones 3 --latencia export=1.0 --comparar base.json
+
+Experimental: todavía no se ha ejecutado de extremo a extremo con un Chrome
+real y no hay línea base de referencia en el repositorio; la primera ejecución
+con navegador debe guardar la suya con `--salida`.
+"""
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import json
+import logging
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from dataclasses import fields
+from pathlib import Path
+
+import qlik_mock
+
+LOG = logging.getLogger(__name__)
+
+
+def _preparar_entorno(tmp: Path) -> None:
+	"""Variables de entorno de una ejecución aislada (se respetan las ya definidas)."""
+	os.environ.setdefault('QLIK_PERFIL', 'produccion')
+	os.environ['QLIK_SESSION_CACHE'] = '0'
+	os.environ['QLIK_INFORMES_DIR'] = str(tmp / 'informes')
+	os.environ['QLIK_SHEETS_SNAPSHOT'] = '0'
+	os.environ['QLIK_INCREMENTAL'] = '0'
+	# sin credenciales `_maybe_auto_upload` omite la subida; además se sube en el
+	# propio job, para que `run_once` no espere a la cola de subidas al cerrar
+	os.environ['GOOGLE_SERVICE_ACCOUNT_JSON'] = ''
+	os.environ['QLIK_SUBIDA_ASINCRONA'] = '0'
+
+
+def _jobs_contra_mock(qliktabs, url: str, tmp: Path, config: str | None):
+	return [
+		dataclasses.replace(j, base_url=url, output_json=str(tmp / Path(j.output_json).name))
+		for j in qliktabs.cargar_jobs(config)
+	]
+
+
+def agregar(ejecuciones: list[dict]) -> list[dict]:
+	"""Por paso: media, mínimo y máximo del tiempo total entre ejecuciones, y fallos."""
+	pasos: dict[str, dict] = {}
+	for ej in ejecuciones:
+		for fila in ej['resumen']:
+			p = pasos.setdefault(fila['paso'], {'paso': fila['paso'], 'totales': [], 'fallos': 0, 'reintentos': 0})
+			p['totales'].append(fila['total'])
+			p['fallos'] += fila['fallos']
+			p['reintentos'] += fila['reintentos']
+	filas = []
+	for p in pasos.values():
+		t = p.pop('totales')
+		filas.append(dict(p, media=round(statistics.mean(t), 3), min=round(min(t), 3), max=round(max(t), 3), n=len(t)))
+	return sorted(filas, key=lambda f: f['media'], reverse=True)
+
+
+def tabla(filas: list[dict], base: dict[str, float] | None = None) -> str:
+	lineas = ['%-28s %9s %9s %9s %6s %6s%s' % ('paso', 'media s', 'min s', 'max s', 'fallos', 'reint', '   base s   delta' if base else '')]
+	for f in filas:
+		extra = ''
+		if base:
+			b = base.get(f['paso'])
+			extra = '  %8s %+7.2f' % ('%.2f' % b, f['media'] - b) if b is not None else '  %8s %7s' % ('-', '-')
+		lineas.append('%-28s %9.2f %9.2f %9.2f %6d %6d%s' % (f['paso'][:28], f['media'], f['min'], f['max'], f['fallos'], f['reintentos'], extra))
+	return '\n'.join(lineas)
+
+
+def ejecutar(repeticiones: int, latencias: qlik_mock.Latencias, filas: int, config: str | None = None) -> dict:
+	"""Correr el benchmark y devolver {'latencias', 'ejecuciones', 'pasos'}."""
+	tmp = Path(tempfile.mkdtemp(prefix='qlik_bench_'))
+	_preparar_entorno(tmp)
+	import qliktabs  # después de fijar el entorno
+	ejecuciones = []
+	try:
+		with qlik_mock.QlikMock(latencias, filas=filas) as mock:
+			jobs = _jobs_contra_mock(qliktabs, mock.url, tmp, config)
+			for i in range(repeticiones):
+				inicio = time.perf_counter()
+				traza = qliktabs.run_once(jobs)
+				segundos = time.perf_counter() - inicio
+				informe = traza.informe() if traza is not None else {'resumen': [], 'tramos': []}
+				informe['resumen'].insert(0, {'paso': 'run_once', 'veces': 1, 'total': round(segundos, 3),
+					'media': round(segundos, 3), 'max': round(segundos, 3), 'fallos': 0, 'reintentos': 0, 'ramas': {}})
+				ejecuciones.append(informe)
+				LOG.info('Repetición %d/%d: %.2f s', i + 1, repeticiones, segundos)
+	finally:
+		shutil.rmtree(tmp, ignore_errors=True)
+	return {
+		'latencias': dataclasses.asdict(latencias),
+		'filas': filas,
+		'ejecuciones': ejecuciones,
+		'pasos': agregar(ejecuciones),
+	}
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description='Benchmark de run_once contra el sitio simulado de Qlik.')
+	parser.add_argument('--repeticiones', type=int, default=3)
+	parser.add_argument('--filas', type=int, default=2000, help='filas de cada .xlsx exportado')
+	parser.add_argument('--latencia', action='append', default=[], metavar='PASO=SEGUNDOS',
+		help='latencia de un paso del sitio (%s)' % ', '.join(f.name for f in fields(qlik_mock.Latencias)))
+	parser.add_argument('--jobs', help='fichero de jobs (por defecto el de qliktabs)')
+	parser.add_argument('--salida', help='guardar el resultado completo en este JSON')
+	parser.add_argument('--comparar', help='JSON de una ejecución anterior del benchmark para comparar medias')
+	args = parser.parse_args()
+	logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+	resultado = ejecutar(args.repeticiones, qlik_mock.Latencias.desde_textos(args.latencia), args.filas, args.jobs)
+	base = None
+	if args.comparar:
+		anterior = json.loads(Path(args.comparar).read_text(encoding='utf-8'))
+		base = {f['paso']: f['media'] for f in anterior.get('pasos', [])}
+	print(tabla(resultado['pasos'], base))
+	if args.salida:
+		Path(args.salida).write_text(json.dumps(resultado, ensure_ascii=False, indent=2), encoding='utf-8')
+		LOG.info('Resultado guardado en %s', args.salida)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,251 @@
+"""Microbenchmarks de las rutas de datos de cada exportación.
+
+Mide, sobre libros sintéticos con la forma de `exported_data.json` (KPIs por zona
+con formatos de porcentaje y moneda) y `exported_data_2.json` (serie diaria con
+ventas como `3.522.290,60`):
+
+- `extract_excel_contents` (lectura en streaming + `format_cell_display`)
+- `format_cell_display` celda a celda
+- `_sanitize_cell_value`
+- `construir_tabla_sheets` (mapeo de encabezados + transformación por columnas)
+- el volcado JSON (`_guardar_json`)
+
+Para cada caso y tamaño da el mejor tiempo, el throughput (filas/s) y el pico de
+memoria (tracemalloc, en una pasada aparte para no distorsionar el tiempo). Con
+`--guardar` se deja una línea base y con `--comparar` se falla (código 1) si algún
+caso pierde más de `--umbral` de throughput o gana más de `--umbral` de memoria:
+
+	python benchmark_micro.py --tamanos 10,1000,100000 --guardar micro_base.json
+	python benchmark_micro.py --tamanos 10,1000,100000 --comparar micro_base.json --umbral 0.2
+	python benchmark_micro.py --tamanos 1000000 --casos extraccion
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import io
+import json
+import logging
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import qliktabs
+
+LOG = logging.getLogger(__name__)
+
+ZONAS = ['BARRANQUILLA', 'CARTAGENA', 'MEDELLIN', 'BOGOTA NORTE', 'CALI', 'PEREIRA', 'BUCARAMANGA']
+MESES = ['Ene', 'Feb', 'Mar', 'Abr', 'May', 'Jun', 'Jul', 'Ago', 'Sep', 'Oct', 'Nov', 'Dic']
+
+FORMATO_MONEDA = '"$"#,##0'
+FORMATO_PORCENTAJE = '0.0%'
+FORMATO_DECIMAL = '#,##0.00'
+
+# (encabezado, formato) de cada columna; None = texto
+COLUMNAS_ZONAS = [
+	('Zona', None), ('Ventas 2025', FORMATO_MONEDA), ('Ventas 2026', FORMATO_MONEDA),
+	('Var. de Ventas', FORMATO_MONEDA), ('Crec. en Vta', FORMATO_PORCENTAJE),
+	('Ppto. Ventas', FORMATO_MONEDA), ('Cumplimiento', FORMATO_PORCENTAJE),
+	('Var. Ppto.', FORMATO_MONEDA), ('CostoVentas', FORMATO_PORCENTAJE),
+	('Ventas Coas', FORMATO_MONEDA), ('Part. Coas.', FORMATO_PORCENTAJE),
+]
+COLUMNAS_DIARIO = [('Día', None), ('Ventas', FORMATO_DECIMAL)]
+
+# Encabezados de las hojas de Google Sheets (sin la columna A de fecha), escritos
+# con variaciones de mayúsculas/acentos para ejercitar `mapear_encabezados`
+ENCABEZADOS_SHEET2 = ['ZONA', 'Ventas 2025', 'Ventas 2026', 'Var de Ventas', 'Crec en Vta', 'Ppto Ventas',
+	'Cumplimiento', 'Var Ppto', 'Costo Ventas', 'Ventas Coas', 'Part Coas']
+ENCABEZADOS_SHEET1 = ['Dia', 'Ventas']
+
+
+def _fila_zonas(i: int) -> list:
+	base = 5_000_000 + (i * 7919) % 4_000_000
+	return [
+		f'ZONA {ZONAS[i % len(ZONAS)]} {i // len(ZONAS)}', base * 1.03, base, -base * 0.03,
+		-0.032 + (i % 50) / 1000, base * 0.98, 0.963 + (i % 40) / 1000, base * 0.02,
+		0.689 + (i % 30) / 1000, base * 0.11, 0.11 + (i % 20) / 1000,
+	]
+
+
+def _fila_diario(i: int) -> list:
+	return [f'{i % 28 + 1:02d}_{MESES[i % 12]}_26', 3_522_290.60 + (i * 104729) % 1_000_000 / 100]
+
+
+FORMAS = {
+	'zonas': (COLUMNAS_ZONAS, _fila_zonas, ENCABEZADOS_SHEET2, 'Sheet2'),
+	'diario': (COLUMNAS_DIARIO, _fila_diario, ENCABEZADOS_SHEET1, 'Sheet1'),
+}
+
+
+def libro_sintetico(forma: str, filas: int) -> bytes:
+	"""Libro .xlsx en memoria con `filas` filas de la forma `forma` ('zonas' o 'diario')."""
+	from openpyxl import Workbook
+	from openpyxl.cell import WriteOnlyCell
+	columnas, generar, _, _ = FORMAS[forma]
+	wb = Workbook(write_only=True)
+	ws = wb.create_sheet('Sheet1')
+	ws.append([h for h, _ in columnas])
+	for i in range(filas):
+		fila = []
+		for (_, formato), valor in zip(columnas, generar(i)):
+			celda = WriteOnlyCell(ws, value=valor)
+			if formato:
+				celda.number_format = formato
+			fila.append(celda)
+		ws.append(fila)
+	buf = io.BytesIO()
+	wb.save(buf)
+	return buf.getvalue()
+
+
+class _Celda:
+	"""Celda mínima con lo que lee `format_cell_display` (como ReadOnlyCell)."""
+	__slots__ = ('value', 'number_format', 'data_type')
+
+	def __init__(self, value, number_format):
+		self.value = value
+		self.number_format = number_format or 'General'
+		self.data_type = 's' if isinstance(value, str) else 'n'
+
+
+def _preparar(forma: str, filas: int) -> dict:
+	"""Entradas de todos los casos de una forma y tamaño (fuera de la medición)."""
+	columnas, generar, encabezados, hoja = FORMAS[forma]
+	xlsx = libro_sintetico(forma, filas)
+	rows = qliktabs.extract_excel_contents(io.BytesIO(xlsx))['Sheet1']
+	celdas = [_Celda(v, f) for i in range(filas) for (_, f), v in zip(columnas, generar(i))]
+	textos = [v for r in rows for v in r.values()]
+	return {'xlsx': xlsx, 'rows': rows, 'celdas': celdas, 'textos': textos, 'encabezados': encabezados, 'hoja': hoja}
+
+
+CASOS = ('extraccion', 'formato', 'sanitizado', 'tabla_sheets', 'volcado_json')
+
+
+def _casos(forma: str, datos: dict, tmp: Path) -> dict:
+	destino = tmp / f'{forma}.json'
+	fecha = datetime.now().strftime('%Y-%m-%d')
+
+	def extraccion():
+		qliktabs.extract_excel_contents(io.BytesIO(datos['xlsx']))
+
+	def formato():
+		for c in datos['celdas']:
+			qliktabs.format_cell_display(c)
+
+	def sanitizado():
+		for v in datos['textos']:
+			qliktabs._sanitize_cell_value(v)
+
+	def tabla_sheets():
+		qliktabs.construir_tabla_sheets(datos['rows'], datos['encabezados'], datos['hoja'], fecha)
+
+	def volcado_json():
+		qliktabs._guardar_json({'Sheet1': datos['rows']}, str(destino))
+
+	return {'extraccion': extraccion, 'formato': formato, 'sanitizado': sanitizado,
+		'tabla_sheets': tabla_sheets, 'volcado_json': volcado_json}
+
+
+def medir(fn, filas: int, minimo: float = 0.2, max_repeticiones: int = 50) -> dict:
+	"""Mejor tiempo de `fn` (repitiendo hasta sumar `minimo` s) y pico de memoria aparte."""
+	tiempos = []
+	total = 0.0
+	while total < minimo and len(tiempos) < max_repeticiones:
+		gc.collect()
+		inicio = time.perf_counter()
+		fn()
+		t = time.perf_counter() - inicio
+		tiempos.append(t)
+		total += t
+	gc.collect()
+	tracemalloc.start()
+	try:
+		fn()
+		_, pico = tracemalloc.get_traced_memory()
+	finally:
+		tracemalloc.stop()
+	mejor = min(tiempos)
+	return {
+		'filas': filas,
+		'segundos': round(mejor, 6),
+		'filas_s': round(filas / mejor, 1) if mejor > 0 else None,
+		'pico_mb': round(pico / 2**20, 3),
+		'repeticiones': len(tiempos),
+	}
+
+
+def ejecutar(tamanos: list[int], filtro: list[str] | None = None) -> dict:
+	"""Correr todos los casos y devolver {'<forma>.<caso>[<filas>]': medición}."""
+	resultados = {}
+	with tempfile.TemporaryDirectory(prefix='qlik_micro_') as d:
+		for forma in FORMAS:
+			for filas in tamanos:
+				claves = {caso: f'{forma}.{caso}[{filas}]' for caso in CASOS}
+				pendientes = [c for c in CASOS if not filtro or any(f in claves[c] for f in filtro)]
+				if not pendientes:
+					continue
+				LOG.info('Preparando %s con %d filas...', forma, filas)
+				casos = _casos(forma, _preparar(forma, filas), Path(d))
+				for caso in pendientes:
+					clave = claves[caso]
+					resultados[clave] = medir(casos[caso], filas)
+					LOG.info('%s: %s', clave, resultados[clave])
+	return resultados
+
+
+def comparar(resultados: dict, base: dict, umbral: float) -> list[str]:
+	"""Casos que empeoran más de `umbral` (fracción) en throughput o en memoria."""
+	regresiones = []
+	for clave, r in resultados.items():
+		b = base.get(clave)
+		if not b:
+			continue
+		if b.get('filas_s') and r.get('filas_s') and r['filas_s'] < b['filas_s'] * (1 - umbral):
+			regresiones.append(f"{clave}: throughput {r['filas_s']:.0f} filas/s frente a {b['filas_s']:.0f} de la base")
+		if b.get('pico_mb') and r['pico_mb'] > b['pico_mb'] * (1 + umbral) and r['pico_mb'] - b['pico_mb'] > 1.0:
+			regresiones.append(f"{clave}: memoria {r['pico_mb']:.1f} MB frente a {b['pico_mb']:.1f} MB de la base")
+	return regresiones
+
+
+def tabla(resultados: dict, base: dict | None = None) -> str:
+	lineas = ['%-36s %9s %11s %14s %9s%s' % ('caso', 'filas', 'segundos', 'filas/s', 'pico MB', '  vs base' if base else '')]
+	for clave, r in resultados.items():
+		extra = ''
+		if base and base.get(clave, {}).get('filas_s') and r.get('filas_s'):
+			extra = '  %+7.1f%%' % ((r['filas_s'] / base[clave]['filas_s'] - 1) * 100)
+		lineas.append('%-36s %9d %11.4f %14.0f %9.2f%s' % (clave, r['filas'], r['segundos'], r['filas_s'] or 0, r['pico_mb'], extra))
+	return '\n'.join(lineas)
+
+
+def main() -> int:
+	parser = argparse.ArgumentParser(description='Microbenchmarks de las rutas de datos de qliktabs.')
+	parser.add_argument('--tamanos', default='10,1000,100000', help='filas separadas por comas (hasta 1000000)')
+	parser.add_argument('--casos', help='sólo los casos cuyo nombre contenga alguno de estos textos (separados por comas)')
+	parser.add_argument('--guardar', help='guardar los resultados como línea base en este JSON')
+	parser.add_argument('--comparar', help='línea base JSON con la que comparar')
+	parser.add_argument('--umbral', type=float, default=0.2, help='empeoramiento tolerado (fracción, por defecto 0.2)')
+	args = parser.parse_args()
+	logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+	logging.getLogger('qliktabs').setLevel(logging.WARNING)
+
+	tamanos = [int(t) for t in args.tamanos.split(',') if t.strip()]
+	filtro = [c.strip() for c in args.casos.split(',')] if args.casos else None
+	resultados = ejecutar(tamanos, filtro)
+	base = json.loads(Path(args.comparar).read_text(encoding='utf-8')) if args.comparar else None
+	print(tabla(resultados, base))
+	if args.guardar:
+		Path(args.guardar).write_text(json.dumps(resultados, indent=2), encoding='utf-8')
+		LOG.info('Línea base guardada en %s', args.guardar)
+	if base is not None:
+		regresiones = comparar(resultados, base, args.umbral)
+		for r in regresiones:
+			LOG.error('Regresión: %s', r)
+		return 1 if regresiones else 0
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
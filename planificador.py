@@ -0,0 +1,331 @@
+"""Planificador de ejecuciones con expresiones tipo cron.
+
+Cada `Tarea` tiene una o varias expresiones cron de 5 campos (minuto, hora, día
+del mes, mes, día de la semana con 0 = domingo), un `timeout` de ejecución, un
+`plazo` (segundos de retraso con los que una franja todavía se puede empezar) y
+una política de recuperación de franjas perdidas:
+
+- 'ultima': de las franjas perdidas dentro del plazo se ejecuta sólo la última.
+- 'todas': se ejecuta una vez por cada franja perdida dentro del plazo.
+- 'ninguna': sólo se ejecutan las franjas a su hora (con `GRACIA` de margen).
+
+`Planificador` no duerme hasta la siguiente franja de una vez: despierta como
+mucho cada `intervalo_max` segundos y recalcula con el reloj de pared, de modo
+que una suspensión del equipo no desplaza el calendario. Nunca hay dos
+ejecuciones a la vez: las tareas que vencen juntas van en una misma ejecución
+(por prioridad) y las que vencen durante una ejecución esperan a que termine.
+El estado (última franja atendida y resultado de cada tarea) se guarda en JSON
+para recuperar las franjas perdidas tras un reinicio.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable
+
+LOG = logging.getLogger(__name__)
+
+POLITICAS = ('ultima', 'todas', 'ninguna')
+# retraso con el que una franja aún cuenta como "a su hora" (política 'ninguna')
+GRACIA = 120.0
+# franjas perdidas que se revisan como máximo por tarea
+MAX_FRANJAS = 1000
+
+_ALIAS = {
+	'@hourly': '0 * * * *',
+	'@daily': '0 0 * * *',
+	'@weekly': '0 0 * * 0',
+	'@monthly': '0 0 1 * *',
+}
+_CAMPOS = (('minuto', 0, 59), ('hora', 0, 23), ('día', 1, 31), ('mes', 1, 12), ('día de la semana', 0, 7))
+
+
+def _valores_campo(texto: str, nombre: str, minimo: int, maximo: int) -> frozenset[int]:
+	valores = set()
+	for parte in texto.split(','):
+		rango, _, paso = parte.partition('/')
+		try:
+			paso = int(paso) if paso else 1
+			if rango == '*':
+				ini, fin = minimo, maximo
+			elif '-' in rango:
+				ini, fin = (int(x) for x in rango.split('-', 1))
+			else:
+				ini = int(rango)
+				fin = maximo if paso > 1 else ini
+		except ValueError:
+			raise ValueError(f'campo {nombre} no válido: {texto!r}') from None
+		if paso < 1 or not minimo <= ini <= fin <= maximo:
+			raise ValueError(f'campo {nombre} fuera de rango ({minimo}-{maximo}): {texto!r}')
+		valores.update(range(ini, fin + 1, paso))
+	return frozenset(valores)
+
+
+class Cron:
+	"""Expresión cron de 5 campos (`*`, listas, rangos y pasos) o alias como `@daily`."""
+
+	def __init__(self, texto: str):
+		self.texto = texto.strip()
+		partes = _ALIAS.get(self.texto, self.texto).split()
+		if len(partes) != 5:
+			raise ValueError(f'expresión cron de 5 campos esperada: {texto!r}')
+		campos = [_valores_campo(p, *c) for p, c in zip(partes, _CAMPOS)]
+		self.minutos, self.horas, self.dias, self.meses = (sorted(c) for c in campos[:4])
+		self.dias_semana = frozenset(7 if d == 0 else d for d in campos[4])  # ISO: lunes=1 ... domingo=7
+		# como en cron: con día del mes y día de la semana restringidos basta con uno
+		self._dia_libre = partes[2] == '*'
+		self._semana_libre = partes[4] == '*'
+
+	def __repr__(self) -> str:
+		return f'Cron({self.texto!r})'
+
+	def _dia_valido(self, d: datetime) -> bool:
+		if d.month not in self.meses:
+			return False
+		en_mes, en_semana = d.day in self.dias, d.isoweekday() in self.dias_semana
+		if self._dia_libre or self._semana_libre:
+			return en_mes and en_semana
+		return en_mes or en_semana
+
+	def siguiente(self, despues: datetime) -> datetime:
+		"""Primera ocurrencia estrictamente posterior a `despues`."""
+		t = despues.replace(second=0, microsecond=0) + timedelta(minutes=1)
+		for _ in range(366 * 8):
+			if self._dia_valido(t):
+				for h in self.horas:
+					if h < t.hour:
+						continue
+					for m in self.minutos:
+						if h == t.hour and m < t.minute:
+							continue
+						return t.replace(hour=h, minute=m)
+			t = (t + timedelta(days=1)).replace(hour=0, minute=0)
+		raise ValueError(f'la expresión cron {self.texto!r} no tiene ocurrencias')
+
+
+@dataclass
+class Tarea:
+	"""Qué se ejecuta y cuándo: `cron` (una o varias expresiones), `timeout` y `plazo` en segundos."""
+	nombre: str
+	cron: list[str]
+	timeout: float | None = None
+	plazo: float | None = None
+	recuperar: str = 'ultima'
+	prioridad: int = 0
+	_crones: list[Cron] = field(init=False, repr=False, compare=False)
+
+	def __post_init__(self):
+		if isinstance(self.cron, str):
+			self.cron = [self.cron]
+		if not self.cron:
+			raise ValueError(f'Tarea {self.nombre}: sin expresiones cron')
+		if self.recuperar not in POLITICAS:
+			raise ValueError(f'Tarea {self.nombre}: política de recuperación {self.recuperar!r} (válidas: {", ".join(POLITICAS)})')
+		self._crones = [Cron(c) for c in self.cron]
+
+	def siguiente(self, despues: datetime) -> datetime:
+		return min(c.siguiente(despues) for c in self._crones)
+
+	def franjas(self, desde: datetime, hasta: datetime) -> list[datetime]:
+		"""Franjas en (`desde`, `hasta`], como mucho las `MAX_FRANJAS` más recientes."""
+		franjas = []
+		t = self.siguiente(desde)
+		while t <= hasta:
+			franjas.append(t)
+			if len(franjas) > MAX_FRANJAS:
+				franjas.pop(0)
+			t = self.siguiente(t)
+		return franjas
+
+
+def _fecha(valor: str | None) -> datetime | None:
+	try:
+		return datetime.fromisoformat(valor) if valor else None
+	except ValueError:
+		return None
+
+
+class Planificador:
+	"""Ejecuta `tareas` en sus franjas llamando a `ejecutar(nombres) -> {nombre: ok}`.
+
+	- `estado`: JSON donde se guarda la última franja atendida de cada tarea (None: sólo en memoria).
+	- `cancelar`: se llama si una ejecución pasa de su timeout; debe hacer que
+	  `ejecutar` termine (p.ej. cerrando el navegador). Hasta que termina no se
+	  empieza otra ejecución.
+	- `en_espera(proxima, ahora)`: se llama en cada espera entre franjas, p.ej. para
+	  tener listo el navegador antes de `proxima`.
+	- `reloj`: hora local actual (inyectable para probar el calendario).
+	"""
+
+	def __init__(self, tareas: list[Tarea], ejecutar: Callable[[list[str]], dict[str, bool]],
+			estado: Path | None = None, cancelar: Callable[[], None] | None = None,
+			intervalo_max: float = 60.0, reloj: Callable[[], datetime] = datetime.now,
+			en_espera: Callable[[datetime, datetime], None] | None = None):
+		nombres = [t.nombre for t in tareas]
+		if len(set(nombres)) != len(nombres):
+			raise ValueError(f'nombres de tarea repetidos: {nombres}')
+		self.tareas = sorted(tareas, key=lambda t: -t.prioridad)
+		self.ejecutar = ejecutar
+		self.ruta_estado = estado
+		self.cancelar = cancelar
+		self.intervalo_max = intervalo_max
+		self.reloj = reloj
+		self.en_espera = en_espera
+		self._parar = threading.Event()
+		self.estado = self._leer_estado()
+		ahora = self.reloj()
+		for t in self.tareas:
+			e = self.estado.setdefault(t.nombre, {})
+			if e.get('en_curso'):
+				LOG.warning('Planificador: la ejecución de %s iniciada a las %s no terminó (proceso interrumpido)', t.nombre, e['en_curso'])
+				e.pop('en_curso')
+			# una tarea nueva empieza a contar desde ahora, sin franjas atrasadas
+			e.setdefault('ultima_franja', ahora.isoformat(timespec='seconds'))
+		self._guardar_estado()
+
+	def _leer_estado(self) -> dict:
+		if self.ruta_estado is None:
+			return {}
+		try:
+			with self.ruta_estado.open('r', encoding='utf-8') as fh:
+				return json.load(fh)
+		except FileNotFoundError:
+			return {}
+		except Exception:
+			LOG.warning('Planificador: estado ilegible en %s, se empieza de cero', self.ruta_estado, exc_info=True)
+			return {}
+
+	def _guardar_estado(self) -> None:
+		if self.ruta_estado is None:
+			return
+		try:
+			self.ruta_estado.parent.mkdir(parents=True, exist_ok=True)
+			tmp = self.ruta_estado.with_suffix('.tmp')
+			with tmp.open('w', encoding='utf-8') as fh:
+				json.dump(self.estado, fh, ensure_ascii=False, indent=2)
+			tmp.replace(self.ruta_estado)
+		except Exception:
+			LOG.warning('Planificador: no se pudo guardar el estado en %s', self.ruta_estado, exc_info=True)
+
+	def _elegir(self, tarea: Tarea, ahora: datetime) -> tuple[datetime | None, list[datetime]]:
+		"""(franja a ejecutar o None, franjas caducadas) de `tarea` según su política."""
+		desde = _fecha(self.estado[tarea.nombre].get('ultima_franja')) or ahora
+		franjas = tarea.franjas(desde, ahora)
+		limite = GRACIA if tarea.recuperar == 'ninguna' else tarea.plazo
+		vigentes = [f for f in franjas if limite is None or (ahora - f).total_seconds() <= limite]
+		caducadas = [f for f in franjas if f not in vigentes]
+		if not vigentes:
+			return None, caducadas
+		return (vigentes[0] if tarea.recuperar == 'todas' else vigentes[-1]), caducadas
+
+	def proxima(self, ahora: datetime | None = None) -> datetime:
+		"""Próxima franja de cualquier tarea."""
+		ahora = ahora or self.reloj()
+		return min(t.siguiente(ahora) for t in self.tareas)
+
+	def ciclo(self, ahora: datetime | None = None) -> list[str]:
+		"""Atender las franjas vencidas: una ejecución con las tareas que toquen. Devuelve sus nombres."""
+		ahora = ahora or self.reloj()
+		lote = {}
+		for t in self.tareas:
+			franja, caducadas = self._elegir(t, ahora)
+			if caducadas:
+				LOG.warning('Planificador: %s pierde %d franja(s) fuera de plazo (%s ... %s)', t.nombre,
+					len(caducadas), caducadas[0].isoformat(timespec='minutes'), caducadas[-1].isoformat(timespec='minutes'))
+				e = self.estado[t.nombre]
+				e['ultima_franja'] = caducadas[-1].isoformat(timespec='seconds')
+				e['resultado'] = 'caducada'
+				if franja is None:
+					self._guardar_estado()
+			if franja is not None:
+				lote[t.nombre] = franja
+		if not lote:
+			return []
+		self._ejecutar_lote(lote)
+		return list(lote)
+
+	def ejecutar_ahora(self, nombres: list[str] | None = None) -> dict[str, bool]:
+		"""Ejecutar ya las tareas `nombres` (por defecto todas) sin mover sus franjas."""
+		return self._ejecutar_lote({n: None for n in (nombres or [t.nombre for t in self.tareas])})
+
+	def _ejecutar_lote(self, lote: dict[str, datetime | None]) -> dict[str, bool]:
+		tareas = [t for t in self.tareas if t.nombre in lote]
+		nombres = [t.nombre for t in tareas]
+		# el lote tiene la suma de los timeouts definidos (sin límite si ninguna lo define)
+		timeouts = [t.timeout for t in tareas if t.timeout is not None]
+		timeout = sum(timeouts) if timeouts else None
+		inicio = self.reloj()
+		for n in nombres:
+			self.estado[n]['en_curso'] = inicio.isoformat(timespec='seconds')
+		self._guardar_estado()
+		LOG.info('Planificador: ejecutando %s (franjas %s, timeout %s)', ', '.join(nombres),
+			', '.join(f.strftime('%H:%M') if f else 'ahora' for f in lote.values()),
+			f'{timeout:.0f} s' if timeout else 'sin límite')
+
+		resultado: dict = {}
+
+		def correr():
+			try:
+				resultado.update(self.ejecutar(nombres) or {})
+			except Exception:
+				LOG.exception('Planificador: excepción no controlada ejecutando %s', ', '.join(nombres))
+
+		hilo = threading.Thread(target=correr, name='qlik-ejecucion', daemon=True)
+		t0 = time.monotonic()
+		hilo.start()
+		hilo.join(timeout)
+		agotado = hilo.is_alive()
+		if agotado:
+			LOG.error('Planificador: %s supera su timeout de %.0f s; se cancela', ', '.join(nombres), timeout)
+			if self.cancelar is not None:
+				try:
+					self.cancelar()
+				except Exception:
+					LOG.exception('Planificador: fallo cancelando la ejecución')
+			# sin solapes: la siguiente ejecución espera a que ésta termine de verdad
+			while hilo.is_alive() and not self._parar.is_set():
+				hilo.join(5.0)
+		segundos = time.monotonic() - t0
+
+		for t in tareas:
+			e = self.estado[t.nombre]
+			e.pop('en_curso', None)
+			if lote[t.nombre] is not None:
+				e['ultima_franja'] = lote[t.nombre].isoformat(timespec='seconds')
+			e['ultimo_inicio'] = inicio.isoformat(timespec='seconds')
+			e['segundos'] = round(segundos, 1)
+			e['resultado'] = 'timeout' if agotado else ('ok' if resultado.get(t.nombre) else 'fallo')
+		self._guardar_estado()
+		LOG.info('Planificador: %s en %.1f s', ', '.join(f"{n}={self.estado[n]['resultado']}" for n in nombres), segundos)
+		return {n: bool(resultado.get(n)) and not agotado for n in nombres}
+
+	def detener(self) -> None:
+		self._parar.set()
+
+	def bucle(self, inmediato: bool = False) -> None:
+		"""Atender franjas hasta `detener()` (o Ctrl+C). Con `inmediato` ejecuta todo al empezar."""
+		if inmediato:
+			self.ejecutar_ahora()
+		anunciada = None
+		while not self._parar.is_set():
+			if self.ciclo():
+				anunciada = None
+				continue
+			ahora = self.reloj()
+			proxima = self.proxima(ahora)
+			if proxima != anunciada:
+				LOG.info('Siguiente ejecución programada para %s', proxima.isoformat(timespec='minutes'))
+				anunciada = proxima
+			if self.en_espera is not None:
+				try:
+					self.en_espera(proxima, ahora)
+				except Exception:
+					LOG.exception('Planificador: fallo preparando la franja de %s', proxima.isoformat(timespec='minutes'))
+				ahora = self.reloj()
+			# despertar a menudo y recalcular con el reloj de pared (suspensiones, cambios de hora)
+			self._parar.wait(max(0.5, min(self.intervalo_max, (proxima - ahora).total_seconds())))
@@ -0,0 +1,289 @@
+"""Extracción directa desde el motor de Qlik (QIX) por WebSocket JSON-RPC.
+
+Alternativa al export por la interfaz (hover -> "Más" -> Exportar -> .xlsx):
+abre la app en el motor, pide el hipercubo del objeto página a página con
+`GetHyperCubeData` y devuelve la misma forma `{sheet: [row_dicts]}` que
+`qliktabs.extract_excel_contents`. Con `formatear` (p.ej.
+`qliktabs.format_cell_display`) cada celda se muestra con el mismo formateo
+que las del .xlsx, a partir de `qNum` y el `qNumFormat` de su columna.
+
+Requiere `websocket-client`. La autenticación reutiliza las cookies de la
+sesión del navegador (`X-Qlik-Session`).
+"""
+from __future__ import annotations
+
+import json
+import logging
+import re
+import urllib.parse
+from datetime import datetime, timedelta
+from typing import Callable
+
+LOG = logging.getLogger(__name__)
+
+# El motor limita cada página de GetHyperCubeData a 10.000 celdas
+MAX_CELDAS_PAGINA = 10000
+
+
+class QixError(RuntimeError):
+	"""Error devuelto por el motor en una llamada JSON-RPC (`code`: código de error del motor)."""
+
+	def __init__(self, mensaje: str, code: int | None = None):
+		super().__init__(mensaje)
+		self.code = code
+
+
+# Código de error del motor cuando la sesión ya tiene la app abierta: pasa al
+# conectar con las cookies del navegador, que comparte su sesión del motor.
+APP_YA_ABIERTA = 1002
+
+
+def engine_url(base_url: str, app_id: str) -> str:
+	"""URL WebSocket del motor para `app_id` (https://host/vp -> wss://host/vp/app/<id>)."""
+	parsed = urllib.parse.urlparse(base_url)
+	scheme = 'wss' if parsed.scheme == 'https' else 'ws'
+	path = parsed.path.rstrip('/')
+	return f'{scheme}://{parsed.netloc}{path}/app/{urllib.parse.quote(app_id)}'
+
+
+def cookie_header(cookies: list[dict]) -> str:
+	"""Cabecera Cookie a partir de cookies en formato Selenium `get_cookies()`."""
+	return '; '.join(f"{c['name']}={c['value']}" for c in cookies if c.get('name'))
+
+
+class QixSession:
+	"""Conexión JSON-RPC con el motor de Qlik sobre WebSocket."""
+
+	def __init__(self, url: str, cookies: str | None = None, origin: str | None = None, timeout: float = 60.0):
+		try:
+			import websocket
+		except Exception as exc:
+			raise QixError('websocket-client no instalado (pip install websocket-client)') from exc
+		headers = []
+		if cookies:
+			headers.append(f'Cookie: {cookies}')
+		self._ws = websocket.create_connection(url, header=headers, origin=origin, timeout=timeout)
+		self._next_id = 0
+
+	def call(self, method: str, handle: int, params: list | dict | None = None) -> dict:
+		"""Llamar `method` sobre el objeto `handle` y devolver su `result`.
+
+		Ignora las notificaciones del motor (OnConnected, change, ...) que lleguen
+		antes de la respuesta.
+		"""
+		self._next_id += 1
+		req_id = self._next_id
+		self._ws.send(json.dumps({
+			'jsonrpc': '2.0',
+			'id': req_id,
+			'method': method,
+			'handle': handle,
+			'params': params if params is not None else [],
+		}))
+		while True:
+			msg = json.loads(self._ws.recv())
+			if msg.get('id') != req_id:
+				continue
+			if 'error' in msg:
+				err = msg['error']
+				raise QixError(f"{method}: {err.get('message')} ({err.get('code')}) {err.get('parameter', '')}".strip(), err.get('code'))
+			return msg.get('result') or {}
+
+	def open_doc(self, app_id: str) -> int:
+		return self.call('OpenDoc', -1, [app_id])['qReturn']['qHandle']
+
+	def open_or_get_active_doc(self, app_id: str) -> int:
+		"""Handle de `app_id`: `OpenDoc`, o `GetActiveDoc` si la sesión ya la tiene abierta.
+
+		Con las cookies del navegador el socket comparte la sesión del motor de la
+		hoja abierta, y `OpenDoc` responde 1002 ("App already open").
+		"""
+		try:
+			return self.open_doc(app_id)
+		except QixError as exc:
+			if exc.code != APP_YA_ABIERTA:
+				raise
+		ret = self.call('GetActiveDoc', -1)['qReturn']
+		if ret.get('qGenericId') not in (None, app_id):
+			raise QixError(f"GetActiveDoc: la sesión tiene abierta otra app ({ret.get('qGenericId')})")
+		LOG.debug('open_or_get_active_doc: %s ya estaba abierta en la sesión; se usa GetActiveDoc', app_id)
+		return ret['qHandle']
+
+	def get_object(self, doc_handle: int, object_id: str) -> int:
+		return self.call('GetObject', doc_handle, [object_id])['qReturn']['qHandle']
+
+	def select_values(self, doc_handle: int, field_name: str, values: list) -> bool:
+		"""Seleccionar `values` en el campo `field_name`, sustituyendo la selección previa.
+
+		Los números se comparan por valor numérico (campos duales como Mes) y
+		el resto por texto.
+		"""
+		field_handle = self.call('GetField', doc_handle, [field_name])['qReturn']['qHandle']
+		qvalues = []
+		for v in values:
+			if isinstance(v, (int, float)):
+				qvalues.append({'qText': '', 'qIsNumeric': True, 'qNumber': v})
+			else:
+				qvalues.append({'qText': str(v), 'qIsNumeric': False})
+		res = self.call('SelectValues', field_handle, {'qFieldValues': qvalues, 'qToggleMode': False, 'qSoftLock': False})
+		return bool(res.get('qReturn'))
+
+	def clear_field(self, doc_handle: int, field_name: str) -> bool:
+		"""Quitar la selección del campo `field_name`."""
+		field_handle = self.call('GetField', doc_handle, [field_name])['qReturn']['qHandle']
+		return bool(self.call('Clear', field_handle).get('qReturn', True))
+
+	def close(self) -> None:
+		try:
+			self._ws.close()
+		except Exception:
+			pass
+
+	def __enter__(self) -> QixSession:
+		return self
+
+	def __exit__(self, *exc) -> None:
+		self.close()
+
+
+# Origen de los números de serie de fecha de Qlik (el mismo que Excel)
+_ORIGEN_SERIAL = datetime(1899, 12, 30)
+
+
+def _decimales(num_format: dict) -> int:
+	if isinstance(num_format.get('qnDec'), int):
+		return num_format['qnDec']
+	fmt = (num_format.get('qFmt') or '').split(';')[0]
+	sep = num_format.get('qDec') or '.'
+	if sep not in fmt:
+		return 0
+	return len(re.match(r'[0#]*', fmt.split(sep, 1)[1]).group())
+
+
+def formato_excel(num_format: dict | None) -> str:
+	"""Formato numérico de Excel equivalente al `qNumFormat` de una columna.
+
+	Sólo distingue lo que usa `qliktabs.format_cell_display`: porcentaje (y si
+	lleva decimales), moneda (y si lleva decimales), fecha y número general.
+	"""
+	if not num_format:
+		return 'General'
+	tipo = num_format.get('qType') or 'U'
+	fmt = num_format.get('qFmt') or ''
+	decimales = _decimales(num_format)
+	if '%' in fmt:
+		return '0.0%' if decimales else '0%'
+	if tipo == 'M' or any(m in fmt for m in ('$', '€', '¤')):
+		return '"$"#,##0.00' if decimales >= 2 else '"$"#,##0'
+	if tipo in ('D', 'TS'):
+		return 'yyyy-mm-dd hh:mm:ss' if tipo == 'TS' else 'yyyy-mm-dd'
+	if tipo == 'T':
+		return 'hh:mm:ss'
+	return 'General'
+
+
+class CeldaMotor:
+	"""Celda del hipercubo con la interfaz de una celda openpyxl de sólo lectura."""
+	__slots__ = ('value', 'number_format', 'data_type')
+
+	def __init__(self, value, number_format: str, data_type: str):
+		self.value = value
+		self.number_format = number_format
+		self.data_type = data_type
+
+
+def celda_motor(cell: dict, number_format: str) -> CeldaMotor:
+	"""`CeldaMotor` de una celda de `qMatrix`: número (o fecha) si tiene `qNum`, si no su texto."""
+	if cell.get('qIsNull'):
+		return CeldaMotor(None, number_format, 's')
+	num = cell.get('qNum')
+	if isinstance(num, (int, float)) and not isinstance(num, bool) and num == num:
+		if number_format.startswith(('yyyy', 'hh')):
+			return CeldaMotor(_ORIGEN_SERIAL + timedelta(days=num), number_format, 'd')
+		return CeldaMotor(int(num) if float(num).is_integer() else num, number_format, 'n')
+	return CeldaMotor(cell.get('qText'), number_format, 's')
+
+
+def _cell_text(cell: dict) -> str:
+	text = cell.get('qText')
+	if text is None:
+		return ''
+	# igual que el export de la interfaz: importes de moneda como número limpio
+	if '$' in text:
+		return re.sub(r'[^0-9\-]', '', text)
+	return text
+
+
+def extract_hypercube(session: QixSession, object_handle: int,
+					formatear: Callable[[CeldaMotor], str] | None = None) -> tuple[list[str], list[list[str]]]:
+	"""Leer el hipercubo completo del objeto: (cabeceras, filas de textos).
+
+	Sin `formatear` cada celda es su `qText` (importes de moneda como número
+	limpio); con `formatear` se le pasa la `CeldaMotor` de cada celda.
+	"""
+	layout = session.call('GetLayout', object_handle)['qLayout']
+	cube = layout['qHyperCube']
+	info = list(cube.get('qDimensionInfo') or []) + list(cube.get('qMeasureInfo') or [])
+	headers = [i.get('qFallbackTitle') or f'col{n}' for n, i in enumerate(info, start=1)]
+	formatos = [formato_excel(i.get('qNumFormat')) for i in info]
+	width = int(cube['qSize']['qcx'])
+	total = int(cube['qSize']['qcy'])
+	if width <= 0:
+		return headers, []
+	# en tablas, qColumnOrder da el orden visible de las columnas
+	order = cube.get('qColumnOrder') or []
+	if sorted(order) != list(range(width)):
+		order = list(range(width))
+	headers = [headers[i] for i in order]
+
+	page_height = max(1, MAX_CELDAS_PAGINA // width)
+	rows = []
+	top = 0
+	while top < total:
+		res = session.call('GetHyperCubeData', object_handle, {
+			'qPath': '/qHyperCubeDef',
+			'qPages': [{'qLeft': 0, 'qTop': top, 'qWidth': width, 'qHeight': min(page_height, total - top)}],
+		})
+		pages = res.get('qDataPages') or []
+		matrix = pages[0].get('qMatrix') if pages else None
+		if not matrix:
+			break
+		for r in matrix:
+			if formatear is None:
+				rows.append([_cell_text(r[i]) if i < len(r) else '' for i in order])
+			else:
+				rows.append([formatear(celda_motor(r[i], formatos[i])) if i < len(r) else '' for i in order])
+		top += len(matrix)
+	LOG.info('extract_hypercube: %d filas x %d columnas leídas', len(rows), width)
+	return headers, rows
+
+
+def extract_object_contents(base_url: str, app_id: str, object_id: str, cookies: list[dict] | None = None,
+							sheet_name: str = 'Sheet1', selections: dict | None = None, timeout: float = 60.0,
+							formatear: Callable[[CeldaMotor], str] | None = None,
+							clear_fields: list[str] | None = None) -> dict:
+	"""Extraer el objeto `object_id` de la app como `{sheet_name: [row_dicts]}`.
+
+	`selections`: {campo: [valores]} aplicadas antes de leer el hipercubo; si el
+	motor rechaza alguna se lanza `QixError` (nunca se lee con otro filtro).
+	`formatear`: ver `extract_hypercube`.
+	`clear_fields`: campos cuya selección se quita al terminar (también si falla),
+	porque la sesión del motor es la del navegador y la verían los demás jobs.
+	"""
+	url = engine_url(base_url, app_id)
+	LOG.info('extract_object_contents: conectando a %s (objeto %s)', url, object_id)
+	with QixSession(url, cookies=cookie_header(cookies or []), origin=base_url.rstrip('/'), timeout=timeout) as session:
+		doc = session.open_or_get_active_doc(app_id)
+		try:
+			for field_name, values in (selections or {}).items():
+				if not session.select_values(doc, field_name, values):
+					raise QixError(f'SelectValues: el motor no aceptó la selección {field_name}={values}')
+			obj = session.get_object(doc, object_id)
+			headers, rows = extract_hypercube(session, obj, formatear)
+		finally:
+			for field_name in clear_fields or []:
+				try:
+					session.clear_field(doc, field_name)
+				except Exception:
+					LOG.warning('extract_object_contents: no se pudo limpiar la selección de %s', field_name, exc_info=True)
+	return {sheet_name: [dict(zip(headers, r)) for r in rows]}
@@ -0,0 +1,304 @@
+"""Sitio local que imita Qlik Sense para medir `qliktabs.run_once` sin el servidor real.
+
+Sirve lo mínimo que recorre la automatización:
+
+- login por formulario (`/internal_forms_authentication/`) que deja la cookie
+  `X-Qlik-Session` y redirige a la hoja pedida;
+- hojas `/sense/app/<app>/sheet/<sheet>/state/analysis` con `#qv-page-container`,
+  un `.qv-loader` mientras "calcula" y un `#grid` de 20 objetos; el hover sobre un
+  objeto muestra su `detached-object-nav-wrapper` con el botón "Más"
+  (`nav-menu-move`);
+- el menú `#export-group` -> `#export` (-> `button[tid="table-export"]` en las
+  tablas) y el enlace `a.export-url` a un .xlsx generado con openpyxl;
+- una Capability API mínima (`require(['js/qlik'])`) para `select_values`.
+
+Cada paso tiene una latencia configurable (`Latencias`). Uso directo:
+
+	python qlik_mock.py --puerto 8765 --latencia menu=0.3 --filas 5000
+"""
+from __future__ import annotations
+
+import argparse
+import html
+import io
+import json
+import logging
+import re
+import secrets
+import threading
+import time
+import urllib.parse
+from dataclasses import asdict, dataclass, fields
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LOG = logging.getLogger(__name__)
+
+# Objetos del grid (posición nth-child) que se exportan como tabla: piden el
+# paso extra `table-export` tras `#export`, como el objeto 8 de la hoja de zonas.
+OBJETOS_TABLA = (8,)
+OBJETOS_GRID = 20
+
+
+@dataclass
+class Latencias:
+	"""Segundos que tarda cada paso del sitio simulado."""
+	pagina: float = 0.3      # servir el HTML de una hoja
+	calculo: float = 0.5     # loader visible tras cargar la hoja
+	login: float = 0.2       # validar el formulario de login
+	hover: float = 0.1       # mostrar la barra de navegación del objeto
+	menu: float = 0.1        # abrir cada nivel del menú de exportación
+	export: float = 0.5      # preparar el fichero hasta mostrar `a.export-url`
+	descarga: float = 0.2    # servir el .xlsx
+	seleccion: float = 0.2   # recalcular tras una selección
+
+	@classmethod
+	def desde_textos(cls, textos: list[str]) -> Latencias:
+		"""Crear desde pares 'nombre=segundos' (p.ej. de la línea de comandos)."""
+		lat = cls()
+		validos = {f.name for f in fields(cls)}
+		for texto in textos or []:
+			nombre, _, valor = texto.partition('=')
+			if nombre not in validos:
+				raise ValueError(f'Latencia desconocida: {nombre!r} (válidas: {", ".join(sorted(validos))})')
+			setattr(lat, nombre, float(valor))
+		return lat
+
+
+_PAGINA_LOGIN = """<!doctype html>
+<html><head><meta charset="utf-8"><title>Qlik Sense - Iniciar sesión</title></head>
+<body>
+<form method="post" action="/internal_forms_authentication/?targetId={target}">
+  <label>Usuario <input type="text" name="username" autofocus></label>
+  <label>Contraseña <input type="password" name="password"></label>
+  <button type="submit">Iniciar sesión</button>
+</form>
+</body></html>"""
+
+_CELDA = (
+	'<div data-objeto="{objeto}"><div class="object-and-panel-wrapper"><div>'
+	'<div class="ng-isolate-scope detached-object-nav-wrapper"><div>'
+	'<button tid="nav-menu-move">Más</button></div></div>'
+	'<div class="contenido">Objeto {n}</div>'
+	'</div></div></div>'
+)
+
+_PAGINA_HOJA = """<!doctype html>
+<html><head><meta charset="utf-8"><title>Qlik Sense - {sheet}</title>
+<style>
+#grid > div {{ min-height: 40px; border: 1px solid #ccc; margin: 2px; }}
+.detached-object-nav-wrapper {{ display: none; }}
+.activo .detached-object-nav-wrapper {{ display: block; }}
+.oculto {{ display: none; }}
+</style></head>
+<body>
+<div id="qv-page-container">
+  <div class="qv-loader">Cargando...</div>
+  <div id="grid">{celdas}</div>
+  <div id="menu" class="oculto"><button id="export-group">Descargar como...</button></div>
+  <div id="submenu" class="oculto"><button id="export">Datos</button></div>
+  <div id="dialogo" class="oculto"><button tid="table-export">Exportar</button></div>
+  <div id="enlace"></div>
+</div>
+<script>
+var LAT = {latencias}, objeto = null;
+function tras(s, fn) {{ setTimeout(fn, s * 1000); }}
+function mostrar(id) {{ document.getElementById(id).classList.remove('oculto'); }}
+function ocultar(id) {{ document.getElementById(id).classList.add('oculto'); }}
+function cargando(s, fn) {{
+  var loader = document.createElement('div');
+  loader.className = 'qv-loader';
+  document.getElementById('qv-page-container').appendChild(loader);
+  tras(s, function () {{ loader.remove(); if (fn) fn(); }});
+}}
+document.querySelector('.qv-loader').remove();
+cargando(LAT.calculo);
+document.querySelectorAll('#grid > div').forEach(function (celda) {{
+  celda.addEventListener('mouseover', function () {{ tras(LAT.hover, function () {{ celda.classList.add('activo'); }}); }});
+}});
+document.getElementById('grid').addEventListener('click', function (ev) {{
+  var boton = ev.target.closest('button[tid="nav-menu-move"]');
+  if (!boton) return;
+  objeto = boton.closest('#grid > div').dataset.objeto;
+  tras(LAT.menu, function () {{ mostrar('menu'); }});
+}});
+document.getElementById('export-group').addEventListener('click', function () {{
+  tras(LAT.menu, function () {{ mostrar('submenu'); }});
+}});
+document.getElementById('export').addEventListener('click', function () {{
+  ocultar('menu'); ocultar('submenu');
+  if (objeto.indexOf('tabla') === 0) tras(LAT.menu, function () {{ mostrar('dialogo'); }});
+  else preparar();
+}});
+document.querySelector('button[tid="table-export"]').addEventListener('click', function () {{
+  ocultar('dialogo'); preparar();
+}});
+function preparar() {{
+  tras(LAT.export, function () {{
+    var a = document.createElement('a');
+    a.className = 'export-url';
+    a.href = '/export/' + objeto + '_' + Date.now() + '.xlsx';
+    a.textContent = 'Pulse aquí para descargar';
+    document.getElementById('enlace').appendChild(a);
+  }});
+}}
+window.require = function (deps, ok) {{
+  ok({{currApp: function () {{ return {{field: function () {{ return {{selectValues: function () {{
+    return new Promise(function (resolver) {{ cargando(LAT.seleccion, function () {{ resolver(true); }}); }});
+  }}}}; }}}}; }}}});
+}};
+</script>
+</body></html>"""
+
+_RE_HOJA = re.compile(r'^/sense/app/([^/]+)/sheet/([^/]+)/state/analysis$')
+_RE_EXPORT = re.compile(r'^/export/([\w.-]+)\.xlsx$')
+
+
+def generar_xlsx(objeto: str, filas: int) -> bytes:
+	"""Libro .xlsx con `filas` filas de datos de ejemplo para `objeto`."""
+	from openpyxl import Workbook
+	wb = Workbook(write_only=True)
+	ws = wb.create_sheet('Sheet1')
+	ws.append(['Zona', 'Mes', 'Ventas', 'Unidades', 'Margen', 'Fecha'])
+	for i in range(filas):
+		ws.append([f'Zona {i % 29 + 1}', i % 12 + 1, 1000.5 + i * 13.25, i % 500, (i % 100) / 100.0, f'2026-{i % 12 + 1:02d}-{i % 28 + 1:02d}'])
+	buf = io.BytesIO()
+	wb.save(buf)
+	return buf.getvalue()
+
+
+class _Manejador(BaseHTTPRequestHandler):
+	server: _Servidor
+
+	def log_message(self, fmt, *args):
+		LOG.debug('qlik_mock: ' + fmt, *args)
+
+	def _enviar(self, codigo: int, cuerpo: bytes = b'', tipo: str = 'text/html; charset=utf-8', cabeceras: dict | None = None) -> None:
+		self.send_response(codigo)
+		self.send_header('Content-Type', tipo)
+		self.send_header('Content-Length', str(len(cuerpo)))
+		for k, v in (cabeceras or {}).items():
+			self.send_header(k, v)
+		self.end_headers()
+		self.wfile.write(cuerpo)
+
+	def _sesion_valida(self) -> bool:
+		cookies = self.headers.get('Cookie') or ''
+		return any(c.strip() == f'X-Qlik-Session={self.server.token}' for c in cookies.split(';'))
+
+	def do_GET(self):
+		ruta = urllib.parse.urlsplit(self.path)
+		lat = self.server.latencias
+		m = _RE_HOJA.match(ruta.path)
+		if m:
+			if not self._sesion_valida():
+				target = secrets.token_hex(8)
+				self.server.destinos[target] = self.path
+				return self._enviar(302, cabeceras={'Location': f'/internal_forms_authentication/?targetId={target}'})
+			time.sleep(lat.pagina)
+			celdas = ''.join(
+				_CELDA.format(objeto=('tabla%d' if n in OBJETOS_TABLA else 'objeto%d') % n, n=n)
+				for n in range(1, OBJETOS_GRID + 1)
+			)
+			cuerpo = _PAGINA_HOJA.format(sheet=html.escape(m.group(2)), celdas=celdas, latencias=json.dumps(asdict(lat)))
+			return self._enviar(200, cuerpo.encode('utf-8'))
+		if ruta.path == '/internal_forms_authentication/':
+			target = urllib.parse.parse_qs(ruta.query).get('targetId', [''])[0]
+			return self._enviar(200, _PAGINA_LOGIN.format(target=html.escape(target)).encode('utf-8'))
+		m = _RE_EXPORT.match(ruta.path)
+		if m and self._sesion_valida():
+			time.sleep(lat.descarga)
+			objeto = m.group(1).split('_')[0]
+			return self._enviar(200, self.server.libro(objeto), 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+				{'Content-Disposition': f'attachment; filename="{m.group(1)}.xlsx"'})
+		return self._enviar(404, b'no encontrado', 'text/plain')
+
+	def do_POST(self):
+		ruta = urllib.parse.urlsplit(self.path)
+		if ruta.path != '/internal_forms_authentication/':
+			return self._enviar(404, b'no encontrado', 'text/plain')
+		largo = int(self.headers.get('Content-Length') or 0)
+		datos = urllib.parse.parse_qs(self.rfile.read(largo).decode('utf-8'))
+		time.sleep(self.server.latencias.login)
+		target = urllib.parse.parse_qs(ruta.query).get('targetId', [''])[0]
+		destino = self.server.destinos.pop(target, None)
+		if not (datos.get('username', [''])[0] and datos.get('password', [''])[0]) or not destino:
+			return self._enviar(302, cabeceras={'Location': self.path})
+		self.server.logins += 1
+		return self._enviar(302, cabeceras={
+			'Location': destino,
+			'Set-Cookie': f'X-Qlik-Session={self.server.token}; Path=/; HttpOnly',
+		})
+
+
+class _Servidor(ThreadingHTTPServer):
+	daemon_threads = True
+
+	def __init__(self, direccion, latencias: Latencias, filas: int):
+		super().__init__(direccion, _Manejador)
+		self.latencias = latencias
+		self.filas = filas
+		self.token = secrets.token_hex(16)
+		self.destinos: dict[str, str] = {}
+		self.logins = 0
+		self._libros: dict[str, bytes] = {}
+		self._lock = threading.Lock()
+
+	def libro(self, objeto: str) -> bytes:
+		with self._lock:
+			if objeto not in self._libros:
+				self._libros[objeto] = generar_xlsx(objeto, self.filas)
+			return self._libros[objeto]
+
+
+class QlikMock:
+	"""Sitio simulado en un hilo: `iniciar()` devuelve la URL base, `detener()` lo cierra."""
+
+	def __init__(self, latencias: Latencias | None = None, filas: int = 2000, host: str = '127.0.0.1', puerto: int = 0):
+		self.servidor = _Servidor((host, puerto), latencias or Latencias(), filas)
+		self._hilo: threading.Thread | None = None
+
+	@property
+	def url(self) -> str:
+		host, puerto = self.servidor.server_address[:2]
+		return f'http://{host}:{puerto}'
+
+	def iniciar(self) -> str:
+		self._hilo = threading.Thread(target=self.servidor.serve_forever, name='qlik-mock', daemon=True)
+		self._hilo.start()
+		LOG.info('qlik_mock: sirviendo en %s', self.url)
+		return self.url
+
+	def detener(self) -> None:
+		self.servidor.shutdown()
+		self.servidor.server_close()
+
+	def __enter__(self) -> QlikMock:
+		self.iniciar()
+		return self
+
+	def __exit__(self, *exc) -> None:
+		self.detener()
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description='Sitio local que imita Qlik Sense para pruebas de rendimiento.')
+	parser.add_argument('--host', default='127.0.0.1')
+	parser.add_argument('--puerto', type=int, default=8765)
+	parser.add_argument('--filas', type=int, default=2000, help='filas de cada .xlsx exportado')
+	parser.add_argument('--latencia', action='append', default=[], metavar='PASO=SEGUNDOS',
+		help='latencia de un paso (%s)' % ', '.join(f.name for f in fields(Latencias)))
+	args = parser.parse_args()
+	logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+	mock = QlikMock(Latencias.desde_textos(args.latencia), filas=args.filas, host=args.host, puerto=args.puerto)
+	mock.iniciar()
+	try:
+		while True:
+			time.sleep(3600)
+	except KeyboardInterrupt:
+		pass
+	finally:
+		mock.detener()
+
+
+if __name__ == '__main__':
+	main()
@@ -11,17 +11,26 @@ from __future__ import annotations
 
 import logging
 import time
-import platform
-import ctypes
 import urllib.parse
-from ctypes import wintypes
 import os
-import glob
+import importlib.util
+import io
 import json
 from pathlib import Path
-from datetime import datetime, timedelta
+import calendar
+from datetime import date, datetime, timedelta
 import os as _os
 import re
+import queue
+import shutil
+import tempfile
+import threading
+import unicodedata
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field, fields
+from typing import Iterator
 
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
@@ -33,535 +42,386 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
 
-LOG = logging.getLogger(__name__)
-
-# intentar importar helpers de inicio de sesión desde `iniciarseccion.py`
-try:
-	from iniciarseccion import (
-		verificar_inicio_sesion,
-		esperar_carga_hub,
-		login_con_action_chains,
-		login_con_pyautogui,
-	)
-except Exception:
-	# si no está disponible, definimos nombres a None y usamos el login interno como fallback
-	verificar_inicio_sesion = None
-	esperar_carga_hub = None
-	login_con_action_chains = None
-	login_con_pyautogui = None
+import planificador
+import qlik_engine
+import trazas
 
-tiempo=30
-corto_tiempo=2
+LOG = logging.getLogger(__name__)
 
-def setup_driver() -> webdriver.Chrome:
+# Perfil del navegador (QLIK_PERFIL): 'escritorio' (Chrome visible y maximizado) o
+# 'produccion' (headless, viewport fijo, sin imágenes, fuentes ni animaciones), pensado
+# para las ejecuciones programadas con varias sesiones en un servidor Linux.
+PERFIL_ESCRITORIO = 'escritorio'
+PERFIL_PRODUCCION = 'produccion'
+VIEWPORT_PRODUCCION = (1920, 1080)
+FUENTES_BLOQUEADAS = ['*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot']
+_SIN_ANIMACIONES_JS = (
+	"document.addEventListener('DOMContentLoaded', function () {"
+	"  var s = document.createElement('style');"
+	"  s.textContent = '*, *::before, *::after { animation: none !important; transition: none !important; }';"
+	"  document.head.appendChild(s);"
+	"});"
+)
+
+_CHROMEDRIVER_PATH = None
+_CHROMEDRIVER_LOCK = threading.Lock()
+# Navegadores abiertos por `setup_driver`, para poder cancelar una ejecución desde otro hilo
+_DRIVERS_ACTIVOS: weakref.WeakSet = weakref.WeakSet()
+
+
+def perfil_navegador() -> str:
+	perfil = (_os.environ.get('QLIK_PERFIL') or PERFIL_ESCRITORIO).strip().lower()
+	return PERFIL_PRODUCCION if perfil in (PERFIL_PRODUCCION, 'production', 'headless') else PERFIL_ESCRITORIO
+
+
+def ruta_chromedriver() -> str:
+	"""Ruta del chromedriver: CHROMEDRIVER_PATH si está fijada; si no, webdriver-manager una vez por proceso."""
+	global _CHROMEDRIVER_PATH
+	fijada = _os.environ.get('CHROMEDRIVER_PATH')
+	if fijada and Path(fijada).expanduser().exists():
+		return str(Path(fijada).expanduser())
+	with _CHROMEDRIVER_LOCK:
+		if _CHROMEDRIVER_PATH is None:
+			_CHROMEDRIVER_PATH = ChromeDriverManager().install()
+		return _CHROMEDRIVER_PATH
+
+
+@trazas.medido('navegador')
+def setup_driver(download_dir: str | None = None, perfil: str | None = None) -> webdriver.Chrome:
+	"""Crear el Chrome de la automatización.
+
+	`download_dir`: carpeta de descargas propia de esta sesión (por defecto ~/Downloads).
+	`perfil`: 'escritorio' o 'produccion' (por defecto `perfil_navegador()`).
+	"""
+	perfil = perfil or perfil_navegador()
+	produccion = perfil == PERFIL_PRODUCCION
 	opts = Options()
 	opts.add_argument("--no-sandbox")
 	opts.add_argument("--disable-dev-shm-usage")
-	service = Service(ChromeDriverManager().install())
+	prefs = {}
+	if produccion:
+		opts.add_argument("--headless=new")
+		opts.add_argument("--window-size=%d,%d" % VIEWPORT_PRODUCCION)
+		opts.add_argument("--disable-gpu")
+		opts.add_argument("--disable-extensions")
+		opts.add_argument("--mute-audio")
+		opts.add_argument("--blink-settings=imagesEnabled=false")
+		prefs['profile.managed_default_content_settings.images'] = 2
+	if download_dir:
+		Path(download_dir).mkdir(parents=True, exist_ok=True)
+		prefs.update({
+			'download.default_directory': str(Path(download_dir).resolve()),
+			'download.prompt_for_download': False,
+			'download.directory_upgrade': True,
+		})
+	if prefs:
+		opts.add_experimental_option('prefs', prefs)
+	service = Service(ruta_chromedriver())
 	driver = webdriver.Chrome(service=service, options=opts)
-	driver.maximize_window()
-	return driver
-
-
-def type_like_keyboard(driver: webdriver.Chrome, text: str, delay: float = 0.08, click_first: bool = True) -> bool:
-	try:
-		if click_first:
-			try:
-				active = driver.switch_to.active_element
-				if not active or active.tag_name.lower() == 'html':
-					try:
-						driver.find_element(By.TAG_NAME, 'body').click()
-					except Exception:
-						pass
-					time.sleep(2)
-			except Exception:
-				time.sleep(2)
-
-		active = driver.switch_to.active_element
-		if not active:
-			return False
-
-		sent = 0
-		for ch in text:
-			try:
-				active.send_keys(ch)
-				sent += 1
-				time.sleep(delay)
-			except Exception:
-				continue
-		LOG.info("Typist: enviados %d/%d caracteres", sent, len(text))
-		return sent > 0
-	except Exception:
-		LOG.exception("Error en type_like_keyboard")
-		return False
-
-
-def _send_text_windows(text: str, delay: float = 0.08) -> None:
-	if platform.system() != "Windows":
-		return
-	user32 = ctypes.WinDLL('user32', use_last_error=True)
-	VkKeyScanW = user32.VkKeyScanW
-	keybd_event = user32.keybd_event
-	VK_SHIFT = 0x10
-	KEYEVENTF_KEYUP = 0x0002
-	for ch in text:
-		vks = VkKeyScanW(ord(ch))
-		if vks == -1:
-			continue
-		vk = vks & 0xFF
-		shift_state = (vks >> 8) & 0xFF
-		if shift_state & 1:
-			keybd_event(VK_SHIFT, 0, 0, 0)
-		keybd_event(vk, 0, 0, 0)
-		time.sleep(0.01)
-		keybd_event(vk, 0, KEYEVENTF_KEYUP, 0)
-		if shift_state & 1:
-			keybd_event(VK_SHIFT, 0, KEYEVENTF_KEYUP, 0)
-		time.sleep(delay)
-
-
-def send_text_via_system(driver: webdriver.Chrome, text: str, delay: float = 0.08) -> bool:
-	try:
+	_DRIVERS_ACTIVOS.add(driver)
+	if produccion:
 		try:
-			driver.execute_script("window.focus();")
+			driver.execute_cdp_cmd('Network.enable', {})
+			driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': FUENTES_BLOQUEADAS})
+			driver.execute_cdp_cmd('Emulation.setEmulatedMedia', {'features': [{'name': 'prefers-reduced-motion', 'value': 'reduce'}]})
+			driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': _SIN_ANIMACIONES_JS})
 		except Exception:
-			pass
-		time.sleep(0.2)
-		if platform.system() == "Windows":
-			_send_text_windows(text, delay=delay)
-			LOG.info("Envío de texto por sistema completado (Windows)")
-			return True
-		return False
-	except Exception:
-		LOG.exception("Fallo en send_text_via_system")
-		return False
-
-
-def send_keys_via_pywinauto(keys: str, url_substring: str | None = None) -> bool:
-	try:
-		from pywinauto import Desktop, keyboard
-	except Exception:
-		LOG.debug('pywinauto no instalado')
-		return False
-	try:
-		desktop = Desktop(backend="uia")
-		windows = desktop.windows()
-		target = None
-		us = url_substring.lower() if url_substring else None
-		for w in windows:
-			try:
-				title = (w.window_text() or '').lower()
-				if not title:
-					continue
-				if us and us in title:
-					target = w
-					break
-				if not us and ('chrome' in title or 'qlik' in title):
-					target = w
-					break
-			except Exception:
-				continue
-		if not target:
-			for w in windows:
-				try:
-					title = (w.window_text() or '').lower()
-					if 'qlik' in title or 'chrome' in title:
-						target = w
-						break
-				except Exception:
-					continue
-		if not target:
-			return False
-		target.set_focus()
-		time.sleep(0.12)
-		keyboard.send_keys(keys)
-		time.sleep(0.12)
-		LOG.info('send_keys_via_pywinauto: keys enviados')
-		return True
-	except Exception:
-		LOG.debug('send_keys_via_pywinauto: fallo', exc_info=True)
-		return False
-
+			LOG.debug('setup_driver: no se pudieron aplicar los bloqueos CDP del perfil produccion', exc_info=True)
+	else:
+		driver.maximize_window()
+	if download_dir:
+		# también por CDP: las preferencias no siempre se respetan (p.ej. en headless).
+		# El final de la descarga se detecta mirando la carpeta (`esperar_descarga`),
+		# así que no se piden los eventos Browser.downloadProgress.
+		try:
+			driver.execute_cdp_cmd('Browser.setDownloadBehavior', {
+				'behavior': 'allow',
+				'downloadPath': str(Path(download_dir).resolve()),
+			})
+		except Exception:
+			LOG.debug('setup_driver: Browser.setDownloadBehavior no disponible', exc_info=True)
+	return driver
 
-def _send_enter_windows() -> bool:
-	if platform.system() != 'Windows':
-		return False
-	try:
-		user32 = ctypes.WinDLL('user32', use_last_error=True)
-		keybd_event = user32.keybd_event
-		KEYEVENTF_KEYUP = 0x0002
-		VK_RETURN = 0x0D
-		keybd_event(VK_RETURN, 0, 0, 0)
-		time.sleep(1)
-		keybd_event(VK_RETURN, 0, KEYEVENTF_KEYUP, 0)
-		time.sleep(1)
-		LOG.info('_send_enter_windows: Enter enviado')
-		return True
-	except Exception:
-		LOG.debug('_send_enter_windows: fallo', exc_info=True)
-		return False
 
+# Búsqueda de elementos dentro del navegador: documento, shadow roots abiertos e
+# iframes del mismo origen. `esperar` usa un MutationObserver (más un repaso cada
+# 250 ms para cambios de estilo que no generan mutaciones) en lugar de sondear desde
+# Python, así que cada espera es una sola llamada a WebDriver.
+_JS_LOCALIZADOR = """
+function docs(d, out) {
+  out.push(d);
+  var frames = d.querySelectorAll('iframe');
+  for (var i = 0; i < frames.length; i++) {
+    try { if (frames[i].contentDocument) docs(frames[i].contentDocument, out); } catch (e) {}
+  }
+  return out;
+}
+function raices(r, out) {
+  out.push(r);
+  var els = r.querySelectorAll('*');
+  for (var i = 0; i < els.length; i++) { if (els[i].shadowRoot) raices(els[i].shadowRoot, out); }
+  return out;
+}
+function visible(el) {
+  if (!el.getClientRects().length) return false;
+  var st = (el.ownerDocument.defaultView || window).getComputedStyle(el);
+  return st.visibility !== 'hidden' && st.display !== 'none';
+}
+function buscar(paso, soloVisible, profundo) {
+  var ds = docs(document, []);
+  for (var d = 0; d < ds.length; d++) {
+    var cands = [];
+    if (paso[0] === 'xpath') {
+      var it = ds[d].evaluate(paso[1], ds[d], null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+      for (var k = 0; k < it.snapshotLength; k++) cands.push(it.snapshotItem(k));
+    } else {
+      var rs = profundo ? raices(ds[d], []) : [ds[d]];
+      for (var r = 0; r < rs.length; r++) {
+        var m = rs[r].querySelectorAll(paso[1]);
+        for (var k = 0; k < m.length; k++) cands.push(m[k]);
+      }
+    }
+    for (var c = 0; c < cands.length; c++) { if (!soloVisible || visible(cands[c])) return cands[c]; }
+  }
+  return null;
+}
+function esperar(paso, soloVisible, limite, hecho) {
+  var el = buscar(paso, soloVisible, true);
+  if (el) { hecho(el); return; }
+  var fin = false;
+  var obs = new MutationObserver(function () { var e = buscar(paso, soloVisible, false); if (e) terminar(e); });
+  var reloj = setInterval(function () { var e = buscar(paso, soloVisible, true); if (e) terminar(e); }, 250);
+  var corte = setTimeout(function () { terminar(null); }, limite);
+  function terminar(e) {
+    if (fin) return;
+    fin = true; obs.disconnect(); clearInterval(reloj); clearTimeout(corte);
+    hecho(e);
+  }
+  obs.observe(document, {childList: true, subtree: true, attributes: true});
+}
+"""
 
-def focus_on_selector(driver: webdriver.Chrome, selector: str, timeout: float = 3.0) -> bool:
-	"""Intentar enfocar/posicionar el elemento identificado por `selector`.
+_JS_ESPERAR = _JS_LOCALIZADOR + """
+var paso = arguments[0], soloVisible = arguments[1], limite = arguments[2], listo = arguments[arguments.length - 1];
+esperar(paso, soloVisible, limite, function (el) {
+  if (el) el.scrollIntoView({block: 'center', inline: 'nearest'});
+  listo(el);
+});
+"""
 
-	Estrategia:
-	- buscar con Selenium y hacer scrollIntoView
-	- intentar click directo
-	- fallback a ActionChains move_to_element + click
-	- usar execute_script focus() si sigue sin foco
-	- si todo falla, devolver False
-	"""
-	try:
-		end = time.time() + float(timeout)
-		while time.time() < end:
-			try:
-				el = driver.find_element(By.CSS_SELECTOR, selector)
-			except Exception:
-				el = None
-			if not el:
-				time.sleep(1)
-				continue
+# Clica `pasos` en orden (cada uno en cuanto aparece) y al final espera `espera`.
+# Devuelve [cuántos elementos de pasos + [espera] llegaron a aparecer, si el click
+# del último que apareció lanzó una excepción].
+_JS_CADENA = _JS_LOCALIZADOR + """
+var pasos = arguments[0], espera = arguments[1], limite = arguments[2], listo = arguments[arguments.length - 1];
+var hechos = 0;
+function siguiente() {
+  if (hechos === pasos.length) {
+    esperar(espera, true, limite, function (el) { listo([el ? hechos + 1 : hechos, false]); });
+    return;
+  }
+  esperar(pasos[hechos], true, limite, function (el) {
+    if (!el) { listo([hechos, false]); return; }
+    try {
+      el.scrollIntoView({block: 'center', inline: 'nearest'});
+      el.click();
+    } catch (e) { listo([hechos + 1, true]); return; }
+    hechos++;
+    siguiente();
+  });
+}
+siguiente();
+"""
 
-			try:
-				# asegurar que está visible en pantalla
-				driver.execute_script("arguments[0].scrollIntoView({block: 'center', inline: 'nearest'});", el)
-			except Exception:
-				pass
+# Estrategia de click que funcionó la última vez para cada selector
+# ('directo', 'actions' o 'js'); compartida por todos los drivers del proceso.
+_ESTRATEGIA_CLICK: dict[str, str] = {}
+_ORDEN_CLICK = ('directo', 'actions', 'js')
 
-			try:
-				el.click()
-				LOG.info("focus_on_selector: click directo en %s", selector)
-			except Exception:
-				try:
-					ActionChains(driver).move_to_element(el).click().perform()
-					LOG.info("focus_on_selector: click via ActionChains en %s", selector)
-				except Exception:
-					LOG.debug("focus_on_selector: el.click/ActionChains falló, intentando focus()")
-					try:
-						driver.execute_script("arguments[0].focus();", el)
-					except Exception:
-						pass
 
-			try:
-				# intento simple para forzar foco en el elemento
-				el.send_keys("")
-			except Exception:
-				pass
+def _paso_js(selector: str, by: str = By.CSS_SELECTOR) -> list[str]:
+	return ['xpath' if by == By.XPATH else 'css', selector]
 
-			# comprobar si el elemento es el activo
-			try:
-				active = driver.switch_to.active_element
-				if active is not None:
-					try:
-						if el == active or (active.get_attribute('outerHTML') and el.get_attribute('outerHTML') in active.get_attribute('outerHTML')):
-							LOG.info("focus_on_selector: elemento activo detectado para %s", selector)
-							return True
-					except Exception:
-						# si no podemos comparar, aún aceptamos si el elemento parece visible
-						return True
-				else:
-					return True
-			except Exception:
-				return True
 
-		LOG.debug("focus_on_selector: no se encontró o no se pudo enfocar %s", selector)
-		return False
-	except Exception:
-		LOG.exception("focus_on_selector: excepción inesperada")
-		return False
+def _asegurar_timeout_script(driver: webdriver.Chrome, segundos: float) -> None:
+	"""Subir el script timeout del driver si hace falta (una llamada como mucho)."""
+	if getattr(driver, '_qlik_timeout_script', 0.0) < segundos:
+		segundos = max(segundos, 60.0)
+		driver.set_script_timeout(segundos)
+		driver._qlik_timeout_script = segundos
 
 
-def hover_on_selector(driver: webdriver.Chrome, selector: str, timeout: float = 5.0) -> bool:
-	"""Simular hover (mover el cursor) sobre el elemento y despachar eventos mouseover/mouseenter.
+def esperar_elemento(driver: webdriver.Chrome, selector: str, by: str = By.CSS_SELECTOR, timeout: float = 5.0, visible: bool = True):
+	"""Esperar a que `selector` aparezca y devolverlo ya desplazado a pantalla.
 
-	Esto usa ActionChains para mover el cursor virtual y también despacha events via JS
-	porque algunas UIs reaccionan sólo a eventos de mouse.
+	Busca también en shadow roots abiertos e iframes del mismo origen, con una sola
+	llamada a WebDriver. Devuelve None si no aparece dentro de `timeout`.
 	"""
+	_asegurar_timeout_script(driver, timeout + 5.0)
 	try:
-		end = time.time() + float(timeout)
-		while time.time() < end:
-			try:
-				el = driver.find_element(By.CSS_SELECTOR, selector)
-			except Exception:
-				el = None
-			if not el:
-				time.sleep(15)
-				continue
-
-			try:
-				driver.execute_script("arguments[0].scrollIntoView({block:'center', inline:'nearest'});", el)
-			except Exception:
-				pass
-
-			try:
-				ActionChains(driver).move_to_element(el).perform()
-				LOG.info("hover_on_selector: move_to_element realizado para %s", selector)
-			except Exception:
-				LOG.debug("hover_on_selector: ActionChains falló", exc_info=True)
-
-			try:
-				js = (
-					"var e = new MouseEvent('mouseover', {bubbles:true, cancelable:true});"
-					"arguments[0].dispatchEvent(e);"
-					"var e2 = new MouseEvent('mouseenter', {bubbles:true, cancelable:true});"
-					"arguments[0].dispatchEvent(e2);"
-				)
-				driver.execute_script(js, el)
-				LOG.info("hover_on_selector: eventos mouseover/mouseenter despachados para %s", selector)
-			except Exception:
-				LOG.debug("hover_on_selector: dispatch JS falló", exc_info=True)
-
-			time.sleep(0.2)
-			return True
-
-		LOG.debug("hover_on_selector: no se encontró %s", selector)
-		return False
-	except Exception:
-		LOG.exception("hover_on_selector: excepción inesperada")
-		return False
-
-
-def hover_on_xpath(driver: webdriver.Chrome, xpath: str, timeout: float = 5.0) -> bool:
-	"""Similar a `hover_on_selector` pero busca por XPath en lugar de CSS selector."""
-	try:
-		end = time.time() + float(timeout)
-		while time.time() < end:
-			try:
-				el = driver.find_element(By.XPATH, xpath)
-			except Exception:
-				el = None
-			if not el:
-				time.sleep(1)
-				continue
-
-			try:
-				driver.execute_script("arguments[0].scrollIntoView({block:'center', inline:'nearest'});", el)
-			except Exception:
-				pass
-
-			try:
-				ActionChains(driver).move_to_element(el).perform()
-				LOG.info("hover_on_xpath: move_to_element realizado para %s", xpath)
-			except Exception:
-				LOG.debug("hover_on_xpath: ActionChains falló", exc_info=True)
-
-			try:
-				js = (
-					"var e = new MouseEvent('mouseover', {bubbles:true, cancelable:true});"
-					"arguments[0].dispatchEvent(e);"
-					"var e2 = new MouseEvent('mouseenter', {bubbles:true, cancelable:true});"
-					"arguments[0].dispatchEvent(e2);"
-				)
-				driver.execute_script(js, el)
-				LOG.info("hover_on_xpath: eventos mouseover/mouseenter despachados para %s", xpath)
-			except Exception:
-				LOG.debug("hover_on_xpath: dispatch JS falló", exc_info=True)
-
-			time.sleep(corto_tiempo)
-			return True
-
-		LOG.debug("hover_on_xpath: no se encontró %s", xpath)
-		return False
+		return driver.execute_async_script(_JS_ESPERAR, _paso_js(selector, by), visible, int(timeout * 1000))
 	except Exception:
-		LOG.exception("hover_on_xpath: excepción inesperada")
-		return False
-
-
-def click_button_by_selector(driver: webdriver.Chrome, selector: str, timeout: float = 5.0) -> bool:
-	"""Buscar y clicar un botón identificado por `selector`.
-
-	Intentos: encontrar, scrollIntoView, click directo, ActionChains click, o click vía JS.
-	"""
-	try:
-		end = time.time() + float(timeout)
-		while time.time() < end:
-			try:
-				btn = driver.find_element(By.CSS_SELECTOR, selector)
-			except Exception:
-				btn = None
-			if not btn:
-				time.sleep(0.25)
-				continue
+		LOG.debug('esperar_elemento: fallo esperando %s', selector, exc_info=True)
+		return None
 
-			try:
-				driver.execute_script("arguments[0].scrollIntoView({block:'center', inline:'nearest'});", btn)
-			except Exception:
-				pass
 
-			try:
-				btn.click()
-				LOG.info("click_button_by_selector: click directo en %s", selector)
-				return True
-			except Exception:
-				try:
-					ActionChains(driver).move_to_element(btn).click().perform()
-					LOG.info("click_button_by_selector: click via ActionChains en %s", selector)
-					return True
-				except Exception:
-					try:
-						driver.execute_script("arguments[0].click();", btn)
-						LOG.info("click_button_by_selector: click via JS en %s", selector)
-						return True
-					except Exception:
-						LOG.debug("click_button_by_selector: intento de click falló para %s", selector, exc_info=True)
-			time.sleep(0.2)
-		LOG.debug("click_button_by_selector: no se encontró %s", selector)
-		return False
-	except Exception:
-		LOG.exception("click_button_by_selector: excepción inesperada")
-		return False
+def _clicar(driver: webdriver.Chrome, el, estrategia: str) -> None:
+	if estrategia == 'directo':
+		el.click()
+	elif estrategia == 'actions':
+		ActionChains(driver).move_to_element(el).click().perform()
+	else:
+		driver.execute_script("arguments[0].click();", el)
 
 
-def click_button_by_xpath(driver: webdriver.Chrome, xpath: str, timeout: float = 5.0) -> bool:
-	"""Buscar y clicar un botón identificado por `xpath`.
+@trazas.medido('click')
+def click_elemento(driver: webdriver.Chrome, selector: str, by: str = By.CSS_SELECTOR, timeout: float = 5.0,
+				   siguiente: str | None = None, preferida: str = 'directo') -> bool:
+	"""Clicar `selector` empezando por la estrategia que funcionó la última vez.
 
-	Intenta: encontrar, scrollIntoView, click directo, ActionChains click, o click vía JS.
+	Con `siguiente` (CSS), un click sólo cuenta si después aparece ese selector; si
+	no, se prueba la siguiente estrategia. La que funciona queda en `_ESTRATEGIA_CLICK`.
 	"""
-	try:
-		end = time.time() + float(timeout)
-		while time.time() < end:
-			try:
-				btn = driver.find_element(By.XPATH, xpath)
-			except Exception:
-				btn = None
-			if not btn:
-				time.sleep(0.25)
-				continue
-
-			try:
-				driver.execute_script("arguments[0].scrollIntoView({block:'center', inline:'nearest'});", btn)
-			except Exception:
-				pass
-
-			try:
-				btn.click()
-				LOG.info("click_button_by_xpath: click directo en %s", xpath)
-				return True
-			except Exception:
-				try:
-					ActionChains(driver).move_to_element(btn).click().perform()
-					LOG.info("click_button_by_xpath: click via ActionChains en %s", xpath)
-					return True
-				except Exception:
-					try:
-						driver.execute_script("arguments[0].click();", btn)
-						LOG.info("click_button_by_xpath: click via JS en %s", xpath)
-						return True
-					except Exception:
-						LOG.debug("click_button_by_xpath: intento de click falló para %s", xpath, exc_info=True)
-			time.sleep(0.2)
-		LOG.debug("click_button_by_xpath: no se encontró %s", xpath)
-		return False
-	except Exception:
-		LOG.exception("click_button_by_xpath: excepción inesperada")
+	el = esperar_elemento(driver, selector, by, timeout)
+	if el is None:
+		LOG.debug('click_elemento: no se encontró %s', selector)
 		return False
+	primera = _ESTRATEGIA_CLICK.get(selector, preferida)
+	for n, estrategia in enumerate([primera] + [e for e in _ORDEN_CLICK if e != primera]):
+		if n:
+			trazas.anotar_reintento()
+		trazas.anotar_rama(estrategia)
+		try:
+			_clicar(driver, el, estrategia)
+		except Exception:
+			LOG.debug('click_elemento: click %s falló en %s', estrategia, selector, exc_info=True)
+			continue
+		if siguiente and esperar_elemento(driver, siguiente, timeout=timeout) is None:
+			LOG.debug('click_elemento: click %s en %s no mostró %s', estrategia, selector, siguiente)
+			continue
+		_ESTRATEGIA_CLICK[selector] = estrategia
+		LOG.info('click_elemento: click %s en %s', estrategia, selector)
+		return True
+	return False
 
 
-def click_export_url(driver: webdriver.Chrome, selector: str = 'a.export-url', timeout: float = 10.0) -> bool:
-	"""Esperar y clicar el enlace de exportación visible con clase `export-url`.
+@trazas.medido('menu')
+def click_cadena(driver: webdriver.Chrome, selectores: list[str], siguiente: str | None = None, timeout: float = 5.0) -> bool:
+	"""Clicar en orden una secuencia de menús (p.ej. "Más" -> export-group -> export).
 
-	El href puede cambiar dinámicamente; por eso buscamos el ancla por clase y clickeamos.
+	Los pasos consecutivos cuya estrategia es 'js' (o aún no se conoce) y cuyo efecto
+	se puede comprobar, porque tienen otro paso detrás, se resuelven en una sola llamada:
+	el navegador espera cada elemento y lo clica. Si el click JS de un paso falla,
+	ese paso se repite con `click_elemento` y se recuerda la estrategia que funcionó;
+	si se hizo pero no mostró el paso siguiente, la cadena falla y ese paso usará el
+	click nativo en adelante. `timeout` es la espera máxima de cada paso.
 	"""
-	try:
-		end = time.time() + float(timeout)
-		while time.time() < end:
-			try:
-				a = driver.find_element(By.CSS_SELECTOR, selector)
-			except Exception:
-				a = None
-			if not a:
-				time.sleep(0.5)
-				continue
-
-			try:
-				href = a.get_attribute('href') or a.get_attribute('ng-href')
-			except Exception:
-				href = None
-
-			try:
-				driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", a)
-			except Exception:
-				pass
+	pasos = list(selectores) + ([siguiente] if siguiente else [])
+	i = 0
+	while i < len(selectores):
+		j = i
+		while j < len(pasos) - 1 and _ESTRATEGIA_CLICK.get(pasos[j], 'js') == 'js':
+			j += 1
+		if j == i:
+			sig = pasos[i + 1] if i + 1 < len(pasos) else None
+			if not click_elemento(driver, pasos[i], timeout=timeout, siguiente=sig):
+				LOG.info('click_cadena: no se pudo clicar %s', pasos[i])
+				return False
+			i += 1
+			continue
+		_asegurar_timeout_script(driver, timeout * (j - i + 1) + 5.0)
+		try:
+			hechos, fallo = driver.execute_async_script(
+				_JS_CADENA, [_paso_js(p) for p in pasos[i:j]], _paso_js(pasos[j]), int(timeout * 1000))
+			hechos = int(hechos)
+		except Exception:
+			LOG.debug('click_cadena: fallo ejecutando la cadena %s', pasos[i:j], exc_info=True)
+			hechos, fallo = 0, False
+		for p in pasos[i:i + max(hechos - 1, 0)]:
+			_ESTRATEGIA_CLICK[p] = 'js'
+		if hechos == j - i + 1:
+			LOG.info('click_cadena: %d pasos clicados en el navegador (%s)', j - i, ' -> '.join(pasos[i:j]))
+			i = j
+			continue
+		if hechos == 0:
+			LOG.info('click_cadena: no se encontró %s', pasos[i])
+			return False
+		k = i + hechos - 1
+		if not fallo:
+			# el click JS se hizo pero no mostró el paso siguiente: repetirlo a ciegas
+			# podría deshacer el menú; la próxima vez este paso irá con click nativo
+			_ESTRATEGIA_CLICK[pasos[k]] = 'directo'
+			LOG.info('click_cadena: el click en %s no mostró %s', pasos[k], pasos[k + 1])
+			return False
+		# el click JS en pasos[k] falló: repetir con click nativo
+		trazas.anotar_rama('click_nativo')
+		if not click_elemento(driver, pasos[k], timeout=timeout, siguiente=pasos[k + 1]):
+			LOG.info('click_cadena: no se pudo clicar %s', pasos[k])
+			return False
+		i = k + 1
+	return True
 
-			try:
-				# Preferimos dispatch JS porque abre en nueva pestaña si target=_blank
-				driver.execute_script("arguments[0].click();", a)
-				LOG.info("click_export_url: clicado enlace %s (href=%s)", selector, href)
-				return True
-			except Exception:
-				try:
-					a.click()
-					LOG.info("click_export_url: clicado elemento via click() %s (href=%s)", selector, href)
-					return True
-				except Exception:
-					LOG.debug("click_export_url: intento de click falló para %s", selector, exc_info=True)
 
-			time.sleep(0.2)
-		LOG.debug("click_export_url: no se encontró %s dentro del timeout", selector)
-		return False
-	except Exception:
-		LOG.exception("click_export_url: excepción inesperada")
-		return False
+_JS_EVENTOS_HOVER = (
+	"var e = new MouseEvent('mouseover', {bubbles:true, cancelable:true});"
+	"arguments[0].dispatchEvent(e);"
+	"var e2 = new MouseEvent('mouseenter', {bubbles:true, cancelable:true});"
+	"arguments[0].dispatchEvent(e2);"
+)
 
 
-def click_export_link_with_fallback(driver: webdriver.Chrome, timeout: float = 6.0) -> bool:
-	"""Intentar localizar y clicar el enlace de descarga de export directamente.
+@trazas.medido('hover')
+def hover_elemento(driver: webdriver.Chrome, selector: str, by: str = By.CSS_SELECTOR, timeout: float = 5.0,
+				   listo: str | None = None) -> bool:
+	"""Simular hover sobre `selector` sin pasar nunca de `timeout` en total.
 
-	Estrategia:
-	- intentar la clase conocida `a.export-url`
-	- buscar anchors con href que contengan '.xlsx'
-	- buscar anchors cuyo texto contenga 'export' o 'exportar' (case-insensitive)
-	- click via JS o ActionChains
+	Mueve el cursor virtual con ActionChains y además despacha mouseover/mouseenter
+	por JS, porque algunas UIs reaccionan sólo a eventos. Con `listo` (CSS) el hover
+	sólo cuenta cuando ese selector se hace visible (p.ej. el botón "Más" de la barra
+	de navegación del objeto); si no aparece, se repite el hover con una ventana de
+	espera creciente (0.25 s, 0.5 s, 1 s) hasta agotar el plazo.
 	"""
-	try:
-		# intento rápido con la clase que ya usamos
-		if click_export_url(driver, selector='a.export-url', timeout=2.0):
+	fin = time.monotonic() + float(timeout)
+	ventana = 0.25
+	intentos = 0
+	while True:
+		restante = fin - time.monotonic()
+		if restante <= 0:
+			break
+		el = esperar_elemento(driver, selector, by, timeout=restante)
+		if el is None:
+			LOG.debug("hover_elemento: no se encontró %s", selector)
+			return False
+		intentos += 1
+		if intentos > 1:
+			trazas.anotar_reintento()
+		try:
+			ActionChains(driver).move_to_element(el).perform()
+		except Exception:
+			LOG.debug("hover_elemento: ActionChains falló", exc_info=True)
+		try:
+			driver.execute_script(_JS_EVENTOS_HOVER, el)
+		except Exception:
+			LOG.debug("hover_elemento: dispatch JS falló", exc_info=True)
+		if not listo:
+			LOG.info("hover_elemento: hover realizado en %s", selector)
+			return True
+		restante = fin - time.monotonic()
+		if restante <= 0:
+			break
+		if esperar_elemento(driver, listo, timeout=min(ventana, restante)) is not None:
+			LOG.info("hover_elemento: hover en %s listo (%s visible) tras %d intento(s)", selector, listo, intentos)
 			return True
+		ventana = min(ventana * 2, 1.0)
+	LOG.debug("hover_elemento: %s no quedó listo en %.1fs (%d intento(s))", selector, timeout, intentos)
+	return False
 
-		end = time.time() + float(timeout)
-		xpaths = [
-			"//a[contains(translate(@href,'ABCDEFGHIJKLMNOPQRSTUVWXYZ','abcdefghijklmnopqrstuvwxyz'),'.xlsx') ]",
-			"//a[contains(translate(normalize-space(.),'ABCDEFGHIJKLMNOPQRSTUVWXYZ','abcdefghijklmnopqrstuvwxyz'),'export') ]",
-			"//a[contains(translate(normalize-space(.),'ABCDEFGHIJKLMNOPQRSTUVWXYZ','abcdefghijklmnopqrstuvwxyz'),'exportar') ]",
-		]
 
-		while time.time() < end:
-			for xp in xpaths:
-				try:
-					els = driver.find_elements(By.XPATH, xp)
-				except Exception:
-					els = []
-				if not els:
-					continue
-				for el in els:
-					try:
-						if not el.is_displayed():
-							continue
-					except Exception:
-						pass
-					try:
-						driver.execute_script("arguments[0].scrollIntoView({block:'center'});", el)
-					except Exception:
-						pass
-					try:
-						driver.execute_script("arguments[0].click();", el)
-						LOG.info("click_export_link_with_fallback: clicado anchor por XPath: %s", xp)
-						return True
-					except Exception:
-						try:
-							ActionChains(driver).move_to_element(el).click().perform()
-							LOG.info("click_export_link_with_fallback: clicado anchor via ActionChains por XPath: %s", xp)
-							return True
-						except Exception:
-							LOG.debug("click_export_link_with_fallback: fallo al clicar anchor por XPath: %s", xp, exc_info=True)
-			time.sleep(0.3)
-
-		LOG.debug('click_export_link_with_fallback: no se encontró anchor de descarga dentro del timeout')
-		return False
-	except Exception:
-		LOG.exception('click_export_link_with_fallback: excepción inesperada')
-		return False
+# Anchors de descarga alternativos a `a.export-url`: href con .xlsx o texto 'export'/'exportar'
+_XPATH_ENLACES_EXPORT = ' | '.join((
+	"//a[contains(translate(@href,'ABCDEFGHIJKLMNOPQRSTUVWXYZ','abcdefghijklmnopqrstuvwxyz'),'.xlsx')]",
+	"//a[contains(translate(normalize-space(.),'ABCDEFGHIJKLMNOPQRSTUVWXYZ','abcdefghijklmnopqrstuvwxyz'),'export')]",
+))
 
 
 def bring_browser_to_front(driver: webdriver.Chrome, url_substring: str | None = None) -> bool:
@@ -571,7 +431,10 @@ def bring_browser_to_front(driver: webdriver.Chrome, url_substring: str | None =
 	- ejecutar `window.focus()` via JS
 	- intentar usar `pywinauto` para localizar la ventana por título y `set_focus()` (Windows)
 	- devolver True si alguno de los métodos parece haber tenido éxito
+	En el perfil 'produccion' (headless) no hay ventana que enfocar.
 	"""
+	if perfil_navegador() == PERFIL_PRODUCCION:
+		return False
 	try:
 		try:
 			driver.execute_script("window.focus();")
@@ -622,134 +485,447 @@ def bring_browser_to_front(driver: webdriver.Chrome, url_substring: str | None =
 		return False
 
 
-def find_latest_downloaded_file(directory: str, pattern: str = '*.xlsx', since_ts: float | None = None, timeout: float = 30.0) -> str | None:
-	"""Buscar el fichero más reciente que coincida con pattern en `directory`.
+# Techos (segundos) de las esperas por condición usadas en `run_once`.
+# Cada espera termina en cuanto su condición se cumple; el techo sólo acota el
+# peor caso. Se pueden ajustar con variables de entorno QLIK_ESPERA_<NOMBRE>,
+# p.ej. QLIK_ESPERA_POST_LOGIN=45.
+LIMITES_ESPERA = {
+	'carga_inicial': 25.0,
+	'login': 15.0,
+	'post_login': 30.0,
+	'post_hover': 15.0,
+	'menu_mas': 10.0,
+	'inicio_descarga': 8.0,
+	'descarga': 38.0,
+	'carga_hoja': 30.0,
+	'motor_inactivo': 20.0,
+}
+
+# Indicadores de carga que Qlik Sense muestra mientras el motor calcula
+SELECTORES_CARGA_QLIK = (
+	'.qv-loader',
+	'.qv-animated-loader',
+	'.qv-object-loading',
+	'.qv-loading',
+)
+
+
+def limite_espera(nombre: str) -> float:
+	"""Devolver el techo configurado para la espera `nombre` (env > `LIMITES_ESPERA`)."""
+	defecto = LIMITES_ESPERA.get(nombre, 30.0)
+	valor = _os.environ.get(f'QLIK_ESPERA_{nombre.upper()}')
+	if not valor:
+		return defecto
+	try:
+		return max(0.0, float(valor))
+	except ValueError:
+		LOG.warning('limite_espera: valor inválido para QLIK_ESPERA_%s=%r, usando %.1fs', nombre.upper(), valor, defecto)
+		return defecto
 
-	- `since_ts`: si se proporciona, devolver sólo archivos con mtime >= since_ts - 2s
-	- devuelve la ruta absoluta o None si no se encuentra en el timeout
+
+def esperar_condicion(condicion, nombre: str, timeout: float | None = None, intervalo: float = 0.25, estable: float = 0.0) -> bool:
+	"""Esperar hasta que `condicion()` devuelva un valor verdadero.
+
+	- `timeout`: techo de la espera; si es None se usa `limite_espera(nombre)`.
+	- `estable`: segundos que la condición debe mantenerse cierta de forma continua
+	  (útil para indicadores de carga que parpadean).
+	- Las excepciones de `condicion` cuentan como "todavía no".
+
+	Registra siempre cuánto se esperó realmente (también como tramo `espera:<nombre>`).
+	Devuelve True si la condición se cumplió dentro del techo, False si se agotó.
 	"""
-	end = time.time() + float(timeout)
-	d = Path(directory).expanduser()
-	if not d.exists():
-		LOG.debug("find_latest_downloaded_file: directorio no existe %s", d)
-		return None
+	with trazas.tramo(f'espera:{nombre}') as t:
+		t.ok = _esperar_condicion(condicion, nombre, timeout, intervalo, estable)
+	return t.ok
 
-	while time.time() < end:
-		files = list(d.glob(pattern))
-		if not files:
-			time.sleep(0.5)
-			continue
-		# escoger el más reciente
-		files_sorted = sorted(files, key=lambda p: p.stat().st_mtime, reverse=True)
-		candidate = files_sorted[0]
+
+def _esperar_condicion(condicion, nombre: str, timeout: float | None, intervalo: float, estable: float) -> bool:
+	techo = limite_espera(nombre) if timeout is None else float(timeout)
+	inicio = time.monotonic()
+	fin = inicio + techo
+	cierta_desde = None
+	while True:
 		try:
-			mtime = candidate.stat().st_mtime
+			ok = bool(condicion())
 		except Exception:
-			time.sleep(0.5)
-			continue
-		if since_ts is None or mtime >= (since_ts - 2.0):
+			ok = False
+		ahora = time.monotonic()
+		if ok:
+			if cierta_desde is None:
+				cierta_desde = ahora
+			if ahora - cierta_desde >= estable:
+				LOG.info('Espera "%s": condición cumplida en %.2fs (techo %.1fs)', nombre, ahora - inicio, techo)
+				return True
+		else:
+			cierta_desde = None
+		restante = fin - ahora
+		if restante <= 0:
+			LOG.warning('Espera "%s": techo de %.1fs agotado sin cumplirse la condición', nombre, techo)
+			return False
+		time.sleep(min(intervalo, restante))
+
+
+def qlik_pagina_lista(driver: webdriver.Chrome) -> bool:
+	"""True cuando el documento terminó de cargar y muestra el login o la app de Qlik."""
+	js = (
+		"if (document.readyState !== 'complete') return false;"
+		"return !!(document.querySelector(\"input[type='password']\") || document.querySelector('#qv-page-container'));"
+	)
+	return bool(driver.execute_script(js))
+
+
+# Mismo criterio de visibilidad que el localizador: `offsetParent` es null también
+# para elementos visibles con position: fixed (overlays de carga)
+_JS_MOTOR_INACTIVO = _JS_LOCALIZADOR + """
+if (document.readyState !== 'complete') return false;
+if (!document.querySelector('#qv-page-container')) return false;
+var loaders = document.querySelectorAll(arguments[0]);
+for (var i = 0; i < loaders.length; i++) { if (visible(loaders[i])) return false; }
+return true;
+"""
+
+
+def qlik_motor_inactivo(driver: webdriver.Chrome) -> bool:
+	"""True cuando la hoja de Qlik está montada y no hay indicadores de carga visibles."""
+	return bool(driver.execute_script(_JS_MOTOR_INACTIVO, ', '.join(SELECTORES_CARGA_QLIK)))
+
+
+def esperar_motor_inactivo(driver: webdriver.Chrome, nombre: str = 'motor_inactivo', timeout: float | None = None) -> bool:
+	"""Esperar a que el motor de Qlik termine de calcular (sin loaders durante 0.5 s)."""
+	return esperar_condicion(lambda: qlik_motor_inactivo(driver), nombre, timeout=timeout, intervalo=0.25, estable=0.5)
+
+
+def esperar_inicio_descarga(directory: str, since_ts: float, nombre: str = 'inicio_descarga', timeout: float | None = None) -> bool:
+	"""Esperar a que aparezca en `directory` un .xlsx o .crdownload posterior a `since_ts`."""
+	d = Path(directory).expanduser()
+
+	def _iniciada() -> bool:
+		for pattern in ('*.xlsx', '*.crdownload'):
+			for p in d.glob(pattern):
+				try:
+					if p.stat().st_mtime >= since_ts - 2.0:
+						return True
+				except OSError:
+					continue
+		return False
+	return esperar_condicion(_iniciada, nombre, timeout=timeout, intervalo=0.2)
+
+
+# Ficheros que Chrome usa mientras la descarga sigue en curso
+SUFIJOS_DESCARGA_PARCIAL = ('.crdownload', '.tmp', '.part')
+
+
+def descarga_completa(directory: str, suffix: str = '.xlsx', since_ts: float | None = None) -> str | None:
+	"""Ruta del fichero `suffix` ya terminado en `directory` (carpeta dedicada), o None.
+
+	Chrome escribe en un `.crdownload` y lo renombra al nombre final sólo al
+	terminar; mientras quede algún parcial en la carpeta se considera en curso.
+	"""
+	encontrado = None
+	try:
+		with os.scandir(directory) as it:
+			for entry in it:
+				nombre = entry.name.lower()
+				if nombre.endswith(SUFIJOS_DESCARGA_PARCIAL) or nombre.startswith('.com.google.chrome'):
+					return None
+				if not nombre.endswith(suffix) or not entry.is_file():
+					continue
+				st = entry.stat()
+				if st.st_size == 0 or (since_ts is not None and st.st_mtime < since_ts - 2.0):
+					continue
+				if encontrado is None or st.st_mtime > encontrado[0]:
+					encontrado = (st.st_mtime, entry.path)
+	except OSError:
+		return None
+	return encontrado[1] if encontrado else None
+
+
+def esperar_descarga(directory: str, since_ts: float, suffix: str = '.xlsx', nombre: str = 'descarga', timeout: float | None = None) -> str | None:
+	"""Esperar a que termine la descarga en la carpeta dedicada `directory` y devolver su ruta.
+
+	La carpeta sólo contiene las descargas de este driver, así que basta con
+	mirarla cada 50 ms: el fichero se detecta en cuanto Chrome lo renombra.
+	"""
+	resultado = []
+
+	def _terminada() -> bool:
+		ruta = descarga_completa(directory, suffix=suffix, since_ts=since_ts)
+		if ruta:
+			resultado.append(ruta)
+		return bool(ruta)
+	esperar_condicion(_terminada, nombre, timeout=timeout, intervalo=0.05)
+	return resultado[-1] if resultado else None
+
+
+def find_latest_downloaded_file(directory: str, pattern: str = '*.xlsx', since_ts: float | None = None, timeout: float = 30.0) -> str | None:
+	"""Buscar el fichero más reciente que coincida con pattern en `directory`.
+
+	- `since_ts`: si se proporciona, devolver sólo archivos con mtime >= since_ts - 2s
+	- devuelve la ruta absoluta o None si no se encuentra en el timeout
+	"""
+	end = time.time() + float(timeout)
+	d = Path(directory).expanduser()
+	if not d.exists():
+		LOG.debug("find_latest_downloaded_file: directorio no existe %s", d)
+		return None
+
+	while time.time() < end:
+		files = list(d.glob(pattern))
+		if not files:
+			time.sleep(0.5)
+			continue
+		# escoger el más reciente
+		files_sorted = sorted(files, key=lambda p: p.stat().st_mtime, reverse=True)
+		candidate = files_sorted[0]
+		try:
+			mtime = candidate.stat().st_mtime
+		except Exception:
+			time.sleep(0.5)
+			continue
+		if since_ts is None or mtime >= (since_ts - 2.0):
 			return str(candidate)
 		time.sleep(0.5)
 	return None
 
 
-def extract_excel_contents(path: str) -> dict | None:
-	"""Extraer contenido del Excel en `path`.
+# Sesión HTTP compartida (pool keep-alive) para bajar exports sin pasar por el navegador
+_SESION_EXPORT = None
+_SESION_EXPORT_LOCK = threading.Lock()
+
+
+def _sesion_export():
+	global _SESION_EXPORT
+	with _SESION_EXPORT_LOCK:
+		if _SESION_EXPORT is None:
+			import requests
+			from requests.adapters import HTTPAdapter
+			sesion = requests.Session()
+			adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+			sesion.mount('https://', adapter)
+			sesion.mount('http://', adapter)
+			_SESION_EXPORT = sesion
+		return _SESION_EXPORT
+
+
+def obtener_url_export(driver: webdriver.Chrome, selector: str = 'a.export-url', timeout: float = 10.0) -> str | None:
+	"""Esperar al enlace de exportación y devolver su URL absoluta (sin clicarlo)."""
+	js = (
+		"var a = document.querySelector(arguments[0]);"
+		"if (!a) return null;"
+		"return a.href || a.getAttribute('ng-href') || null;"
+	)
+	resultado = []
+
+	def _url() -> bool:
+		href = driver.execute_script(js, selector)
+		if href:
+			resultado.append(urllib.parse.urljoin(driver.current_url, href))
+		return bool(href)
+	esperar_condicion(_url, 'url_export', timeout=timeout, intervalo=0.2)
+	return resultado[-1] if resultado else None
+
 
-	Retorna un dict {sheet_name: [row_dicts]}. Usa pandas si está disponible, else openpyxl.
+@trazas.medido('descarga_http')
+def descargar_export_en_memoria(driver: webdriver.Chrome, url: str, timeout: float = 60.0) -> io.BytesIO | None:
+	"""Bajar `url` con las cookies de sesión de `driver` directamente a memoria.
+
+	Devuelve un BytesIO con el .xlsx (listo para `extract_excel_contents`) o None
+	si la respuesta no es un fichero Office Open XML.
 	"""
-	def format_number_es(value: float, decimals: int) -> str:
-		# Formatear número con separador de miles '.' y decimal ','
+	cookies = {c['name']: c['value'] for c in driver.get_cookies()}
+	headers = {'Referer': driver.current_url}
+	try:
+		headers['User-Agent'] = driver.execute_script('return navigator.userAgent;')
+	except Exception:
+		pass
+	inicio = time.monotonic()
+	try:
+		with _sesion_export().get(url, cookies=cookies, headers=headers, stream=True, timeout=timeout) as resp:
+			resp.raise_for_status()
+			buf = io.BytesIO()
+			for chunk in resp.iter_content(chunk_size=256 * 1024):
+				buf.write(chunk)
+	except Exception:
+		LOG.warning('descargar_export_en_memoria: fallo bajando %s', url, exc_info=True)
+		return None
+	# un .xlsx es un zip: si no empieza por 'PK' es la página de login u otro error
+	if not buf.getvalue().startswith(b'PK'):
+		LOG.warning('descargar_export_en_memoria: la respuesta de %s no es un .xlsx (%d bytes)', url, buf.tell())
+		return None
+	LOG.info('descargar_export_en_memoria: %d bytes en %.2fs', buf.tell(), time.monotonic() - inicio)
+	buf.seek(0)
+	return buf
+
+
+def format_number_es(value: float, decimals: int) -> str:
+	# Formatear número con separador de miles '.' y decimal ','
+	try:
+		fmt = f"{abs(value):,.{decimals}f}"
+		# swap comma and dot to European format
+		tmp = fmt.replace(',', 'X')
+		tmp = tmp.replace('.', ',')
+		tmp = tmp.replace('X', '.')
+		return tmp
+	except Exception:
+		return str(value)
+
+
+# Intercambio ',' <-> '.' de una sola pasada (equivale a los tres replace de `format_number_es`)
+_SWAP_SEPARADORES = str.maketrans({',': '.', '.': ','})
+
+
+# Caché number_format -> (es_formato_fecha, render numérico); ver `_formato_compilado`
+_FORMATOS_COMPILADOS: dict = {}
+
+
+def _formato_compilado(number_format: str | None) -> tuple[bool, object]:
+	"""Devolver (es_formato_fecha, render) para `number_format`, compilándolo la primera vez."""
+	entry = _FORMATOS_COMPILADOS.get(number_format)
+	if entry is None:
 		try:
-			fmt = f"{abs(value):,.{decimals}f}"
-			# swap comma and dot to European format
-			tmp = fmt.replace(',', 'X')
-			tmp = tmp.replace('.', ',')
-			tmp = tmp.replace('X', '.')
-			return tmp
+			from openpyxl.styles import is_date_format
+			es_fecha = bool(is_date_format(number_format))
 		except Exception:
-			return str(value)
+			es_fecha = False
+		entry = (es_fecha, _compilar_formato_numerico(number_format or ''))
+		_FORMATOS_COMPILADOS[number_format] = entry
+	return entry
 
-	def format_cell_display(cell) -> str:
-		try:
-			val = cell.value
-			nf = (cell.number_format or '').lower()
-			if val is None:
-				return ''
-			# Dates
-			if hasattr(cell, 'is_date') and cell.is_date:
-				try:
-					if isinstance(val, datetime):
-						return val.isoformat()
-					return str(val)
-				except Exception:
-					return str(val)
-
-			# Numeric formatting
-			if isinstance(val, (int, float)):
-				# percentage
-				if '%' in nf:
-					# decidir decimales por la presencia de '0.0' en el formato
-					decimals = 1 if '0.0' in nf or '0,0' in nf else 0
-					perc = val * 100
-					s = format_number_es(perc, decimals)
-					return ("-" + s + "%") if perc < 0 else (s + "%")
-
-				# currency
-				if '$' in nf or '€' in nf or '¤' in nf:
-					# intentar deducir decimales
-					decimals = 0
-					if '0.00' in nf or '0,00' in nf:
-						decimals = 2
-					s = format_number_es(val, decimals)
-					sign = '-' if val < 0 else ''
-					symbol = '$' if '$' in nf else ('€' if '€' in nf else '')
-					# Devolver número limpio (sin signo de moneda ni separadores)
-					cleaned = re.sub(r'[^0-9\-]', '', sign + s)
-					return cleaned
-
-				# default numeric
-				# si es prácticamente entero, no mostrar decimales
-				if abs(val - round(val)) < 0.005:
-					s = format_number_es(round(val), 0)
-					return s
-				else:
-					s = format_number_es(val, 2)
-					return s
 
-			# strings
-			return str(val)
-		except Exception:
+def _compilar_formato_numerico(number_format: str):
+	"""Compilar `number_format` en una función valor numérico -> texto mostrado.
+
+	Las decisiones que dependen sólo del formato (porcentaje, moneda, decimales)
+	se toman una vez por formato; dentro de una columna el formato casi nunca
+	cambia. La salida es idéntica a la de `format_number_es` + las reglas de
+	`format_cell_display`.
+	"""
+	nf = (number_format or '').lower()
+
+	# percentage
+	if '%' in nf:
+		# decidir decimales por la presencia de '0.0' en el formato
+		spec = ',.1f' if '0.0' in nf or '0,0' in nf else ',.0f'
+
+		def _porcentaje(val) -> str:
+			perc = val * 100
+			s = format(abs(perc), spec).translate(_SWAP_SEPARADORES)
+			return ("-" + s + "%") if perc < 0 else (s + "%")
+		return _porcentaje
+
+	# currency: número limpio (sin signo de moneda ni separadores)
+	if '$' in nf or '€' in nf or '¤' in nf:
+		decimals = 2 if '0.00' in nf or '0,00' in nf else 0
+		spec = f'.{decimals}f'
+
+		def _moneda(val) -> str:
+			digits = format(abs(val), spec).replace('.', '')
+			if not digits.isdigit():
+				# inf/nan: conservar el comportamiento del filtro por regex
+				return re.sub(r'[^0-9\-]', '', ('-' if val < 0 else '') + format_number_es(val, decimals))
+			return ('-' + digits) if val < 0 else digits
+		return _moneda
+
+	# default numeric: si es prácticamente entero, no mostrar decimales
+	def _numero(val) -> str:
+		r = round(val)
+		if abs(val - r) < 0.005:
+			return format(abs(r), ',.0f').translate(_SWAP_SEPARADORES)
+		return format(abs(val), ',.2f').translate(_SWAP_SEPARADORES)
+	return _numero
+
+
+def format_cell_display(cell) -> str:
+	"""Texto mostrado de una celda openpyxl (formato es: miles '.', decimal ',')."""
+	try:
+		val = cell.value
+		if val is None:
+			return ''
+		es_fecha_fmt, render = _formato_compilado(cell.number_format)
+		# Dates (mismo criterio que `Cell.is_date` de openpyxl, sin repetir la regex por celda)
+		data_type = getattr(cell, 'data_type', None)
+		if data_type is not None:
+			is_date = data_type == 'd' or (data_type == 'n' and es_fecha_fmt)
+		else:
+			is_date = hasattr(cell, 'is_date') and cell.is_date
+		if is_date:
 			try:
-				return str(cell.value)
+				if isinstance(val, datetime):
+					return val.isoformat()
+				return str(val)
 			except Exception:
-				return ''
+				return str(val)
+
+		# Numeric formatting
+		if isinstance(val, (int, float)):
+			return render(val)
+
+		# strings
+		return str(val)
+	except Exception:
+		try:
+			return str(cell.value)
+		except Exception:
+			return ''
+
+
+def iter_excel_sheets(path) -> Iterator[tuple[str, Iterator[dict]]]:
+	"""Recorrer el Excel en streaming: produce (nombre_hoja, generador de row_dicts).
+
+	Usa openpyxl en modo `read_only`, así que la memoria no crece con el número de
+	filas mientras el consumidor procese cada fila y la descarte. Los generadores de
+	filas deben consumirse en orden (antes de pasar a la siguiente hoja).
+	`path` puede ser una ruta o un objeto tipo fichero.
+	"""
+	from openpyxl import load_workbook
+	wb = load_workbook(path, read_only=True, data_only=True)
+
+	def _rows(ws) -> Iterator[dict]:
+		rows = ws.iter_rows()
+		first = next(rows, None)
+		if first is None:
+			return
+		headers = [str(c.value if c.value is not None else f'col{i}') for i, c in enumerate(first, start=1)]
+		width = len(headers)
+		for r in rows:
+			# en modo read_only las filas pueden venir más cortas que la cabecera
+			rowd = {h: format_cell_display(cell) for h, cell in zip(headers, r)}
+			if len(r) < width:
+				for h in headers[len(r):]:
+					rowd[h] = ''
+			yield rowd
+
+	try:
+		for sheet in wb.sheetnames:
+			yield sheet, _rows(wb[sheet])
+	finally:
+		wb.close()
+
+
+@trazas.medido('extraccion')
+def extract_excel_contents(path) -> dict | None:
+	"""Extraer contenido del Excel en `path` (ruta u objeto tipo fichero).
 
+	Retorna un dict {sheet_name: [row_dicts]}. Usa openpyxl en streaming
+	(`iter_excel_sheets`): cada fila se añade a la salida según se lee, sin
+	cargar antes la hoja entera. pandas queda como alternativa.
+	"""
 	try:
 		# Preferir openpyxl para conservar formatos mostrados
 		try:
-			from openpyxl import load_workbook
-			wb = load_workbook(path, data_only=True)
 			out = {}
-			for sheet in wb.sheetnames:
-				ws = wb[sheet]
-				rows = list(ws.rows)
-				if not rows:
-					out[sheet] = []
-					continue
-				headers = [ (c.value if c.value is not None else f'col{i}') for i, c in enumerate(rows[0], start=1) ]
-				data = []
-				for r in rows[1:]:
-					rowd = {}
-					for h, cell in zip(headers, r):
-						rowd[str(h)] = format_cell_display(cell)
-					data.append(rowd)
-				out[sheet] = data
+			for sheet, rows in iter_excel_sheets(path):
+				filas = out[sheet] = []
+				append = filas.append
+				for rowd in rows:
+					append(rowd)
 			return out
 		except Exception:
 			LOG.debug('openpyxl no disponible o falló, intentando pandas', exc_info=True)
 			try:
 				import pandas as pd
+				if hasattr(path, 'seek'):
+					path.seek(0)
 				xls = pd.ExcelFile(path)
 				result = {}
 				for sheet in xls.sheet_names:
@@ -771,1313 +947,2301 @@ def extract_excel_contents(path: str) -> dict | None:
 		return None
 
 
-def upload_to_google_sheets(extracted: dict, spreadsheet_id: str, credentials_json_path: str, clear: bool = True, target_sheet: str | None = 'Sheet2') -> bool:
-	"""Subir `extracted` (dict sheet -> list[dict]) a Google Sheets.
+# Sanitizadores de celdas para Google Sheets; `construir_tabla_sheets` los aplica por columnas
+_COMILLAS_INICIALES = ("'", "\u2019", "\u2018", "`")
+_RE_NO_ENTERO = re.compile(r'[^0-9\-]')
+_RE_ENTERO = re.compile(r'^-?\d+$')
+_RE_NO_DECIMAL = re.compile(r'[^0-9\.\-]')
+_RE_DECIMAL = re.compile(r'^-?\d+(?:\.\d+)?$')
+_RE_ESPACIOS = re.compile(r'\s+')
+_RE_NO_ALFANUM = re.compile(r'[^0-9a-z]')
 
-	- `extracted`: dict devuelto por `extract_excel_contents`.
-	- `spreadsheet_id`: id del spreadsheet (la parte larga de la URL /spreadsheets/d/<id>/... ).
-	- `credentials_json_path`: ruta al JSON de la cuenta de servicio (service account).
-	- `clear`: si True se borra la worksheet antes de escribir.
+# Columnas de Sheet2 que se convierten a número (C,D,E,G,I,K). Los datos empiezan
+# en B, así que el índice dentro de los datos es la columna de la hoja - 1.
+_COLUMNAS_NUMERICAS_SHEET2 = frozenset(ord(letra) - ord('A') - 1 for letra in 'CDEGIK')
 
-	Requiere: `gspread` y `google-auth` (google-auth). Si no están instalados, la función registra y devuelve False.
+
+def _sanitize_cell_value(v: object):
+	"""Sanitize a cell value and coerce numeric-like strings to int/float when appropriate.
+
+	Returns either an int, float, or string (or empty string for None).
+	This removes leading apostrophes (ASCII and typographic), trims whitespace,
+	and attempts to parse European/US formatted numbers (thousands separators
+	and decimal separators) into numeric Python types so gspread writes numeric
+	cells into Google Sheets.
 	"""
 	try:
-		try:
-			import gspread
-			from google.oauth2 import service_account
-		except Exception:
-			LOG.exception('upload_to_google_sheets: faltan dependencias (gspread/google-auth)')
-			return False
-
-		scopes = [
-			'https://www.googleapis.com/auth/spreadsheets',
-			'https://www.googleapis.com/auth/drive'
-		]
-		creds = service_account.Credentials.from_service_account_file(credentials_json_path, scopes=scopes)
-		client = gspread.authorize(creds)
-
-		sh = client.open_by_key(spreadsheet_id)
-
-		# helper: sanitize cell values before uploading to Sheets
-		def _sanitize_cell_value(v: object):
-			"""Sanitize a cell value and coerce numeric-like strings to int/float when appropriate.
-
-			Returns either an int, float, or string (or empty string for None).
-			This removes leading apostrophes (ASCII and typographic), trims whitespace,
-			and attempts to parse European/US formatted numbers (thousands separators
-			and decimal separators) into numeric Python types so gspread writes numeric
-			cells into Google Sheets.
-			"""
-			try:
-				if v is None:
-					return ''
-				s = str(v).strip()
-
-				# remove leading common quotes/apostrophes that force text in Sheets
-				while s and s[0] in ("'", "\u2019", "\u2018", "`"):
-					s = s[1:].lstrip()
-
-				# after cleaning, if empty -> return empty string
-				if s == '':
-					return ''
-
-				# helper: try integer parse by stripping non-digits (keep minus)
-				def _try_int(x: str):
-					cleaned = re.sub(r'[^0-9\-]', '', x)
-					if cleaned and re.match(r'^-?\d+$', cleaned):
-						try:
-							return int(cleaned)
-						except Exception:
-							return None
-					return None
+		if v is None:
+			return ''
+		s = str(v).strip()
 
-				# helper: try float parse handling thousands and decimal separators
-				def _try_float(x: str):
-					t = x.replace(' ', '')
-					# If contains both '.' and ',', decide decimal separator by last occurrence
-					if '.' in t and ',' in t:
-						if t.rfind(',') > t.rfind('.'):
-							# comma likely decimal, dots thousands
-							t2 = t.replace('.', '').replace(',', '.')
-						else:
-							# dot likely decimal, commas thousands
-							t2 = t.replace(',', '')
-					else:
-						# only comma present -> treat comma as decimal
-						if ',' in t and '.' not in t:
-							t2 = t.replace('.', '').replace(',', '.')
-						else:
-							# treat commas as thousands separators
-							t2 = t.replace(',', '')
-
-					# remove any non-numeric/decimal/minus characters
-					t2 = re.sub(r'[^0-9\.\-]', '', t2)
-					if re.match(r'^-?\d+(?:\.\d+)?$', t2):
-						try:
-							return float(t2)
-						except Exception:
-							return None
-					return None
+		# remove leading common quotes/apostrophes that force text in Sheets
+		while s and s[0] in _COMILLAS_INICIALES:
+			s = s[1:].lstrip()
 
-				# Try int first (preferred), then float
-				intval = _try_int(s)
-				if intval is not None:
-					return intval
-				fl = _try_float(s)
-				if fl is not None:
-					# if it's effectively an integer (e.g. 123.0) return int
-					if abs(fl - round(fl)) < 1e-9:
-						return int(round(fl))
-					return fl
-
-				# fallback: return cleaned string
-				return s
-			except Exception:
-				try:
-					return str(v)
-				except Exception:
-					return ''
+		# after cleaning, if empty -> return empty string
+		if s == '':
+			return ''
 
-		# Simple sanitizer that ONLY strips a leading apostrophe/quote and left whitespace
-		def _strip_leading_apostrophe(v: object):
-			try:
-				if v is None:
-					return ''
-				s = str(v)
-				s = s.lstrip()
-				while s and s[0] in ("'", "\u2019", "\u2018", "`"):
-					s = s[1:].lstrip()
-				return s
-			except Exception:
-				try:
-					return str(v)
-				except Exception:
-					return ''
-
-		# Identity sanitizer (leave the value as-is, used to avoid touching Sheet1)
-		def _identity_sanitize(v: object):
-			if v is None:
-				return ''
-			return v
-
-		# Special sanitizer for Sheet1 column C: preserve the displayed formatting
-		# (commas/dots) but DROP the last TWO characters of the displayed string.
-		# Example: '407,918,004' -> '407,918,0' ; '24,774,107,615' -> '24,774,107,6'
-		def _strip_dots_and_drop_decimals(v: object):
+		# Try int first (preferred): strip non-digits (keep minus)
+		cleaned = _RE_NO_ENTERO.sub('', s)
+		if cleaned and _RE_ENTERO.match(cleaned):
 			try:
-				if v is None:
-					return ''
-				s = str(v).strip()
-				# strip leading common quotes/apostrophes that force text in Sheets
-				while s and s[0] in ("'", "\u2019", "\u2018", "`"):
-					s = s[1:].lstrip()
-				# If the displayed string is short, return empty
-				if len(s) <= 2:
-					return ''
-				# Remove the last two characters but preserve the rest (including separators)
-				out = s[:-2].rstrip()
-				return out
+				return int(cleaned)
 			except Exception:
-				try:
-					return str(v)
-				except Exception:
-					return ''
+				pass
 
-		# Si se indicó un target_sheet concreto, escribir la PRIMERA hoja extraída en esa hoja
-		if target_sheet:
+		# then float, handling thousands and decimal separators
+		t = s.replace(' ', '')
+		# If contains both '.' and ',', decide decimal separator by last occurrence
+		if '.' in t and ',' in t:
+			if t.rfind(',') > t.rfind('.'):
+				# comma likely decimal, dots thousands
+				t2 = t.replace('.', '').replace(',', '.')
+			else:
+				# dot likely decimal, commas thousands
+				t2 = t.replace(',', '')
+		elif ',' in t:
+			# only comma present -> treat comma as decimal
+			t2 = t.replace(',', '.')
+		else:
+			# treat commas as thousands separators
+			t2 = t
+		# remove any non-numeric/decimal/minus characters
+		t2 = _RE_NO_DECIMAL.sub('', t2)
+		if _RE_DECIMAL.match(t2):
 			try:
-				first_sheet = next(iter(extracted.keys()))
-				rows = extracted.get(first_sheet, [])
-				safe_name = str(target_sheet)[:100]
-				try:
-					ws = sh.worksheet(safe_name)
-				except Exception:
-					ws = sh.add_worksheet(title=safe_name, rows=max(100, len(rows) + 5), cols=max(10, len(rows[0]) if rows else 10))
+				fl = float(t2)
+			except Exception:
+				fl = None
+			if fl is not None:
+				# if it's effectively an integer (e.g. 123.0) return int
+				if abs(fl - round(fl)) < 1e-9:
+					return int(round(fl))
+				return fl
+
+		# fallback: return cleaned string
+		return s
+	except Exception:
+		try:
+			return str(v)
+		except Exception:
+			return ''
 
-				# Preserve existing header row if present; otherwise use extracted headers.
-				try:
-					existing_headers = ws.row_values(1)
-				except Exception:
-					existing_headers = []
-
-				if not existing_headers:
-					# No header present in sheet -> derive from extracted data (if any)
-					headers = list(rows[0].keys()) if rows else []
-					existing_headers = headers
-
-				# Decide header for column A (fecha) and data headers for B..
-				def _norm(s: str) -> str:
-					return re.sub(r'\s+', ' ', str(s).strip().lower())
-
-				# Detect if sheet already has a fecha/date column in A1
-				header_a = 'fecha'
-				data_headers = list(existing_headers)
-				if data_headers:
-					first_norm = _norm(data_headers[0])
-					if 'fecha' in first_norm or 'date' in first_norm:
-						header_a = existing_headers[0]
-						data_headers = existing_headers[1:]
-
-				# Clear entire sheet and write back the header row starting at B1 (A1 will hold header_a)
-				date_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-				# If clear requested, remove only data rows (row 2 and below) to preserve row 1
-				if clear:
-					try:
-						# clear all rows from 2 to the current row_count
-						try:
-							rc = getattr(ws, 'row_count', None)
-							if rc and isinstance(rc, int) and rc > 1:
-								ws.batch_clear([f"2:{rc}"])
-							else:
-								# fallback: clear a large range of rows to be safe
-								ws.batch_clear(["2:1000"])
-						except Exception:
-							# final fallback
-							ws.batch_clear(["2:1000"])
-					except Exception:
-						pass
 
-					# Additionally, ensure columns D and E (from row 2 downward) are cleared
-					# but only for the Sheet named 'Sheet1' to avoid touching other tabs.
-					try:
-						try:
-							sn_local = str(safe_name).strip().lower() if safe_name else ''
-							if sn_local == 'sheet1':
-								rc_cols = getattr(ws, 'row_count', None) or 1000
-								if isinstance(rc_cols, int) and rc_cols > 1:
-									ws.batch_clear([f"D2:D{rc_cols}", f"E2:E{rc_cols}"])
-								else:
-									ws.batch_clear(["D2:D1000", "E2:E1000"])
-						except Exception:
-							# best-effort fallback when attempting to clear
-							try:
-								if sn_local == 'sheet1':
-									ws.batch_clear(["D2:D1000", "E2:E1000"])
-							except Exception:
-								pass
-					except Exception:
-						pass
+def _strip_leading_apostrophe(v: object):
+	"""Simple sanitizer that ONLY strips a leading apostrophe/quote and left whitespace."""
+	try:
+		if v is None:
+			return ''
+		s = str(v).lstrip()
+		while s and s[0] in _COMILLAS_INICIALES:
+			s = s[1:].lstrip()
+		return s
+	except Exception:
+		try:
+			return str(v)
+		except Exception:
+			return ''
 
-				try:
-					# Write header row only if the sheet has no header yet and
-					# do NOT touch row 1 for Sheet1 or Sheet2 (preserve existing header)
-					sn = str(safe_name).strip().lower() if safe_name else ''
-					header_row = [header_a] + data_headers
-					if not existing_headers and sn not in ('sheet1', 'sheet2'):
-						try:
-							ws.update('A1', [header_row])
-						except Exception:
-							LOG.debug('upload_to_google_sheets: fallo al escribir encabezado en %s', safe_name, exc_info=True)
-				except Exception:
-					LOG.debug('upload_to_google_sheets: fallo al preparar encabezado en %s', safe_name, exc_info=True)
 
-				# Now write data rows (without headers) starting at A2 mapped to data_headers order.
-				# Map data header names to extracted row keys using a tolerant normalization.
-				if rows and data_headers is not None:
-					try:
-						extracted_keys = list(rows[0].keys()) if rows else []
-						norm_map = { _norm(k): k for k in extracted_keys }
-
-						# detect which extracted key is likely the per-row date
-						date_key = None
-						for ek in extracted_keys:
-							enk = _norm(ek)
-							if 'fecha' in enk or 'date' in enk or 'dia' in enk:
-								date_key = ek
-								break
-
-						mapped_keys = []
-						for h in data_headers:
-							nh = _norm(h)
-							mapped = norm_map.get(nh)
-							if not mapped:
-								nh_simple = re.sub(r'[^0-9a-z]', '', nh)
-								for ek_norm, ek in norm_map.items():
-									if re.sub(r'[^0-9a-z]', '', ek_norm) == nh_simple:
-										mapped = ek
-										break
-							if not mapped:
-								for ek_norm, ek in norm_map.items():
-									if nh in ek_norm or ek_norm in nh:
-										mapped = ek
-										break
-							mapped_keys.append(mapped)
-
-							table_data = []
-							# choose sanitizer per target sheet: only Sheet2 gets apostrophe-strip, Sheet1 and others are left untouched
-							sn = str(safe_name).strip().lower() if safe_name else ''
-							if sn == 'sheet2':
-								base_sanitizer = _strip_leading_apostrophe
-							else:
-								base_sanitizer = _identity_sanitize
-
-							# columns to coerce to numeric (sheet columns C,D,E,G,I,K) -> zero-based column indices
-							numeric_col_letters = ['C', 'D', 'E', 'G', 'I', 'K']
-							# convert letters to zero-based column numbers
-							def _col_letter_to_index(letter: str) -> int:
-								return ord(letter.upper()) - ord('A')
-							numeric_col_indexes = {_col_letter_to_index(l) for l in numeric_col_letters}
-
-							# data_headers correspond to sheet columns starting at B (col_index 1)
-							# rowvals index -> sheet column index = index + 1
-							numeric_rowvals_indexes = {ci - 1 for ci in numeric_col_indexes if ci >= 1}
-
-							for r in rows:
-								# decide per-row date: prefer extracted date_key, else use execution date
-								if date_key:
-									pv = r.get(date_key, '')
-									per_row_date = str(pv) if pv not in (None, '') else date_str
-								else:
-									per_row_date = date_str
-
-								rowvals = []
-								for idx, mk in enumerate(mapped_keys):
-									if mk:
-										# raw value from extraction (do not pre-strip here for Sheet1 col C)
-										rawv = r.get(mk, '')
-
-										# Special-case: Sheet1 column C (data_headers start at B -> idx==1)
-										# apply the drop-last-two sanitizer and DO NOT coerce/format it.
-										if sn == 'sheet1' and idx == 1:
-											try:
-												vout = _strip_dots_and_drop_decimals(rawv)
-											except Exception:
-												vout = ''
-											rowvals.append(vout)
-											continue
-
-										# Otherwise apply base sanitizer (may be identity or apostrophe-strip)
-										try:
-											raw = base_sanitizer(rawv)
-										except Exception:
-											raw = rawv if rawv is not None else ''
-
-										# if this column should be numeric for Sheet2, attempt conversion
-										if sn == 'sheet2' and idx in numeric_rowvals_indexes:
-											try:
-												coerced = _sanitize_cell_value(raw)
-												rowvals.append(coerced)
-											except Exception:
-												rowvals.append(raw)
-										else:
-											rowvals.append(raw)
-									else:
-										rowvals.append('')
-								# prefix with per-row date in column A
-								table_data.append([per_row_date] + rowvals)
-
-						try:
-							# Clear known ARRAYFORMULA spill ranges that may block the formula from
-							# expanding. Some sheets place an ARRAYFORMULA in E1 that spills into E2:E.
-							# If those cells contain leftover data, the array won't expand and Sheets
-							# raises "No se amplió el resultado del array porque reemplazaría los datos...".
-							try:
-								rc = getattr(ws, 'row_count', None) or 1000
-								ws.batch_clear([f"E2:E{rc}"])
-							except Exception:
-								# best-effort fallback
-								try:
-									ws.batch_clear(["E2:E1000"])
-								except Exception:
-									pass
-
-							# Pre-write: ensure D2:E... are cleared to avoid ARRAYFORMULA or residual data (Sheet1 only)
-							sn_check = str(safe_name).strip().lower() if safe_name else ''
-							if sn_check == 'sheet1':
-								try:
-									try:
-										rc_pre = getattr(ws, 'row_count', None) or (1 + len(table_data))
-										if isinstance(rc_pre, int) and rc_pre > 1:
-											ws.batch_clear([f"D2:D{rc_pre}", f"E2:E{rc_pre}"])
-										else:
-											ws.batch_clear(["D2:D1000", "E2:E1000"])
-									except Exception:
-										ws.batch_clear(["D2:D1000", "E2:E1000"])
-								except Exception:
-									pass
-
-							ws.update('A2', table_data)
-							# Post-write: asegurar limpieza específica en D2:E... tras escribir los datos (Sheet1 only)
-							if sn_check == 'sheet1':
-								try:
-									try:
-										rc_after = getattr(ws, 'row_count', None) or (1 + len(table_data))
-										if isinstance(rc_after, int) and rc_after > 1:
-											ws.batch_clear([f"D2:D{rc_after}", f"E2:E{rc_after}"])
-										else:
-											ws.batch_clear(["D2:D1000", "E2:E1000"])
-									except Exception:
-										ws.batch_clear(["D2:D1000", "E2:E1000"])
-								except Exception:
-									pass
-						except Exception:
-							LOG.exception('upload_to_google_sheets: fallo al escribir datos en %s', safe_name)
-						# Apply number formatting: Sheet2 columns C,D,E,G,I,K
-						try:
-							if sn == 'sheet2':
-								# obtain sheetId for API requests
-								try:
-									sheet_id = int(ws._properties.get('sheetId'))
-								except Exception:
-									sheet_id = None
-								if sheet_id is not None:
-									# For Sheet2: columns C,D,E,G,I,K (zero-based: 2,3,4,6,8,10)
-									# For Sheet1: column C only (zero-based: 2)
-									if sn == 'sheet2':
-										cols = [2, 3, 4, 6, 8, 10]
-									else:  # sheet1
-										cols = [2]
-									requests = []
-									for c in cols:
-										requests.append({
-											'repeatCell': {
-												'range': {
-													'sheetId': sheet_id,
-													'startRowIndex': 1,
-													'endRowIndex': 1000,
-													'startColumnIndex': c,
-													'endColumnIndex': c + 1,
-												},
-												'cell': {
-													'userEnteredFormat': {
-														'numberFormat': {
-															'type': 'NUMBER',
-															'pattern': '#,##0'
-														}
-													}
-												},
-												'fields': 'userEnteredFormat.numberFormat'
-											}
-										})
-									if requests:
-										sh.batch_update({'requests': requests})
-						except Exception:
-							LOG.debug('upload_to_google_sheets: fallo aplicando formato numérico en %s', safe_name, exc_info=True)
-					except Exception:
-						LOG.exception('upload_to_google_sheets: fallo preparando datos para %s', safe_name)
-				LOG.info('upload_to_google_sheets: hoja %s actualizada (sheet fuente: %s, filas=%d)', safe_name, first_sheet, len(rows))
-			except Exception:
-				LOG.exception('upload_to_google_sheets: fallo al escribir target_sheet %s', target_sheet)
-		else:
-			# caso original: escribir cada hoja en su propia worksheet
-			for sheet_name, rows in extracted.items():
-				# sanitizar nombre de hoja
-				safe_name = str(sheet_name)[:100]
-				try:
-					try:
-						ws = sh.worksheet(safe_name)
-					except Exception:
-						# crear hoja si no existe
-						ws = sh.add_worksheet(title=safe_name, rows=max(100, len(rows) + 5), cols=20)
+def _identity_sanitize(v: object):
+	"""Identity sanitizer (leave the value as-is, used to avoid touching Sheet1)."""
+	if v is None:
+		return ''
+	return v
 
-					# Preserve existing header row if present; otherwise derive from extracted data.
-					try:
-						existing_headers = ws.row_values(1)
-					except Exception:
-						existing_headers = []
-
-					if not existing_headers:
-						headers = list(rows[0].keys()) if rows else []
-						existing_headers = headers
-
-					# Decide header for column A (fecha) and data headers for B..
-					def _norm(s: str) -> str:
-						return re.sub(r'\s+', ' ', str(s).strip().lower())
-
-					header_a = 'fecha'
-					data_headers = list(existing_headers)
-					if data_headers:
-						first_norm = _norm(data_headers[0])
-						if 'fecha' in first_norm or 'date' in first_norm:
-							header_a = existing_headers[0]
-							data_headers = existing_headers[1:]
-
-					# Clear sheet data and restore header (preserve row 1)
-					date_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-					if clear:
-						try:
-							try:
-								rc = getattr(ws, 'row_count', None)
-								if rc and isinstance(rc, int) and rc > 1:
-									ws.batch_clear([f"2:{rc}"])
-								else:
-									ws.batch_clear(["2:1000"])
-							except Exception:
-								ws.batch_clear(["2:1000"])
-						except Exception:
-							pass
-
-					# Additionally, ensure columns D and E (from row 2 downward) are cleared
-					# but only for the Sheet named 'Sheet1' to avoid touching other tabs.
-					try:
-						try:
-							sn_local = str(safe_name).strip().lower() if safe_name else ''
-							if sn_local == 'sheet1':
-								rc_cols = getattr(ws, 'row_count', None) or 1000
-								if isinstance(rc_cols, int) and rc_cols > 1:
-									ws.batch_clear([f"D2:D{rc_cols}", f"E2:E{rc_cols}"])
-								else:
-									ws.batch_clear(["D2:D1000", "E2:E1000"])
-						except Exception:
-							# best-effort fallback when attempting to clear
-							try:
-								if sn_local == 'sheet1':
-									ws.batch_clear(["D2:D1000", "E2:E1000"])
-							except Exception:
-								pass
-					except Exception:
-						pass
 
-					try:
-						# Write header row only if the sheet has no header yet and
-						# do NOT touch row 1 for Sheet1 or Sheet2
-						sn = str(safe_name).strip().lower() if safe_name else ''
-						header_row = [header_a] + data_headers
-						if not existing_headers and sn not in ('sheet1', 'sheet2'):
-							try:
-								ws.update('A1', [header_row])
-							except Exception:
-								LOG.debug('upload_to_google_sheets: fallo al escribir encabezado en %s', safe_name, exc_info=True)
-					except Exception:
-						LOG.debug('upload_to_google_sheets: fallo al preparar encabezado en %s', safe_name, exc_info=True)
+def _strip_dots_and_drop_decimals(v: object):
+	"""Special sanitizer for Sheet1 column C: preserve the displayed formatting
+	(commas/dots) but DROP the last TWO characters of the displayed string.
 
-					if not rows:
-						LOG.info('upload_to_google_sheets: hoja %s actualizada (0 filas)', safe_name)
-						continue
+	Example: '407,918,004' -> '407,918,0' ; '24,774,107,615' -> '24,774,107,6'
+	"""
+	try:
+		if v is None:
+			return ''
+		s = str(v).strip()
+		# strip leading common quotes/apostrophes that force text in Sheets
+		while s and s[0] in _COMILLAS_INICIALES:
+			s = s[1:].lstrip()
+		# If the displayed string is short, return empty
+		if len(s) <= 2:
+			return ''
+		# Remove the last two characters but preserve the rest (including separators)
+		return s[:-2].rstrip()
+	except Exception:
+		try:
+			return str(v)
+		except Exception:
+			return ''
 
-					# construir filas de datos (sin encabezado) usando el orden de data_headers
-					try:
-						extracted_keys = list(rows[0].keys()) if rows else []
-						norm_map = { _norm(k): k for k in extracted_keys }
-
-						# detect date key in extracted rows
-						date_key = None
-						for ek in extracted_keys:
-							enk = _norm(ek)
-							if 'fecha' in enk or 'date' in enk or 'dia' in enk:
-								date_key = ek
-								break
-
-						mapped_keys = []
-						for h in data_headers:
-							nh = _norm(h)
-							mapped = norm_map.get(nh)
-							if not mapped:
-								nh_simple = re.sub(r'[^0-9a-z]', '', nh)
-								for ek_norm, ek in norm_map.items():
-									if re.sub(r'[^0-9a-z]', '', ek_norm) == nh_simple:
-										mapped = ek
-										break
-							if not mapped:
-								for ek_norm, ek in norm_map.items():
-									if nh in ek_norm or ek_norm in nh:
-										mapped = ek
-										break
-							mapped_keys.append(mapped)
-
-						table_data = []
-						# choose sanitizer: only Sheet2 gets apostrophe-strip, Sheet1 and others are left untouched
-						sn = str(safe_name).strip().lower() if safe_name else ''
-						if sn == 'sheet2':
-							base_sanitizer = _strip_leading_apostrophe
-						else:
-							base_sanitizer = _identity_sanitize
-
-						# columns to coerce to numeric (sheet columns C,D,E,G,I,K) -> zero-based column indices
-						numeric_col_letters = ['C', 'D', 'E', 'G', 'I', 'K']
-						def _col_letter_to_index(letter: str) -> int:
-							return ord(letter.upper()) - ord('A')
-						numeric_col_indexes = {_col_letter_to_index(l) for l in numeric_col_letters}
-						# data_headers correspond to sheet columns starting at B (col_index 1)
-						# rowvals index -> sheet column index = index + 1
-						numeric_rowvals_indexes = {ci - 1 for ci in numeric_col_indexes if ci >= 1}
-
-						for r in rows:
-							if date_key:
-								pv = r.get(date_key, '')
-								per_row_date = str(pv) if pv not in (None, '') else date_str
-							else:
-								per_row_date = date_str
-
-							rowvals = []
-							for idx, mk in enumerate(mapped_keys):
-								if mk:
-									raw = base_sanitizer(r.get(mk, ''))
-									# Special-case: Sheet1 column C (data_headers start at B -> idx==1)
-									if sn == 'sheet1' and idx == 1:
-										v = _strip_dots_and_drop_decimals(raw)
-										rowvals.append(v)
-									elif sn == 'sheet2' and idx in numeric_rowvals_indexes:
-										coerced = _sanitize_cell_value(raw)
-										rowvals.append(coerced)
-									else:
-										rowvals.append(raw)
-								else:
-									rowvals.append('')
-							table_data.append([per_row_date] + rowvals)
-
-						# actualizar en bloque a partir de A2
-						try:
-							# Pre-write: ensure D2:E... are cleared to avoid ARRAYFORMULA or residual data (Sheet1 only)
-							sn_per = str(safe_name).strip().lower() if safe_name else ''
-							if sn_per == 'sheet1':
-								try:
-									try:
-										rc_pre = getattr(ws, 'row_count', None) or (1 + len(table_data))
-										if isinstance(rc_pre, int) and rc_pre > 1:
-											ws.batch_clear([f"D2:D{rc_pre}", f"E2:E{rc_pre}"])
-										else:
-											ws.batch_clear(["D2:D1000", "E2:E1000"])
-									except Exception:
-										ws.batch_clear(["D2:D1000", "E2:E1000"])
-								except Exception:
-									pass
-
-							ws.update('A2', table_data)
-							# Post-write: asegurar limpieza específica en D2:E... tras escribir los datos (Sheet1 only)
-							if sn_per == 'sheet1':
-								try:
-									try:
-										rc_after = getattr(ws, 'row_count', None) or (1 + len(table_data))
-										if isinstance(rc_after, int) and rc_after > 1:
-											ws.batch_clear([f"D2:D{rc_after}", f"E2:E{rc_after}"])
-										else:
-											ws.batch_clear(["D2:D1000", "E2:E1000"])
-									except Exception:
-										ws.batch_clear(["D2:D1000", "E2:E1000"])
-								except Exception:
-									pass
-							LOG.info('upload_to_google_sheets: hoja %s actualizada (%d filas)', safe_name, len(rows))
-						except Exception:
-							LOG.exception('upload_to_google_sheets: fallo al escribir datos en %s', safe_name)
-					except Exception:
-						LOG.exception('upload_to_google_sheets: fallo preparando datos para hoja %s', safe_name)
-				except Exception:
-					LOG.exception('upload_to_google_sheets: fallo al escribir hoja %s', sheet_name)
-					continue
 
-		return True
-	except Exception:
-		LOG.exception('upload_to_google_sheets: excepción inesperada')
-		return False
+def _coerce_numeric_sheet2(v: object):
+	"""Columnas numéricas de Sheet2: quitar el apóstrofo inicial y convertir a número."""
+	return _sanitize_cell_value(_strip_leading_apostrophe(v))
 
 
-# Opcional: si el usuario pone variables de entorno, llamar automáticamente tras la extracción.
-# Estas variables NO se añaden aquí; el usuario debe proporcionar la ruta al JSON y el spreadsheet id.
-# Ejemplo env vars esperadas: GOOGLE_SERVICE_ACCOUNT_JSON, GOOGLE_SHEET_ID
-def _maybe_auto_upload(extracted: dict) -> None:
-	try:
-		# valores por defecto (proporcionados por el usuario). Preferir env vars si existen.
-		default_sa = r'C:\Users\jperdomolc\Pictures\Qlik\estados-475119-24642bda896a.json'
-		default_sid = '1LTiGfBQd_Qd6zhmCGEHpX0Jgaa3KuMkuuE8oHwQ6x3M'
-		sa = _os.environ.get('GOOGLE_SERVICE_ACCOUNT_JSON', default_sa)
-		sid = _os.environ.get('GOOGLE_SHEET_ID', default_sid)
-		target = _os.environ.get('GOOGLE_SHEET_TAB', 'Sheet2')
+def _norm_encabezado(s: str) -> str:
+	return _RE_ESPACIOS.sub(' ', str(s).strip().lower())
 
-		if sa and sid:
-			LOG.info('Intentando subida automática a Google Sheets (target tab=%s)...', target)
-			ok = upload_to_google_sheets(extracted, sid, sa, clear=True, target_sheet=target)
-			if ok:
-				LOG.info('Subida automática a Google Sheets finalizada con éxito')
-			else:
-				LOG.info('Subida automática a Google Sheets falló')
-		else:
-			LOG.debug('No hay credenciales/ID disponibles para Google Sheets')
-	except Exception:
-		LOG.debug('_maybe_auto_upload: fallo', exc_info=True)
 
-def grid_listo(driver: webdriver.Chrome, selector: str, selector_type: str = 'CSS_SELECTOR', timeout: float = 20.0) -> bool:
-    """Verificar si el grid está listo (visible y con contenido).
-    
-    Intenta encontrar el elemento y comprobar que está visible.
-    Devuelve True si el grid está listo, False si no.
-    
-    Args:
-        driver: El driver de Selenium
-        selector: El selector (CSS o XPATH)
-        selector_type: 'CSS_SELECTOR' o 'XPATH' (default: 'CSS_SELECTOR')
-        timeout: Tiempo máximo de espera en segundos
-    """
-    try:
-        end = time.time() + float(timeout)
-        
-        # Determinar el tipo de selector
-        if selector_type.upper() == 'XPATH':
-            by = By.XPATH
-        else:
-            by = By.CSS_SELECTOR
-        
-        while time.time() < end:
-            try:
-                el = driver.find_element(by, selector)
-                if el.is_displayed():
-                    LOG.debug("grid_listo: elemento visible y listo: %s (tipo: %s)", selector, selector_type)
-                    return True
-            except Exception:
-                pass
-            time.sleep(0.5)
-        LOG.debug("grid_listo: timeout esperando elemento: %s (tipo: %s)", selector, selector_type)
-        return False
-    except Exception:
-        LOG.exception("grid_listo: excepción inesperada")
-        return False
+def _sin_acentos(s: str) -> str:
+	return ''.join(c for c in unicodedata.normalize('NFKD', s) if not unicodedata.combining(c))
 
 
-def run_once() -> None:
-	url = (
-		"https://qlik.copservir.com/sense/app/d39c40fb-a304-4eaf-9a30-50b7279d33f1/"
-		"sheet/4f191cdb-aa40-409d-86b2-497a427a8b6a/state/analysis"
-	)
-	username = "Qlikzona29"
-	password = "pF2A3f2x*"
+def clave_fecha(extracted_keys: list) -> str | None:
+	"""Clave extraída que lleva la fecha de cada fila ('Fecha', 'Día', 'date'...) o None."""
+	return next((ek for ek in extracted_keys
+		if any(t in _sin_acentos(_norm_encabezado(ek)) for t in ('fecha', 'date', 'dia'))), None)
 
-	logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
-	LOG.info('Starting minimal Qlik autofill (single run)')
-	driver = setup_driver()
-	submit_sent = False
-	wrote_pwd = False
-	try:
-		LOG.info("Opening %s", url)
-		driver.get(url)
-		time.sleep(25)
-		initial_process_done = False
-		try:
-			# Intentar traer al frente el navegador abierto por este script
-			try:
-				brought = bring_browser_to_front(driver)
-			except Exception:
-				LOG.debug('No se pudo forzar foco inicial en el navegador', exc_info=True)
-				brought = False
 
-			# Señalizar si el paso inicial tuvo éxito (bring_browser_to_front devolvió True)
-			initial_process_done = bool(brought)
-			LOG.info("Initial setup completed: %s", initial_process_done)
-		except Exception:
-			LOG.debug('Error during initial setup', exc_info=True)
-			initial_process_done = False
-			time.sleep(5)
+def mapear_encabezados(data_headers: list, extracted_keys: list) -> list[str | None]:
+	"""Resolver, para cada encabezado de la hoja, la clave extraída que le corresponde (o None).
 
-		try:
-			WebDriverWait(driver, 15).until(EC.presence_of_element_located((By.CSS_SELECTOR, "#grid > div:nth-child(8)")))
-			LOG.info("Elemento '%s' está presente", "#grid > div:nth-child(8)")
-			if focus_on_selector(driver, "#grid > div:nth-child(8)", timeout=3.0):
-				LOG.info("Elemento '%s' enfocado correctamente", "#grid > div:nth-child(8)")
+	Se prueba en orden: igualdad normalizada, igualdad sólo alfanumérica y
+	contención en cualquier sentido.
+	"""
+	norm_map = {_norm_encabezado(k): k for k in extracted_keys}
+	simples = [(_RE_NO_ALFANUM.sub('', ek_norm), ek) for ek_norm, ek in norm_map.items()]
+	mapped_keys = []
+	for h in data_headers:
+		nh = _norm_encabezado(h)
+		mapped = norm_map.get(nh)
+		if not mapped:
+			nh_simple = _RE_NO_ALFANUM.sub('', nh)
+			mapped = next((ek for simple, ek in simples if simple == nh_simple), None)
+		if not mapped:
+			mapped = next((ek for ek_norm, ek in norm_map.items() if nh in ek_norm or ek_norm in nh), None)
+		mapped_keys.append(mapped)
+	return mapped_keys
+
+
+def _transformaciones_columnas(sheet_name: str, n_columnas: int) -> list:
+	"""Transformación por columna de datos (B en adelante) según la hoja destino.
+
+	- Sheet1: la columna C pierde los dos últimos caracteres; el resto se deja tal cual.
+	- Sheet2: se quita el apóstrofo inicial y C,D,E,G,I,K se convierten a número.
+	- Otras hojas: sin cambios.
+	"""
+	sn = str(sheet_name).strip().lower() if sheet_name else ''
+	if sn == 'sheet2':
+		return [_coerce_numeric_sheet2 if idx in _COLUMNAS_NUMERICAS_SHEET2 else _strip_leading_apostrophe
+			for idx in range(n_columnas)]
+	transforms = [_identity_sanitize] * n_columnas
+	if sn == 'sheet1' and n_columnas > 1:
+		transforms[1] = _strip_dots_and_drop_decimals
+	return transforms
+
+
+def construir_tabla_sheets(rows: list[dict], data_headers: list, sheet_name: str, date_str: str) -> list[list]:
+	"""Construir las filas (sin encabezado) que se escriben desde A2.
+
+	El mapeo de encabezados y la transformación de cada columna se resuelven una
+	sola vez; después se transforman columnas enteras y las filas se ensamblan con
+	un único `zip`. La columna A lleva la fecha de la fila (columna fecha/día
+	extraída) o `date_str` si no hay.
+	"""
+	if not rows:
+		return []
+	extracted_keys = list(rows[0].keys())
+	mapped_keys = mapear_encabezados(data_headers, extracted_keys)
+	transforms = _transformaciones_columnas(sheet_name, len(mapped_keys))
+
+	# columna A: fecha por fila (clave extraída que parezca fecha/día, o la de ejecución)
+	date_key = clave_fecha(extracted_keys)
+	if date_key:
+		fechas = [str(pv) if pv not in (None, '') else date_str for pv in (r.get(date_key, '') for r in rows)]
+	else:
+		fechas = [date_str] * len(rows)
+
+	columnas = []
+	for mk, transform in zip(mapped_keys, transforms):
+		if mk:
+			columnas.append(list(map(transform, [r.get(mk, '') for r in rows])))
+		else:
+			columnas.append([''] * len(rows))
+	return [list(fila) for fila in zip(fechas, *columnas)]
+
+
+def _rango_a1(titulo: str, celda: str) -> str:
+	"""Rango A1 absoluto (`'Hoja'!A2`) para las peticiones values:batchUpdate."""
+	return "'{}'!{}".format(str(titulo).replace("'", "''"), celda)
+
+
+def _columna_a1(indice: int) -> str:
+	"""Letra(s) de columna A1 para un índice base 0 (0 -> 'A', 27 -> 'AB')."""
+	letras = ''
+	indice += 1
+	while indice:
+		indice, resto = divmod(indice - 1, 26)
+		letras = chr(ord('A') + resto) + letras
+	return letras
+
+
+def _row_count_efectivo(row_count: int | None) -> int:
+	return row_count if isinstance(row_count, int) and row_count > 1 else 1000
+
+
+def _celdas_a_escribir(table_data: list[list], columnas_vacias: tuple, rc: int) -> list[list]:
+	"""`table_data` con `None` (celda que la escritura salta) en `columnas_vacias`.
+
+	Sólo hasta row_count, igual que el borrado de esas columnas.
+	"""
+	if not columnas_vacias:
+		return table_data
+	vacias = set(columnas_vacias)
+	return [[None if i in vacias else v for i, v in enumerate(fila)] for fila in table_data[:rc - 1]] + table_data[rc - 1:]
+
+
+def _peticion_limpiar(sheet_id: int, fila_ini: int, fila_fin: int, col_ini: int | None = None, col_fin: int | None = None) -> dict | None:
+	"""Petición updateCells que borra los valores (no el formato) del rango; None si está vacío."""
+	if fila_ini >= fila_fin:
+		return None
+	rango = {'sheetId': sheet_id, 'startRowIndex': fila_ini, 'endRowIndex': fila_fin}
+	if col_ini is not None:
+		rango['startColumnIndex'] = col_ini
+	if col_fin is not None:
+		rango['endColumnIndex'] = col_fin
+	return {'updateCells': {'range': rango, 'fields': 'userEnteredValue'}}
+
+
+def compilar_escritura_sheets(titulo: str, sheet_id: int, row_count: int | None, table_data: list[list] | None,
+		header_row: list | None = None, clear: bool = True, limpiar_columnas: tuple = (),
+		columnas_vacias: tuple = (), columnas_formato: tuple = ()) -> tuple[dict | None, dict | None]:
+	"""Compilar la escritura de una hoja en (cuerpo values:batchUpdate, cuerpo spreadsheets:batchUpdate).
+
+	El primero escribe el encabezado (si `header_row`) y `table_data` desde A2 en
+	modo RAW. El segundo borra sólo lo que la tabla no sobrescribe y aplica los
+	formatos numéricos, así que la hoja nunca queda a medio borrar para quien la lea.
+	El estado final es el de la secuencia anterior (borrar filas 2..row_count,
+	escribir desde A2, borrar columnas concretas):
+
+	- `clear`: borrar las filas 2..row_count fuera de la tabla.
+	- `limpiar_columnas`: columnas (base 0) que quedan vacías fuera de la tabla.
+	- `columnas_vacias`: columnas que quedan vacías en todas las filas de datos,
+	  también dentro de la tabla (la escritura las salta con `None`).
+	- `columnas_formato`: columnas con formato de número '#,##0' en las filas 2..1000.
+	Devuelve None en lugar de un cuerpo que no tendría ninguna petición.
+	"""
+	rc = _row_count_efectivo(row_count)
+	n = len(table_data) if table_data else 0
+	ancho = max(len(fila) for fila in table_data) if n else 0
+
+	datos = []
+	if header_row is not None:
+		datos.append({'range': _rango_a1(titulo, 'A1'), 'values': [list(header_row)]})
+	if n:
+		datos.append({'range': _rango_a1(titulo, 'A2'), 'values': _celdas_a_escribir(table_data, columnas_vacias, rc)})
+	valores = {'valueInputOption': 'RAW', 'data': datos} if datos else None
+
+	peticiones = []
+
+	def _limpiar(*rango) -> None:
+		peticion = _peticion_limpiar(sheet_id, *rango)
+		if peticion:
+			peticiones.append(peticion)
+
+	if clear:
+		# filas bajo la tabla y celdas a la derecha de ella
+		_limpiar(1 + n, rc)
+		if n:
+			_limpiar(1, 1 + n, ancho)
+	else:
+		for c in limpiar_columnas:
+			_limpiar(1 if c >= ancho else 1 + n, rc, c, c + 1)
+	for c in columnas_vacias:
+		_limpiar(1, rc, c, c + 1)
+
+	for c in columnas_formato:
+		peticiones.append({
+			'repeatCell': {
+				'range': {
+					'sheetId': sheet_id,
+					'startRowIndex': 1,
+					'endRowIndex': 1000,
+					'startColumnIndex': c,
+					'endColumnIndex': c + 1,
+				},
+				'cell': {
+					'userEnteredFormat': {
+						'numberFormat': {
+							'type': 'NUMBER',
+							'pattern': '#,##0'
+						}
+					}
+				},
+				'fields': 'userEnteredFormat.numberFormat'
+			}
+		})
+	lote = {'requests': peticiones} if peticiones else None
+	return valores, lote
+
+
+def conservar_columnas_ejecucion(table_data: list[list], anterior: list[list], columnas: tuple) -> list[list]:
+	"""`table_data` con los valores de `anterior` en `columnas` para las filas que no cambian en el resto.
+
+	Para columnas que valen lo mismo en todas las filas de una ejecución (la fecha
+	de ejecución en A): sin esto todas las filas cambiarían en cada ejecución y el
+	delta reescribiría la columna entera. Así la columna queda como la fecha de la
+	última escritura de cada fila.
+	"""
+	if not columnas or not anterior:
+		return table_data
+	fijas = set(columnas)
+
+	def _resto(fila: list) -> list:
+		return [v for j, v in enumerate(fila) if j not in fijas]
+
+	out = []
+	for i, fila in enumerate(table_data):
+		if i < len(anterior) and len(anterior[i]) == len(fila) and _resto(anterior[i]) == _resto(fila):
+			fila = [anterior[i][j] if j in fijas else v for j, v in enumerate(fila)]
+		out.append(fila)
+	return out
+
+
+def compilar_escritura_delta(titulo: str, sheet_id: int, row_count: int | None, table_data: list[list],
+		anterior: list[list], clear: bool = True, limpiar_columnas: tuple = (),
+		columnas_vacias: tuple = ()) -> tuple[dict | None, dict | None]:
+	"""Como `compilar_escritura_sheets`, pero partiendo de `anterior` (la última tabla escrita).
+
+	Sólo se envían las filas que cambian (el tramo de columnas entre la primera
+	y la última celda distinta; filas consecutivas con el mismo tramo van en un
+	rango), las filas añadidas y el borrado de las filas que sobran. El estado
+	final es el mismo que el de una escritura completa sobre la hoja tal como
+	quedó tras escribir `anterior` con los mismos parámetros.
+	"""
+	rc = _row_count_efectivo(row_count)
+	nuevas = _celdas_a_escribir(table_data, columnas_vacias, rc)
+	viejas = _celdas_a_escribir(anterior, columnas_vacias, rc)
+	n_nuevas, n_viejas = len(nuevas), len(viejas)
+	ancho = max((len(fila) for fila in nuevas), default=0)
+
+	datos = []
+	bloque = None  # (fila inicial, col_ini, col_fin, filas)
+	for i in range(min(n_nuevas, n_viejas)):
+		nueva, vieja = nuevas[i], viejas[i]
+		distintas = [j for j in range(ancho) if (nueva[j] if j < len(nueva) else None) != (vieja[j] if j < len(vieja) else None)]
+		if not distintas:
+			bloque = None
+			continue
+		c0, c1 = distintas[0], distintas[-1] + 1
+		if bloque and bloque[1] == c0 and bloque[2] == c1 and bloque[0] + len(bloque[3]) == i:
+			bloque[3].append(nueva[c0:c1])
+			continue
+		bloque = (i, c0, c1, [nueva[c0:c1]])
+		datos.append(bloque)
+	datos = [{'range': _rango_a1(titulo, f'{_columna_a1(c0)}{2 + i}'), 'values': filas} for i, c0, _c1, filas in datos]
+	if n_nuevas > n_viejas:
+		datos.append({'range': _rango_a1(titulo, f'A{2 + n_viejas}'), 'values': nuevas[n_viejas:]})
+	valores = {'valueInputOption': 'RAW', 'data': datos} if datos else None
+
+	# filas que la tabla anterior ocupaba y la nueva ya no
+	peticiones = []
+	fin = min(1 + n_viejas, rc)
+	if clear:
+		peticiones.append(_peticion_limpiar(sheet_id, 1 + n_nuevas, fin))
+	else:
+		peticiones.extend(_peticion_limpiar(sheet_id, 1 + n_nuevas, fin, c, c + 1) for c in limpiar_columnas if c < ancho)
+	peticiones = [p for p in peticiones if p]
+	lote = {'requests': peticiones} if peticiones else None
+	return valores, lote
+
+
+# Última tabla escrita en cada pestaña (para el modo delta). Se puede cambiar con
+# QLIK_SHEETS_SNAPSHOT (0 para desactivar).
+DEFAULT_SHEETS_SNAPSHOT = Path.home() / '.qlik_sheets_snapshot.json'
+_SNAPSHOT_LOCK = threading.Lock()
+
+
+def _ruta_snapshot_sheets() -> Path | None:
+	valor = _os.environ.get('QLIK_SHEETS_SNAPSHOT')
+	if valor is None:
+		return DEFAULT_SHEETS_SNAPSHOT
+	if valor.strip().lower() in ('', '0', 'no', 'false'):
+		return None
+	return Path(valor).expanduser()
+
+
+def _leer_snapshots(path: Path) -> dict:
+	try:
+		with path.open('r', encoding='utf-8') as fh:
+			return json.load(fh)
+	except FileNotFoundError:
+		return {}
+	except Exception:
+		LOG.debug('snapshot de Sheets ilegible %s', path, exc_info=True)
+		return {}
+
+
+def cargar_snapshot_sheets(clave: str) -> dict | None:
+	"""Snapshot guardado para `clave` ('<spreadsheet_id>/<pestaña>') o None."""
+	path = _ruta_snapshot_sheets()
+	if path is None:
+		return None
+	with _SNAPSHOT_LOCK:
+		return _leer_snapshots(path).get(clave)
+
+
+def guardar_snapshot_sheets(clave: str, snapshot: dict | None) -> None:
+	"""Guardar (o borrar, con `snapshot=None`) el snapshot de `clave`."""
+	path = _ruta_snapshot_sheets()
+	if path is None:
+		return
+	with _SNAPSHOT_LOCK:
+		try:
+			datos = _leer_snapshots(path)
+			if snapshot is None:
+				if datos.pop(clave, None) is None:
+					return
 			else:
-				LOG.info("No se pudo enfocar el selector '%s' (continuando)", "#grid > div:nth-child(8)")
+				datos[clave] = {**snapshot, 'saved_at': time.time()}
+			path.parent.mkdir(parents=True, exist_ok=True)
+			tmp = path.with_suffix('.tmp')
+			with tmp.open('w', encoding='utf-8') as fh:
+				json.dump(datos, fh, ensure_ascii=False)
+			tmp.replace(path)
 		except Exception:
-			LOG.debug('Error al esperar o enfocar el selector focus_... ', exc_info=True)
-			time.sleep(2)
+			LOG.debug('guardar_snapshot_sheets: fallo guardando %s', path, exc_info=True)
+
+
+# Clientes de Google Sheets reutilizables entre subidas. Un cliente gspread mantiene
+# una sesión HTTP keep-alive (AuthorizedSession) que renueva el token sólo cuando
+# está a punto de expirar; el spreadsheet y la lista de worksheets (sheetId,
+# row_count) se cachean SHEETS_METADATA_TTL segundos.
+SHEETS_METADATA_TTL = float(_os.environ.get('QLIK_SHEETS_METADATA_TTL', '600'))
+_SHEETS_LOCK = threading.Lock()
+_SHEETS_CLIENTES: dict = {}
+_SHEETS_LIBROS: dict = {}
+
+
+def _modulo_disponible(nombre: str) -> bool:
+	"""True si `nombre` se puede importar (sin importarlo)."""
+	try:
+		return importlib.util.find_spec(nombre) is not None
+	except ImportError:
+		# falta el paquete padre (p.ej. `google` para `google.oauth2...`)
+		return False
+
+
+def _cliente_sheets(credentials_json_path: str):
+	"""Cliente gspread autorizado con la cuenta de servicio, creado una vez por fichero de credenciales."""
+	import gspread
+	from google.oauth2 import service_account
+
+	with _SHEETS_LOCK:
+		client = _SHEETS_CLIENTES.get(credentials_json_path)
+		if client is None:
+			scopes = [
+				'https://www.googleapis.com/auth/spreadsheets',
+				'https://www.googleapis.com/auth/drive'
+			]
+			creds = service_account.Credentials.from_service_account_file(credentials_json_path, scopes=scopes)
+			client = gspread.authorize(creds)
+			_SHEETS_CLIENTES[credentials_json_path] = client
+		return client
+
+
+def abrir_spreadsheet(credentials_json_path: str, spreadsheet_id: str):
+	"""Spreadsheet `spreadsheet_id` abierto con el cliente cacheado (open_by_key sólo la primera vez)."""
+	client = _cliente_sheets(credentials_json_path)
+	clave = (credentials_json_path, spreadsheet_id)
+	with _SHEETS_LOCK:
+		libro = _SHEETS_LIBROS.get(clave)
+		if libro is None:
+			try:
+				sh = client.open_by_key(spreadsheet_id)
+			except Exception:
+				# credenciales o spreadsheet inválidos: no conservar un cliente roto
+				_SHEETS_CLIENTES.pop(credentials_json_path, None)
+				raise
+			libro = {'sh': sh, 'worksheets': None, 'cargado': 0.0}
+			_SHEETS_LIBROS[clave] = libro
+		return libro['sh']
+
+
+def _libro_de(sh) -> dict | None:
+	for libro in _SHEETS_LIBROS.values():
+		if libro['sh'] is sh:
+			return libro
+	return None
+
+
+def obtener_worksheet(sh, titulo: str):
+	"""Worksheet `titulo` desde la metadata cacheada (una petición para todas las pestañas); None si no existe."""
+	with _SHEETS_LOCK:
+		libro = _libro_de(sh)
+		if libro is None:
+			try:
+				return sh.worksheet(titulo)
+			except Exception:
+				return None
+		if libro['worksheets'] is None or time.monotonic() - libro['cargado'] > SHEETS_METADATA_TTL:
+			libro['worksheets'] = {ws.title: ws for ws in sh.worksheets()}
+			libro['cargado'] = time.monotonic()
+		return libro['worksheets'].get(titulo)
+
+
+def _recordar_worksheet(sh, ws) -> None:
+	with _SHEETS_LOCK:
+		libro = _libro_de(sh)
+		if libro is not None and libro['worksheets'] is not None:
+			libro['worksheets'][ws.title] = ws
+
+
+def invalidar_cache_sheets(sh=None) -> None:
+	"""Olvidar el spreadsheet `sh` y su metadata (o todos los clientes y spreadsheets si `sh` es None).
+
+	Tras un error de la API la siguiente subida vuelve a hacer open_by_key y a
+	leer las pestañas; el cliente autorizado se conserva.
+	"""
+	with _SHEETS_LOCK:
+		if sh is None:
+			_SHEETS_LIBROS.clear()
+			_SHEETS_CLIENTES.clear()
+			return
+		for clave, libro in list(_SHEETS_LIBROS.items()):
+			if libro['sh'] is sh:
+				del _SHEETS_LIBROS[clave]
+
+
+def _subir_hoja(sh, safe_name: str, rows: list[dict], clear: bool, destino: bool, delta: bool = False) -> bool:
+	"""Escribir `rows` en la worksheet `safe_name` con una llamada values:batchUpdate y una spreadsheets:batchUpdate.
+
+	`destino` distingue el modo `target_sheet` (sólo escribe datos si hay
+	encabezados de datos, deja libre la columna E del ARRAYFORMULA y da formato
+	numérico a Sheet2) del modo una-worksheet-por-hoja.
+
+	Con `delta` se compara con el snapshot de la última escritura y sólo se envía
+	lo que cambió (`compilar_escritura_delta`); la fecha de ejecución de la
+	columna A sólo se reescribe en las filas que cambian. Si el snapshot no encaja
+	con la hoja (otro sheetId/row_count/encabezado/parámetros) se escribe completa.
+	Las ediciones manuales de la hoja no se detectan: borrar el snapshot en ese caso.
+	"""
+	ws = obtener_worksheet(sh, safe_name)
+	if ws is None:
+		cols = max(10, len(rows[0]) if rows else 10) if destino else 20
+		ws = sh.add_worksheet(title=safe_name, rows=max(100, len(rows) + 5), cols=cols)
+		_recordar_worksheet(sh, ws)
+
+	# Preserve existing header row if present; otherwise use extracted headers.
+	try:
+		existing_headers = ws.row_values(1)
+	except Exception:
+		existing_headers = []
+	if not existing_headers:
+		# No header present in sheet -> derive from extracted data (if any)
+		existing_headers = list(rows[0].keys()) if rows else []
+
+	# Decide header for column A (fecha) and data headers for B..
+	header_a = 'fecha'
+	data_headers = list(existing_headers)
+	if data_headers:
+		first_norm = _norm_encabezado(data_headers[0])
+		if 'fecha' in first_norm or 'date' in first_norm:
+			header_a = existing_headers[0]
+			data_headers = existing_headers[1:]
+
+	# Write header row only if the sheet has no header yet and
+	# do NOT touch row 1 for Sheet1 or Sheet2 (preserve existing header)
+	sn = str(safe_name).strip().lower() if safe_name else ''
+	header_row = None
+	if not existing_headers and sn not in ('sheet1', 'sheet2'):
+		header_row = [header_a] + data_headers
+
+	table_data = None
+	if rows and (data_headers or not destino):
+		date_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+		try:
+			table_data = construir_tabla_sheets(rows, data_headers, safe_name, date_str)
+		except Exception:
+			LOG.exception('upload_to_google_sheets: fallo preparando datos para %s', safe_name)
+
+	# Columna E: algunas hojas tienen un ARRAYFORMULA en E1 que se expande hacia E2:E;
+	# si quedan datos residuales, Sheets no amplía el array. En Sheet1, D y E se dejan vacías.
+	limpiar_columnas = (4,) if destino and table_data else ()
+	columnas_vacias = (3, 4) if sn == 'sheet1' and (clear or table_data or not destino) else ()
+	columnas_formato = (2, 3, 4, 6, 8, 10) if destino and sn == 'sheet2' and table_data else ()
+
+	row_count = getattr(ws, 'row_count', None)
+	clave = f"{getattr(sh, 'id', '')}/{ws.title}"
+	firma = {
+		'sheet_id': ws.id,
+		'row_count': row_count,
+		'headers': existing_headers,
+		'params': [clear, list(limpiar_columnas), list(columnas_vacias), list(columnas_formato)],
+	}
+	anterior = cargar_snapshot_sheets(clave) if delta else None
+	ancho = len(table_data[0]) if table_data else None
+	if (anterior and header_row is None and table_data
+			and all(anterior.get(k) == v for k, v in firma.items())
+			and (not anterior.get('rows') or len(anterior['rows'][0]) == ancho)):
+		# sin columna de fecha por fila, A es la fecha de ejecución (ver `construir_tabla_sheets`)
+		if clave_fecha(list(rows[0])) is None:
+			table_data = conservar_columnas_ejecucion(table_data, anterior.get('rows') or [], (0,))
+		valores, lote = compilar_escritura_delta(
+			ws.title, ws.id, row_count, table_data, anterior.get('rows') or [], clear=clear,
+			limpiar_columnas=limpiar_columnas, columnas_vacias=columnas_vacias)
+		LOG.info('upload_to_google_sheets: %s en modo delta (%d rangos de datos, %d borrados)', safe_name,
+			len(valores['data']) if valores else 0, len(lote['requests']) if lote else 0)
+	else:
+		valores, lote = compilar_escritura_sheets(
+			ws.title, ws.id, row_count, table_data, header_row=header_row, clear=clear,
+			limpiar_columnas=limpiar_columnas, columnas_vacias=columnas_vacias, columnas_formato=columnas_formato)
+	# si la tabla pasa de row_count la hoja crece: la metadata cacheada deja de valer
+	if table_data and 1 + len(table_data) > _row_count_efectivo(row_count):
+		invalidar_cache_sheets(sh)
+	try:
+		if valores:
+			sh.values_batch_update(valores)
+	except Exception:
+		# no borrar nada: mejor los datos anteriores completos que una hoja a medio limpiar
+		LOG.exception('upload_to_google_sheets: fallo al escribir datos en %s', safe_name)
+		invalidar_cache_sheets(sh)
+		if delta:
+			guardar_snapshot_sheets(clave, None)
+		return False
+	try:
+		if lote:
+			sh.batch_update(lote)
+	except Exception:
+		LOG.exception('upload_to_google_sheets: fallo limpiando/aplicando formato en %s', safe_name)
+		invalidar_cache_sheets(sh)
+		if delta:
+			guardar_snapshot_sheets(clave, None)
+		return False
+	if delta:
+		guardar_snapshot_sheets(clave, {**firma, 'rows': table_data} if table_data else None)
+	return True
+
+
+def upload_to_google_sheets(extracted: dict, spreadsheet_id: str, credentials_json_path: str, clear: bool = True, target_sheet: str | None = 'Sheet2', delta: bool = False) -> bool:
+	"""Subir `extracted` (dict sheet -> list[dict]) a Google Sheets.
+
+	- `extracted`: dict devuelto por `extract_excel_contents`.
+	- `spreadsheet_id`: id del spreadsheet (la parte larga de la URL /spreadsheets/d/<id>/... ).
+	- `credentials_json_path`: ruta al JSON de la cuenta de servicio (service account).
+	- `clear`: si True se borra la worksheet antes de escribir.
+	- `delta`: enviar sólo las diferencias respecto a la última subida (snapshot
+	  local en QLIK_SHEETS_SNAPSHOT, por defecto ~/.qlik_sheets_snapshot.json).
+
+	Cada worksheet se escribe con una llamada values:batchUpdate y una
+	spreadsheets:batchUpdate (ver `compilar_escritura_sheets`). El cliente, el
+	spreadsheet y la metadata de worksheets se reutilizan entre llamadas
+	(`abrir_spreadsheet`).
+
+	Devuelve True sólo si todas las worksheets se escribieron; un fallo en
+	cualquiera de ellas devuelve False para que el llamador reintente
+	(ver `ColaSubidas`).
+
+	Requiere: `gspread` y `google-auth` (google-auth). Si no están instalados, la función registra y devuelve False.
+	"""
+	try:
+		faltan = [m for m in ('gspread', 'google.oauth2.service_account') if not _modulo_disponible(m)]
+		if faltan:
+			LOG.error('upload_to_google_sheets: faltan dependencias (gspread/google-auth): %s', ', '.join(faltan))
+			return False
+
+		sh = abrir_spreadsheet(credentials_json_path, spreadsheet_id)
+		ok = True
+
+		# Si se indicó un target_sheet concreto, escribir la PRIMERA hoja extraída en esa hoja
+		if target_sheet:
+			try:
+				first_sheet = next(iter(extracted.keys()))
+				rows = extracted.get(first_sheet, [])
+				safe_name = str(target_sheet)[:100]
+				if _subir_hoja(sh, safe_name, rows, clear, destino=True, delta=delta):
+					LOG.info('upload_to_google_sheets: hoja %s actualizada (sheet fuente: %s, filas=%d)', safe_name, first_sheet, len(rows))
+				else:
+					ok = False
+			except Exception:
+				LOG.exception('upload_to_google_sheets: fallo al escribir target_sheet %s', target_sheet)
+				ok = False
+		else:
+			# caso original: escribir cada hoja en su propia worksheet
+			for sheet_name, rows in extracted.items():
+				# sanitizar nombre de hoja
+				safe_name = str(sheet_name)[:100]
+				try:
+					if _subir_hoja(sh, safe_name, rows, clear, destino=False, delta=delta):
+						LOG.info('upload_to_google_sheets: hoja %s actualizada (%d filas)', safe_name, len(rows))
+					else:
+						ok = False
+				except Exception:
+					LOG.exception('upload_to_google_sheets: fallo al escribir hoja %s', sheet_name)
+					ok = False
+
+		return ok
+	except Exception:
+		LOG.exception('upload_to_google_sheets: excepción inesperada')
+		return False
+
+
+# Configuración de jobs de exportación (JSON o YAML). Se puede cambiar con QLIK_JOBS_CONFIG.
+DEFAULT_JOBS_CONFIG = Path(__file__).with_name('export_jobs.json')
+DEFAULT_BASE_URL = 'https://qlik.copservir.com'
+
+
+@dataclass
+class ExportJob:
+	"""Descripción declarativa de la exportación de un objeto de una hoja de Qlik.
+
+	- `grid_selector` / `grid_selector_type`: celda del grid que contiene el objeto ('CSS_SELECTOR' o 'XPATH').
+	- `more_selector`: botón "Más" del objeto; si falta se deriva de `grid_selector` (sólo CSS).
+	- `menu_path`: selectores a clicar tras "Más" (p.ej. con o sin `button[tid="table-export"]`).
+	- `output_json`: ruta donde volcar el contenido extraído.
+	- `sheet_tab`: pestaña destino en Google Sheets.
+	- `upload_delta`: subir sólo las diferencias respecto a la subida anterior
+	  (ver `upload_to_google_sheets`).
+	- `backend`: 'ui' (export por la interfaz) o 'engine' (hipercubo de `object_id`
+	  leído por WebSocket con `qlik_engine`).
+	- `month_field` / `year_field`: campos donde se selecciona el mes anterior (y su
+	  año, para que en enero se lea diciembre del año pasado; ver `selecciones_mes_anterior`).
+	- `download_mode`: con backend 'ui', 'browser' (Chrome descarga el .xlsx) o
+	  'http' (se baja el href de `a.export-url` a memoria con las cookies del driver).
+	- `incremental`: serie diaria que sólo relee los días desde el último escrito
+	  (columna `day_column`) y los funde con la serie de `output_json`; con
+	  `day_field` esos días también se seleccionan en Qlik (ver `serie_incremental`).
+	- `schedule`: expresiones cron del job en `main()` (por defecto `HORARIO_POR_DEFECTO`),
+	  con `schedule_timeout`, `schedule_deadline` (retraso máximo para empezar una
+	  franja), `catch_up` ('ultima', 'todas' o 'ninguna') y `priority` (ver `planificador`).
+	"""
+	name: str
+	app_id: str
+	sheet_id: str
+	grid_selector: str
+	output_json: str
+	sheet_tab: str
+	grid_selector_type: str = 'CSS_SELECTOR'
+	more_selector: str | None = None
+	menu_path: list[str] = field(default_factory=lambda: ['#export-group', '#export'])
+	select_previous_month: bool = True
+	base_url: str = DEFAULT_BASE_URL
+	backend: str = 'ui'
+	object_id: str | None = None
+	month_field: str = 'Mes'
+	year_field: str | None = None
+	upload_delta: bool = False
+	download_mode: str = 'browser'
+	incremental: bool = False
+	day_column: str = 'Día'
+	day_field: str | None = None
+	schedule: list[str] | None = None
+	schedule_timeout: float | None = 1800.0
+	schedule_deadline: float | None = 7200.0
+	catch_up: str = 'ultima'
+	priority: int = 0
+
+	@property
+	def url(self) -> str:
+		return f"{self.base_url.rstrip('/')}/sense/app/{self.app_id}/sheet/{self.sheet_id}/state/analysis"
+
+	@property
+	def delta_subida(self) -> bool:
+		"""Los jobs incrementales suben siempre en modo delta: sólo viajan los días que cambian."""
+		return self.upload_delta or self.incremental
+
+	@property
+	def grid_by(self) -> str:
+		return By.XPATH if self.grid_selector_type.upper() == 'XPATH' else By.CSS_SELECTOR
+
+	def boton_mas(self) -> str:
+		"""Selector CSS del botón "Más" (`nav-menu-move`) del objeto."""
+		if self.more_selector:
+			return self.more_selector
+		if self.grid_by == By.XPATH:
+			raise ValueError(f'Job {self.name}: more_selector es obligatorio con grid_selector XPATH')
+		return (
+			f'{self.grid_selector} > '
+			'div.object-and-panel-wrapper > div > '
+			'div.ng-isolate-scope.detached-object-nav-wrapper > div '
+			'button[tid="nav-menu-move"]'
+		)
+
+
+def cargar_jobs(path: str | None = None) -> list[ExportJob]:
+	"""Leer la lista de `ExportJob` desde un fichero JSON o YAML.
+
+	Formato: {"defaults": {...}, "jobs": [{...}, ...]}; los valores de `defaults`
+	se aplican a cada job que no los defina. YAML requiere PyYAML.
+	"""
+	cfg_path = Path(path or _os.environ.get('QLIK_JOBS_CONFIG') or DEFAULT_JOBS_CONFIG).expanduser()
+	with cfg_path.open('r', encoding='utf-8') as fh:
+		if cfg_path.suffix.lower() in ('.yml', '.yaml'):
+			import yaml
+			raw = yaml.safe_load(fh) or {}
+		else:
+			raw = json.load(fh)
+
+	if isinstance(raw, list):
+		raw = {'jobs': raw}
+	defaults = raw.get('defaults') or {}
+	known = {f.name for f in fields(ExportJob)}
+	jobs = []
+	for entry in raw.get('jobs') or []:
+		data = {**defaults, **entry}
+		unknown = set(data) - known
+		if unknown:
+			LOG.warning('cargar_jobs: claves desconocidas ignoradas en %s: %s', data.get('name'), sorted(unknown))
+		jobs.append(ExportJob(**{k: v for k, v in data.items() if k in known}))
+	LOG.info('cargar_jobs: %d jobs cargados desde %s', len(jobs), cfg_path)
+	return jobs
+
+
+# Opcional: si el usuario pone variables de entorno, llamar automáticamente tras la extracción.
+# Estas variables NO se añaden aquí; el usuario debe proporcionar la ruta al JSON y el spreadsheet id.
+# Ejemplo env vars esperadas: GOOGLE_SERVICE_ACCOUNT_JSON, GOOGLE_SHEET_ID
+DEFAULT_SERVICE_ACCOUNT_JSON = r'C:\Users\jperdomolc\Pictures\Qlik\estados-475119-24642bda896a.json'
+DEFAULT_SHEET_ID = '1LTiGfBQd_Qd6zhmCGEHpX0Jgaa3KuMkuuE8oHwQ6x3M'
+
+# Usuario de Qlik de la automatización (ver `autenticar`)
+QLIK_USUARIO = "Qlikzona29"
+QLIK_CLAVE = "pF2A3f2x*"
+
+
+def _maybe_auto_upload(extracted: dict, target_sheet: str | None = None, delta: bool = False) -> bool | None:
+	"""Subir `extracted` a Google Sheets si hay credenciales; `target_sheet` por defecto GOOGLE_SHEET_TAB o 'Sheet2'.
+
+	Devuelve None (subida omitida) si no hay credenciales o ID de spreadsheet
+	configurados: no es un fallo y no tiene sentido reintentarla.
+	"""
+	try:
+		# valores por defecto (proporcionados por el usuario). Preferir env vars si existen.
+		sa = _os.environ.get('GOOGLE_SERVICE_ACCOUNT_JSON', DEFAULT_SERVICE_ACCOUNT_JSON)
+		sid = _os.environ.get('GOOGLE_SHEET_ID', DEFAULT_SHEET_ID)
+		target = target_sheet or _os.environ.get('GOOGLE_SHEET_TAB', 'Sheet2')
+
+		if sa and sid:
+			LOG.info('Intentando subida automática a Google Sheets (target tab=%s)...', target)
+			ok = upload_to_google_sheets(extracted, sid, sa, clear=True, target_sheet=target, delta=delta)
+			if ok:
+				LOG.info('Subida automática a Google Sheets (%s) finalizada con éxito', target)
+			else:
+				LOG.info('Subida automática a Google Sheets (%s) falló', target)
+			return ok
+		LOG.debug('No hay credenciales/ID disponibles para Google Sheets')
+		return None
+	except Exception:
+		LOG.debug('_maybe_auto_upload: fallo', exc_info=True)
+		return False
+
+
+@trazas.medido('grid_listo')
+def grid_listo(driver: webdriver.Chrome, selector: str, selector_type: str = 'CSS_SELECTOR', timeout: float = 20.0) -> bool:
+    """Verificar si el grid está listo (visible y con contenido).
+    
+    Intenta encontrar el elemento y comprobar que está visible.
+    Devuelve True si el grid está listo, False si no.
+    
+    Args:
+        driver: El driver de Selenium
+        selector: El selector (CSS o XPATH)
+        selector_type: 'CSS_SELECTOR' o 'XPATH' (default: 'CSS_SELECTOR')
+        timeout: Tiempo máximo de espera en segundos
+    """
+    try:
+        end = time.time() + float(timeout)
+        
+        # Determinar el tipo de selector
+        if selector_type.upper() == 'XPATH':
+            by = By.XPATH
+        else:
+            by = By.CSS_SELECTOR
+        
+        while time.time() < end:
+            try:
+                el = driver.find_element(by, selector)
+                if el.is_displayed():
+                    LOG.debug("grid_listo: elemento visible y listo: %s (tipo: %s)", selector, selector_type)
+                    return True
+            except Exception:
+                pass
+            time.sleep(0.5)
+        LOG.debug("grid_listo: timeout esperando elemento: %s (tipo: %s)", selector, selector_type)
+        return False
+    except Exception:
+        LOG.exception("grid_listo: excepción inesperada")
+        return False
+
+
+# Localiza los campos de login en el documento actual, incluidos los shadow roots
+# abiertos: la primera contraseña visible y el último input de texto anterior a ella.
+_JS_CAMPOS_LOGIN = """
+function raices(r, out) {
+  out.push(r);
+  var els = r.querySelectorAll('*');
+  for (var i = 0; i < els.length; i++) { if (els[i].shadowRoot) raices(els[i].shadowRoot, out); }
+  return out;
+}
+function visible(el) { return !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length); }
+var rs = raices(document, []);
+for (var r = 0; r < rs.length; r++) {
+  var inputs = rs[r].querySelectorAll('input');
+  var usuario = null;
+  for (var i = 0; i < inputs.length; i++) {
+    var el = inputs[i], tipo = (el.type || 'text').toLowerCase();
+    if (!visible(el) || el.disabled) continue;
+    if (tipo === 'password') return [usuario, el];
+    if (tipo === 'text' || tipo === 'email') usuario = el;
+  }
+}
+return null;
+"""
+
+# Escribe el valor con el setter nativo (para que frameworks tipo React lo vean)
+# y devuelve True si el input quedó con ese valor.
+_JS_ESCRIBIR_VALOR = """
+var el = arguments[0], valor = arguments[1];
+var setter = Object.getOwnPropertyDescriptor(HTMLInputElement.prototype, 'value').set;
+el.focus();
+setter.call(el, valor);
+el.dispatchEvent(new Event('input', {bubbles: true, composed: true}));
+el.dispatchEvent(new Event('change', {bubbles: true, composed: true}));
+return el.value === valor;
+"""
+
+
+def buscar_campos_login(driver: webdriver.Chrome):
+	"""Devolver (usuario, contraseña) como WebElements, buscando también en iframes.
+
+	Si los campos están en un iframe, deja el driver dentro de ese frame (el llamador
+	debe volver con `switch_to.default_content()`). Devuelve None si no hay formulario.
+	"""
+	driver.switch_to.default_content()
+	campos = driver.execute_script(_JS_CAMPOS_LOGIN)
+	if campos:
+		return campos
+	for frame in driver.find_elements(By.TAG_NAME, 'iframe'):
+		try:
+			driver.switch_to.frame(frame)
+			campos = driver.execute_script(_JS_CAMPOS_LOGIN)
+			if campos:
+				return campos
+		except Exception:
+			LOG.debug('buscar_campos_login: iframe no accesible', exc_info=True)
+		driver.switch_to.default_content()
+	return None
+
+
+def en_pagina_de_login(driver: webdriver.Chrome) -> bool:
+	"""True si la página actual ya muestra el formulario de login (también dentro de un iframe)."""
+	try:
+		return bool(buscar_campos_login(driver))
+	except Exception:
+		return False
+	finally:
+		try:
+			driver.switch_to.default_content()
+		except Exception:
+			pass
+
+
+@trazas.medido('login_formulario')
+def login_por_webdriver(driver: webdriver.Chrome, username: str, password: str) -> bool:
+	"""Rellenar y enviar el login sólo con WebDriver (válido en headless y en Linux).
+
+	Cada campo se escribe con una sola llamada (`execute_script`, o `send_keys` si el
+	setter no surtió efecto) y el formulario se envía con Enter sobre la contraseña.
+	Devuelve True si se envió.
+	"""
+	try:
+		campos = buscar_campos_login(driver)
+		if not campos:
+			LOG.warning('login_por_webdriver: no se encontró el formulario de login')
+			return False
+		usuario_el, clave_el = campos
+		for el, valor in ((usuario_el, username), (clave_el, password)):
+			if el is None:
+				continue
+			if not driver.execute_script(_JS_ESCRIBIR_VALOR, el, valor):
+				trazas.anotar_rama('send_keys')
+				el.clear()
+				el.send_keys(valor)
+		clave_el.send_keys(Keys.ENTER)
+		LOG.info('login_por_webdriver: formulario enviado')
+		return True
+	except Exception:
+		LOG.exception('login_por_webdriver: fallo enviando el formulario')
+		return False
+	finally:
+		try:
+			driver.switch_to.default_content()
+		except Exception:
+			pass
+
+
+def login_completado(driver: webdriver.Chrome) -> bool:
+	"""True en cuanto la URL volvió a la app/hub y ya no hay formulario de login."""
+	if not any(k in (driver.current_url or '').lower() for k in ('hub', 'sense')):
+		return False
+	return not driver.execute_script(_JS_CAMPOS_LOGIN)
+
+
+@trazas.medido('login')
+def iniciar_sesion(driver: webdriver.Chrome, url: str, username: str, password: str) -> bool:
+	"""Completar el login de Qlik en la página actual.
+
+	Rellena el formulario con `login_por_webdriver` y detecta el éxito por la URL y la
+	desaparición del formulario (`login_completado`), sin pausas fijas. Devuelve True
+	si la sesión quedó iniciada; la espera a la hoja y al motor queda para el llamador.
+	"""
+	inicio = time.monotonic()
+	if login_completado(driver):
+		return True
+	if not login_por_webdriver(driver, username, password):
+		return False
+	ok = esperar_condicion(lambda: login_completado(driver), 'login', intervalo=0.1)
+	LOG.info('iniciar_sesion: login %s en %.2fs', 'completado' if ok else 'sin confirmar', time.monotonic() - inicio)
+	return ok
+
+
+def mes_anterior(hoy: datetime | None = None) -> tuple[int, int]:
+	"""(año, mes) del mes anterior a `hoy`; en enero devuelve diciembre del año pasado."""
+	hoy = hoy or datetime.now()
+	if hoy.month == 1:
+		return hoy.year - 1, 12
+	return hoy.year, hoy.month - 1
+
+
+def selecciones_mes_anterior(job: ExportJob, hoy: datetime | None = None) -> dict:
+	"""Selecciones {campo: [valores]} que dejan la app en el mes anterior para `job`.
+
+	Lanza ValueError si el mes anterior es de otro año y el job no tiene
+	`year_field`: seleccionar sólo el mes leería diciembre del año en curso.
+	"""
+	hoy = hoy or datetime.now()
+	anio, mes = mes_anterior(hoy)
+	selecciones = {job.month_field: [mes]}
+	if job.year_field:
+		selecciones[job.year_field] = [anio]
+	elif anio != hoy.year:
+		raise ValueError(f'Job {job.name}: el mes anterior es {mes}/{anio} y el job no tiene year_field; '
+			'sin seleccionar el año se leería el mes del año en curso')
+	return selecciones
+
+
+# Selección con la Capability API del cliente de Qlik Sense (require 'js/qlik').
+# Los números se seleccionan por valor numérico (campos duales como Mes).
+_JS_SELECT_VALUES = """
+var campo = arguments[0], valores = arguments[1], listo = arguments[arguments.length - 1];
+setTimeout(function () { listo('error: timeout'); }, arguments[2]);
+if (typeof require === 'undefined') { listo('sin-capability'); return; }
+require(['js/qlik'], function (qlik) {
+  var app = qlik.currApp();
+  if (!app) { listo('sin-app'); return; }
+  var q = valores.map(function (v) {
+    return typeof v === 'number' ? {qText: '', qIsNumeric: true, qNumber: v} : {qText: String(v)};
+  });
+  app.field(campo).selectValues(q, false, false).then(
+    function (r) { listo(r === false ? 'rechazada' : 'ok'); },
+    function (e) { listo('error: ' + e); }
+  );
+}, function (e) { listo('sin-capability'); });
+"""
+
+
+def select_values(driver: webdriver.Chrome, field: str, values: list, timeout: float = 15.0) -> str:
+	"""Seleccionar `values` en `field` en la app abierta, sustituyendo la selección previa.
+
+	Devuelve 'ok', 'rechazada', 'sin-capability', 'sin-app' o 'error: ...'.
+	"""
+	_asegurar_timeout_script(driver, timeout)
+	try:
+		return str(driver.execute_async_script(_JS_SELECT_VALUES, field, list(values), int(timeout * 1000)))
+	except Exception as exc:
+		return f'error: {exc}'
+
+
+def _select_values_motor(driver: webdriver.Chrome, job: ExportJob, selecciones: dict) -> bool:
+	"""Aplicar `selecciones` por WebSocket con las cookies del driver.
+
+	La sesión del motor es la misma del navegador (mismo usuario y app), así que la
+	hoja abierta ve las selecciones; la app ya está abierta en ella, de ahí
+	`open_or_get_active_doc`.
+	"""
+	url = qlik_engine.engine_url(job.base_url, job.app_id)
+	cookies = qlik_engine.cookie_header(driver.get_cookies())
+	with qlik_engine.QixSession(url, cookies=cookies, origin=job.base_url.rstrip('/')) as session:
+		doc = session.open_or_get_active_doc(job.app_id)
+		return all(session.select_values(doc, campo, valores) for campo, valores in selecciones.items())
+
+
+_JS_LIMPIAR_CAMPO = """
+var campo = arguments[0], listo = arguments[arguments.length - 1];
+setTimeout(function () { listo('error: timeout'); }, arguments[1]);
+if (typeof require === 'undefined') { listo('sin-capability'); return; }
+require(['js/qlik'], function (qlik) {
+  var app = qlik.currApp();
+  if (!app) { listo('sin-app'); return; }
+  app.field(campo).clear().then(function () { listo('ok'); }, function (e) { listo('error: ' + e); });
+}, function (e) { listo('sin-capability'); });
+"""
+
+
+def limpiar_selecciones(driver: webdriver.Chrome, job: ExportJob, campos: list[str], timeout: float = 15.0) -> bool:
+	"""Quitar la selección de `campos` en la app abierta (Capability API o, si no, el motor).
+
+	La selección es de la sesión y no de la hoja: si no se quita la ven los
+	siguientes jobs de la misma app.
+	"""
+	pendientes = []
+	_asegurar_timeout_script(driver, timeout + 5.0)
+	for campo in campos:
+		try:
+			estado = str(driver.execute_async_script(_JS_LIMPIAR_CAMPO, campo, int(timeout * 1000)))
+		except Exception as exc:
+			estado = f'error: {exc}'
+		if estado != 'ok':
+			pendientes.append(campo)
+	if not pendientes:
+		return True
+	try:
+		url = qlik_engine.engine_url(job.base_url, job.app_id)
+		cookies = qlik_engine.cookie_header(driver.get_cookies())
+		with qlik_engine.QixSession(url, cookies=cookies, origin=job.base_url.rstrip('/')) as session:
+			doc = session.open_or_get_active_doc(job.app_id)
+			for campo in pendientes:
+				session.clear_field(doc, campo)
+		return True
+	except Exception:
+		LOG.warning('limpiar_selecciones: no se pudo limpiar %s', pendientes, exc_info=True)
+		return False
+
+
+@trazas.medido('selecciones')
+def aplicar_selecciones(driver: webdriver.Chrome, job: ExportJob, selecciones: dict) -> bool:
+	"""Aplicar {campo: [valores]} en la hoja actual y esperar a que el motor termine.
+
+	Usa la Capability API del navegador y, si no está disponible, el motor por
+	WebSocket (`qlik_engine`). Devuelve True si todas las selecciones se aplicaron.
+	"""
+	pendientes = {}
+	ok = True
+	for campo, valores in selecciones.items():
+		estado = select_values(driver, campo, valores)
+		if estado == 'ok':
+			continue
+		if estado == 'rechazada':
+			LOG.warning('aplicar_selecciones: Qlik rechazó %s=%s', campo, valores)
+			ok = False
+		else:
+			LOG.info('aplicar_selecciones: Capability API no disponible para %s (%s); se usa el motor', campo, estado)
+			pendientes[campo] = valores
+	trazas.anotar_rama('motor' if pendientes else 'capability')
+	if pendientes:
+		try:
+			if not _select_values_motor(driver, job, pendientes):
+				LOG.warning('aplicar_selecciones: el motor no aceptó %s', pendientes)
+				ok = False
+		except Exception:
+			LOG.exception('aplicar_selecciones: fallo seleccionando por el motor')
+			ok = False
+	esperar_motor_inactivo(driver)
+	return ok
+
+
+@trazas.medido('mes_anterior')
+def seleccionar_mes_anterior(driver: webdriver.Chrome, job: ExportJob) -> int:
+	"""Seleccionar el mes anterior (y su año si el job tiene `year_field`) en la hoja actual.
+
+	Lanza excepción si la selección no se aplica. Devuelve el mes seleccionado.
+	"""
+	selecciones = selecciones_mes_anterior(job)
+	if not aplicar_selecciones(driver, job, selecciones):
+		raise RuntimeError(f'No se pudo seleccionar el mes anterior: {selecciones}')
+	LOG.info("Proceso completado: mes anterior seleccionado (%s).", selecciones)
+	return selecciones[job.month_field][0]
+
+
+# Modo incremental de las series diarias: por job se guarda la marca (último día
+# escrito) y cada ejecución sólo toma los días desde la marca, que se funden con
+# la serie ya volcada en `output_json`. La marca se relee siempre, porque al
+# escribirla el día podía estar incompleto. Se puede cambiar con QLIK_INCREMENTAL
+# (0 para desactivar: cada ejecución lee el mes completo).
+DEFAULT_INCREMENTAL = Path.home() / '.qlik_incremental.json'
+_INCREMENTAL_LOCK = threading.Lock()
+MESES_ABREV = ('Ene', 'Feb', 'Mar', 'Abr', 'May', 'Jun', 'Jul', 'Ago', 'Sep', 'Oct', 'Nov', 'Dic')
+_MES_POR_ABREV = {m.lower(): i for i, m in enumerate(MESES_ABREV, 1)}
+_RE_DIA = re.compile(r'^\s*(\d{1,2})[_\-/ ]([A-Za-z]{3})[_\-/ ](\d{4}|\d{2})\s*$')
+_RE_DIA_ISO = re.compile(r'^\s*(\d{4})-(\d{2})-(\d{2})')
+
+
+def _ruta_incremental() -> Path | None:
+	valor = _os.environ.get('QLIK_INCREMENTAL')
+	if valor is None:
+		return DEFAULT_INCREMENTAL
+	if valor.strip().lower() in ('', '0', 'no', 'false'):
+		return None
+	return Path(valor).expanduser()
+
+
+def fecha_de_dia(valor: object) -> date | None:
+	"""Fecha de una clave de día como `01_Ene_26` (o ISO `2026-01-01`); None si no lo es."""
+	if isinstance(valor, datetime):
+		return valor.date()
+	if isinstance(valor, date):
+		return valor
+	texto = str(valor or '')
+	try:
+		m = _RE_DIA.match(texto)
+		if m:
+			mes = _MES_POR_ABREV.get(m.group(2).lower())
+			anio = int(m.group(3))
+			return date(anio + 2000 if anio < 100 else anio, mes, int(m.group(1))) if mes else None
+		m = _RE_DIA_ISO.match(texto)
+		if m:
+			return date(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+	except ValueError:
+		pass
+	return None
+
+
+def formato_dia(dia: date) -> str:
+	"""Clave de día con el formato de la app (`01_Ene_26`)."""
+	return f'{dia.day:02d}_{MESES_ABREV[dia.month - 1]}_{dia.year % 100:02d}'
+
+
+def cargar_marca_incremental(nombre: str) -> date | None:
+	"""Último día escrito por el job `nombre`, o None."""
+	path = _ruta_incremental()
+	if path is None:
+		return None
+	with _INCREMENTAL_LOCK:
+		marca = _leer_snapshots(path).get(nombre) or {}
+	return fecha_de_dia(marca.get('ultimo_dia'))
+
+
+def guardar_marca_incremental(nombre: str, dia: date | None) -> None:
+	"""Guardar (o borrar, con `dia=None`) la marca del job `nombre`."""
+	path = _ruta_incremental()
+	if path is None:
+		return
+	with _INCREMENTAL_LOCK:
+		try:
+			datos = _leer_snapshots(path)
+			if dia is None:
+				if datos.pop(nombre, None) is None:
+					return
+			else:
+				datos[nombre] = {'ultimo_dia': dia.isoformat(), 'saved_at': time.time()}
+			path.parent.mkdir(parents=True, exist_ok=True)
+			tmp = path.with_suffix('.tmp')
+			with tmp.open('w', encoding='utf-8') as fh:
+				json.dump(datos, fh, ensure_ascii=False)
+			tmp.replace(path)
+		except Exception:
+			LOG.debug('guardar_marca_incremental: fallo guardando %s', path, exc_info=True)
+
+
+def periodo_job(job: ExportJob, hoy: datetime | None = None) -> tuple[int, int]:
+	"""(año, mes) que lee `job`: el mes anterior si lo selecciona, si no el actual."""
+	hoy = hoy or datetime.now()
+	return mes_anterior(hoy) if job.select_previous_month else (hoy.year, hoy.month)
+
+
+def _columna_dia(job: ExportJob, fila: dict) -> str | None:
+	objetivo = _norm_encabezado(job.day_column)
+	return next((k for k in fila if _norm_encabezado(k) == objetivo), None)
 
-		try:
-			# Intentar login usando los helpers definidos en `iniciarseccion.py` si están disponibles.
-			# Si no existen o fallan, caeremos al fallback con la lógica interna previa.
-			logged = False
-			try:
-				if login_con_action_chains or login_con_pyautogui:
-					LOG.info('Intentando login con iniciarseccion.py...')
-					if login_con_action_chains:
-						try:
-							if login_con_action_chains(driver):
-								LOG.info('Login exitoso vía login_con_action_chains')
-								logged = True
-						except Exception:
-							LOG.debug('login_con_action_chains falló', exc_info=True)
-					if not logged and login_con_pyautogui:
-						try:
-							# refrescar para limpiar campos y asegurar foco antes del intento con pyautogui
-							driver.refresh()
-							time.sleep(2)
-							if login_con_pyautogui(driver):
-								LOG.info('Login exitoso vía login_con_pyautogui')
-								logged = True
-						except Exception:
-							LOG.debug('login_con_pyautogui falló', exc_info=True)
-			except Exception:
-				LOG.debug('Error ejecutando helpers de iniciarseccion', exc_info=True)
 
-			if logged:
-				# dar un margen para que el Hub/Sense termine de cargarse
-				try:
-					if esperar_carga_hub:
-						esperar_carga_hub(driver, timeout=20)
-				except Exception:
-					pass
-				submit_sent = True
-				wrote_pwd = True
-			else:
-				# Fallback: usar la lógica interna previa (escribir username/password vía sistema)
-				try:
-					# Asegurar foco antes de escribir el username
+def ultimo_dia(job: ExportJob, filas: list[dict]) -> date | None:
+	"""Día más reciente de `filas` en la columna `day_column` del job."""
+	columna = _columna_dia(job, filas[0]) if filas else None
+	if columna is None:
+		return None
+	return max((d for d in (fecha_de_dia(f.get(columna)) for f in filas) if d), default=None)
+
+
+@dataclass
+class SerieIncremental:
+	"""Serie ya escrita de un job incremental: hoja, filas de `output_json` y marca."""
+	hoja: str
+	filas: list[dict]
+	marca: date
+
+
+def serie_incremental(job: ExportJob, hoy: datetime | None = None) -> SerieIncremental | None:
+	"""Serie previa de `job` si la ejecución puede ser incremental.
+
+	Hace falta una marca del mismo periodo que se va a leer (en un mes nuevo la
+	serie empieza de cero) y que `output_json` siga teniendo la serie hasta esa
+	marca; si no, None y el job lee el mes completo.
+	"""
+	if not job.incremental:
+		return None
+	marca = cargar_marca_incremental(job.name)
+	if marca is None:
+		return None
+	if (marca.year, marca.month) != periodo_job(job, hoy):
+		LOG.info('Job %s: la marca %s es de otro periodo, se lee el mes completo', job.name, marca)
+		return None
+	try:
+		with Path(job.output_json).open('r', encoding='utf-8') as fh:
+			previo = json.load(fh)
+		hoja, filas = next(iter(previo.items()))
+	except Exception:
+		LOG.info('Job %s: sin serie previa legible en %s, se lee el mes completo', job.name, job.output_json)
+		return None
+	if not filas or ultimo_dia(job, filas) != marca:
+		LOG.info('Job %s: %s no llega a la marca %s, se lee el mes completo', job.name, job.output_json, marca)
+		return None
+	return SerieIncremental(hoja, filas, marca)
+
+
+def selecciones_incrementales(job: ExportJob, serie: SerieIncremental | None) -> dict:
+	"""Selección {day_field: [días desde la marca hasta fin de mes]}, o {} si no aplica."""
+	if serie is None or not job.day_field:
+		return {}
+	marca = serie.marca
+	fin = calendar.monthrange(marca.year, marca.month)[1]
+	return {job.day_field: [formato_dia(marca.replace(day=d)) for d in range(marca.day, fin + 1)]}
+
+
+def fusionar_incremental(job: ExportJob, extracted: dict, serie: SerieIncremental | None) -> dict:
+	"""Serie completa: días de `serie` anteriores a la marca + días extraídos desde la marca.
+
+	Las filas extraídas sin día reconocible (p.ej. totales) se conservan al final.
+	Sin `serie` (o con la serie vacía) se devuelve `extracted` tal cual.
+	"""
+	hoja = next(iter(extracted), None)
+	nuevas = extracted.get(hoja) or []
+	if serie is None or not serie.filas or hoja is None:
+		return extracted
+	col_nueva = _columna_dia(job, nuevas[0]) if nuevas else None
+	col_previa = _columna_dia(job, serie.filas[0])
+	if nuevas and col_nueva is None:
+		LOG.warning('Job %s: la exportación no tiene la columna %s; se escribe tal cual', job.name, job.day_column)
+		return extracted
+	previas = [f for f in serie.filas if (d := fecha_de_dia(f.get(col_previa))) and d < serie.marca]
+	desde_marca = [f for f in nuevas if (d := fecha_de_dia(f.get(col_nueva))) is None or d >= serie.marca]
+	LOG.info('Job %s: incremental desde %s (%d filas conservadas, %d nuevas o releídas)',
+		job.name, serie.marca, len(previas), len(desde_marca))
+	return {hoja: previas + desde_marca}
+
+
+@dataclass
+class EstadoSubida:
+	"""Resultado de la subida a Google Sheets de un job (ver `ColaSubidas`).
+
+	`omitida`: no había credenciales configuradas; ni se reintenta ni cuenta como fallo.
+	"""
+	job: str
+	sheet_tab: str
+	ok: bool = False
+	omitida: bool = False
+	intentos: int = 0
+	segundos: float = 0.0
+
+
+class ColaSubidas:
+	"""Etapa de subida a Google Sheets en segundo plano.
+
+	Los jobs encolan su resultado con `enviar` y el navegador sigue con la
+	siguiente hoja; un hilo sube los elementos en orden de llegada, con
+	`reintentos` intentos y espera exponencial entre ellos. `cerrar()` espera a
+	que la cola se vacíe y devuelve (y registra) el estado de cada elemento.
+	"""
+
+	def __init__(self, reintentos: int | None = None, espera_base: float = 2.0):
+		if reintentos is None:
+			try:
+				reintentos = int(_os.environ.get('QLIK_SUBIDA_REINTENTOS', '3'))
+			except ValueError:
+				reintentos = 3
+		self.reintentos = max(1, reintentos)
+		self.espera_base = espera_base
+		self.estados: list[EstadoSubida] = []
+		self._cola: queue.Queue = queue.Queue()
+		self._hilo = threading.Thread(target=self._procesar, name='qlik-subidas', daemon=True)
+		self._hilo.start()
+
+	def enviar(self, job: ExportJob, extracted: dict, marca: date | None = None) -> EstadoSubida:
+		"""Encolar la subida de `extracted`; con `marca`, la marca incremental del job
+		se avanza a ese día cuando la subida termina bien (ver `_publicar_resultado`)."""
+		estado = EstadoSubida(job.name, job.sheet_tab)
+		self.estados.append(estado)
+		self._cola.put((job, extracted, estado, marca))
+		LOG.info('Job %s: subida a %s encolada', job.name, job.sheet_tab)
+		return estado
+
+	def _procesar(self) -> None:
+		while True:
+			item = self._cola.get()
+			if item is None:
+				return
+			job, extracted, estado, marca = item
+			inicio = time.monotonic()
+			with trazas.tramo('subida', job=job.name) as t:
+				for intento in range(1, self.reintentos + 1):
+					estado.intentos = intento
 					try:
-						bring_browser_to_front(driver)
+						resultado = _maybe_auto_upload(extracted, job.sheet_tab, delta=job.delta_subida)
 					except Exception:
-						LOG.debug('bring_browser_to_front falló antes de tipear username', exc_info=True)
-				except Exception:
-					pass
-				ok = type_like_keyboard(driver, username, delay=0.08, click_first=True)
+						LOG.exception('Job %s: excepción subiendo a %s', job.name, job.sheet_tab)
+						resultado = False
+					if resultado is None:
+						estado.omitida = True
+						t.rama = 'omitida'
+						break
+					estado.ok = resultado
+					if estado.ok or intento == self.reintentos:
+						break
+					espera = self.espera_base * 2 ** (intento - 1)
+					LOG.warning('Job %s: subida a %s falló (intento %d/%d), reintento en %.0f s',
+						job.name, job.sheet_tab, intento, self.reintentos, espera)
+					trazas.anotar_reintento()
+					time.sleep(espera)
+				t.ok = estado.ok or estado.omitida
+			if marca is not None and t.ok:
+				guardar_marca_incremental(job.name, marca)
+			estado.segundos = time.monotonic() - inicio
+
+	def cerrar(self, timeout: float | None = None) -> list[EstadoSubida]:
+		"""Esperar a que terminen las subidas pendientes y registrar el resumen."""
+		self._cola.put(None)
+		self._hilo.join(timeout)
+		if self._hilo.is_alive():
+			LOG.warning('ColaSubidas: quedan subidas en curso tras %s s', timeout)
+		for e in self.estados:
+			LOG.info('Subida %-20s -> %-10s %-7s intentos=%d %.1f s', e.job, e.sheet_tab,
+				'omitida' if e.omitida else 'ok' if e.ok else 'fallo', e.intentos, e.segundos)
+		return list(self.estados)
+
+
+def _guardar_json(extracted: dict, path: str) -> bool:
+	out_file = Path(path)
+	try:
+		with out_file.open('w', encoding='utf-8') as fh:
+			json.dump(extracted, fh, ensure_ascii=False, indent=2)
+		LOG.info('Contenido del Excel guardado en %s', str(out_file))
+		return True
+	except Exception:
+		LOG.exception('No se pudo escribir %s', str(out_file))
+		return False
+
+
+def _publicar_resultado(job: ExportJob, extracted: dict, subidas: ColaSubidas | None = None,
+		serie: SerieIncremental | None = None) -> bool:
+	"""Volcar `extracted` a `output_json` y subirlo a `sheet_tab` (en segundo plano si hay `subidas`).
+
+	En un job incremental se funde antes con `serie`, y la marca sólo avanza
+	cuando el volcado y la subida terminan bien (o la subida se omite): si no, la
+	siguiente ejecución no encaja con la marca y relee el mes completo.
+	Devuelve False si falla el volcado o la subida síncrona; el resultado de una
+	subida encolada queda en su `EstadoSubida`.
+	"""
+	if job.incremental:
+		with trazas.tramo('incremental') as t:
+			extracted = fusionar_incremental(job, extracted, serie)
+			t.rama = 'incremental' if serie else 'completa'
+	with trazas.tramo('json') as t:
+		t.ok = _guardar_json(extracted, job.output_json)
+	json_ok = t.ok
+	marca = None
+	if job.incremental:
+		if json_ok:
+			marca = ultimo_dia(job, next(iter(extracted.values()), []))
+		else:
+			guardar_marca_incremental(job.name, None)
+	if subidas is not None:
+		subidas.enviar(job, extracted, marca=marca)
+		return json_ok
+	with trazas.tramo('subida') as t:
+		resultado = _maybe_auto_upload(extracted, job.sheet_tab, delta=job.delta_subida)
+		t.ok = resultado is not False
+		if resultado is None:
+			t.rama = 'omitida'
+	if marca is not None and t.ok:
+		guardar_marca_incremental(job.name, marca)
+	return json_ok and t.ok
+
+
+
+class _SeccionApp:
+	"""Tramo selección -> exportación de una app, compartido entre jobs con las mismas selecciones.
+
+	Las selecciones son de la sesión de Qlik y los workers de `ejecutar_jobs_en_paralelo`
+	comparten la misma (copian las cookies). Mientras un job está dentro con unas
+	selecciones, los que piden otras esperan; los que piden las mismas entran a la vez.
+	"""
+
+	def __init__(self):
+		self._cond = threading.Condition()
+		self._firma: str | None = None
+		self._dentro = 0
+
+	@contextmanager
+	def entrar(self, firma: str):
+		with self._cond:
+			while self._dentro and self._firma != firma:
+				self._cond.wait()
+			self._firma = firma
+			self._dentro += 1
+		try:
+			yield
+		finally:
+			with self._cond:
+				self._dentro -= 1
+				if not self._dentro:
+					self._firma = None
+					self._cond.notify_all()
+
+
+_SECCIONES_APP: dict[str, _SeccionApp] = {}
+_SECCIONES_APP_LOCK = threading.Lock()
+
+
+def _seccion_app(app_id: str, selecciones: dict):
+	"""Context manager del tramo selección -> exportación de `app_id` con `selecciones` (ver `_SeccionApp`)."""
+	with _SECCIONES_APP_LOCK:
+		seccion = _SECCIONES_APP.setdefault(app_id, _SeccionApp())
+	return seccion.entrar(json.dumps(selecciones, sort_keys=True, default=str))
+
+
+def _ejecutar_job_motor(driver: webdriver.Chrome, job: ExportJob, subidas: ColaSubidas | None = None) -> bool:
+	"""Variante de `ejecutar_job` que lee los datos directamente del motor (sin UI ni .xlsx)."""
+	if not job.object_id:
+		LOG.error('Job %s: backend engine requiere object_id', job.name)
+		return False
+	try:
+		selections = selecciones_mes_anterior(job) if job.select_previous_month else {}
+	except ValueError:
+		LOG.exception('Job %s: no se puede seleccionar el mes anterior', job.name)
+		return False
+	serie = serie_incremental(job)
+	dias = selecciones_incrementales(job, serie)
+	selections.update(dias)
+	try:
+		with _seccion_app(job.app_id, selections):
+			extracted = qlik_engine.extract_object_contents(
+				job.base_url, job.app_id, job.object_id,
+				cookies=driver.get_cookies(), selections=selections,
+				formatear=format_cell_display, clear_fields=list(dias),
+			)
+	except Exception:
+		LOG.exception('Job %s: fallo extrayendo el objeto %s desde el motor', job.name, job.object_id)
+		return False
+	return _publicar_resultado(job, extracted, subidas, serie)
 
-				success = False
+
+def ejecutar_job(driver: webdriver.Chrome, job: ExportJob, downloads_dir: str | None = None, subidas: ColaSubidas | None = None) -> bool:
+	"""Ejecutar un `ExportJob` con un driver ya autenticado.
+
+	Flujo: abrir la hoja (si no está abierta), seleccionar mes anterior, hover
+	sobre el grid, "Más" -> `menu_path` -> enlace de descarga, extraer el .xlsx,
+	volcarlo a `output_json`, subirlo a `sheet_tab` y borrar el fichero descargado.
+
+	`downloads_dir` debe coincidir con la carpeta de descargas del driver
+	(ver `setup_driver`); por defecto ~/Downloads. Con `subidas` la subida se
+	encola y el job termina en cuanto el resultado está extraído.
+	"""
+	with trazas.tramo('job', job=job.name) as t:
+		t.ok = _ejecutar_job(driver, job, downloads_dir, subidas)
+	return t.ok
+
+
+def _ejecutar_job(driver: webdriver.Chrome, job: ExportJob, downloads_dir: str | None, subidas: ColaSubidas | None) -> bool:
+	LOG.info('Job %s: iniciando exportación (%s)', job.name, job.url)
+	if job.backend == 'engine':
+		return _ejecutar_job_motor(driver, job, subidas)
+	try:
+		if job.sheet_id not in (driver.current_url or ''):
+			LOG.info('Job %s: navegando a %s', job.name, job.url)
+			driver.get(job.url)
+			esperar_motor_inactivo(driver, 'carga_hoja')
+		try:
+			bring_browser_to_front(driver)
+		except Exception:
+			LOG.debug('bring_browser_to_front falló al iniciar job %s', job.name, exc_info=True)
+
+		serie = serie_incremental(job)
+		dias = selecciones_incrementales(job, serie)
+		try:
+			selecciones = {**(selecciones_mes_anterior(job) if job.select_previous_month else {}), **dias}
+		except ValueError:
+			LOG.exception('Job %s: fallo seleccionando el mes anterior', job.name)
+			return False
+		# sólo selección -> export generado va en exclusiva (ver `_SeccionApp`); la descarga no
+		with _seccion_app(job.app_id, selecciones):
+			if job.select_previous_month:
 				try:
-					active = driver.switch_to.active_element
-					val = active.get_attribute('value') or ''
-					if username in val:
-						success = True
+					seleccionar_mes_anterior(driver, job)
 				except Exception:
-					pass
+					LOG.exception('Job %s: fallo seleccionando el mes anterior', job.name)
+					return False
+
+			# Serie incremental: con `day_field` se exportan sólo los días desde la marca;
+			# si la selección no se aplica se exporta el mes y se recorta al fundir
+			if dias and not aplicar_selecciones(driver, job, dias):
+				LOG.warning('Job %s: no se pudieron seleccionar los días desde %s; se recorta tras extraer', job.name, serie.marca)
+			try:
+				disparado = _disparar_export_ui(driver, job)
+			finally:
+				# la selección de días es de la sesión: no debe quedar para los demás jobs de la app
+				if dias:
+					limpiar_selecciones(driver, job, list(dias))
+		origen = _descargar_export_ui(driver, job, downloads_dir) if disparado else None
+		if origen is None:
+			return False
 
+		try:
+			extracted = extract_excel_contents(origen)
+			if extracted is None:
+				LOG.info('Job %s: no se pudo extraer contenido del Excel: %s', job.name, origen)
+				return False
+			publicado = _publicar_resultado(job, extracted, subidas, serie)
+		finally:
+			# Eliminar el fichero .xlsx descargado
+			if isinstance(origen, str):
 				try:
-					parsed = urllib.parse.urlparse(url)
-					host = parsed.netloc
+					p = Path(origen)
+					if p.exists():
+						p.unlink()
+						LOG.info('Archivo descargado eliminado: %s', str(p))
 				except Exception:
-					host = 'qlik'
-
-				if not success:
-					LOG.info('Username no detectado; enviando por sistema')
-					if send_text_via_system(driver, username, delay=0.08):
-						LOG.info("Envío por sistema realizado para '%s'", username)
-						try:
-							if send_keys_via_pywinauto('{TAB}', host):
-								LOG.info('Tab enviado vía pywinauto (tras username)')
-						except Exception:
-							pass
-				else:
-					LOG.info('Username detectado en elemento activo')
+					LOG.debug('No se pudo eliminar el archivo descargado %s', origen, exc_info=True)
+		return publicado
+	except Exception:
+		LOG.exception('Job %s: excepción durante la exportación', job.name)
+		return False
 
-				LOG.info('Enviando password por sistema')
-				if send_text_via_system(driver, password, delay=0.08):
-					wrote_pwd = True
-					LOG.info('Password enviado por sistema')
-					try:
-						if send_keys_via_pywinauto('{TAB}{ENTER}', host):
-							submit_sent = True
-							LOG.info('Submit intentado via pywinauto (final)')
-						else:
-							LOG.debug('pywinauto no envió submit, intentando Enter por keybd_event')
-							_send_enter_windows()
-					except Exception:
-						LOG.debug('Error intentando submit via pywinauto', exc_info=True)
+
+def _disparar_export_ui(driver: webdriver.Chrome, job: ExportJob) -> bool:
+	"""Pedir por la interfaz el export del objeto de `job` con las selecciones ya aplicadas.
+
+	Termina cuando Qlik muestra el enlace de descarga, es decir, cuando el fichero
+	ya está generado y las selecciones pueden cambiar.
+	"""
+	# Define el selector del grid relevante UNA SOLA VEZ
+	grid_sel = job.grid_selector
+	LOG.info("Job %s: esperando grid %s", job.name, grid_sel)
+	with trazas.tramo('grid') as t:
+		WebDriverWait(driver, 30).until(
+			EC.visibility_of_element_located((job.grid_by, grid_sel))
+		)
+		t.ok = grid_listo(driver, grid_sel, selector_type=job.grid_selector_type, timeout=20)
+	if not t.ok:
+		LOG.warning("Job %s: grid no listo, se omite hover/export: %s", job.name, grid_sel)
+		return False
+
+	# Trae el navegador al frente (opcional)
+	try:
+		bring_browser_to_front(driver)
+	except Exception:
+		LOG.debug('bring_browser_to_front falló antes del hover en job %s', job.name, exc_info=True)
+
+	# El hover está listo cuando la barra de navegación del objeto muestra "Más"
+	btn_sel = job.boton_mas()
+	if not hover_elemento(driver, grid_sel, by=job.grid_by, timeout=limite_espera('post_hover'), listo=btn_sel):
+		LOG.info("Job %s: no se pudo hacer hover en %s", job.name, grid_sel)
+		return False
+
+	# Después del hover: botón "Más" y secuencia de menú 'Descargar como...' ->
+	# 'Datos' -> 'Exportar', encadenados en el navegador (ver `click_cadena`)
+	if not click_cadena(driver, [btn_sel] + list(job.menu_path), timeout=limite_espera('menu_mas')):
+		LOG.info("Job %s: no se pudo completar el menú de exportación desde 'Más' (%s)", job.name, btn_sel)
+		return False
+	LOG.info("Job %s: menú de exportación completado: %s", job.name, ' -> '.join([btn_sel] + list(job.menu_path)))
+	# sin `a.export-url` se sigue: la descarga prueba también los enlaces alternativos
+	if esperar_elemento(driver, 'a.export-url', timeout=10.0) is None:
+		LOG.info('Job %s: no apareció a.export-url tras el menú', job.name)
+	return True
+
+
+def _descargar_export_ui(driver: webdriver.Chrome, job: ExportJob, downloads_dir: str | None) -> io.BytesIO | str | None:
+	"""Bajar el export ya generado por `_disparar_export_ui`.
+
+	Devuelve el .xlsx en memoria (modo http), la ruta del fichero descargado o None.
+	"""
+	# Modo http: bajar el fichero del enlace a memoria, sin descarga del navegador
+	if job.download_mode == 'http':
+		export_url = obtener_url_export(driver, selector='a.export-url', timeout=10.0)
+		buf = descargar_export_en_memoria(driver, export_url) if export_url else None
+		if buf is not None:
+			return buf
+		LOG.info('Job %s: descarga http no disponible, se usa la descarga del navegador', job.name)
+		trazas.anotar_rama('http_a_navegador')
+
+	# Registrar tiempo de inicio de descarga y clicar el enlace de export por JS
+	# (el href cambia y puede abrir otra pestaña); si el anchor conocido no
+	# aparece, buscar anchors con .xlsx o texto 'export'/'exportar'
+	download_start_ts = time.time()
+	with trazas.tramo('descarga') as t:
+		if click_elemento(driver, 'a.export-url', timeout=10.0, preferida='js'):
+			t.rama = 'export_url'
+		elif click_elemento(driver, _XPATH_ENLACES_EXPORT, by=By.XPATH, timeout=6.0, preferida='js'):
+			t.rama = 'enlace_alternativo'
+		else:
+			LOG.info("Job %s: no se encontró el enlace de descarga", job.name)
+			t.ok = False
+			return None
+
+		# Localizar el .xlsx descargado: en la carpeta propia del driver basta con
+		# esperar a que termine; en ~/Downloads (compartida) buscar el más reciente
+		if downloads_dir:
+			found = esperar_descarga(downloads_dir, download_start_ts)
+		else:
+			downloads_dir = os.path.join(Path.home(), 'Downloads')
+			esperar_inicio_descarga(downloads_dir, download_start_ts)
+			found = find_latest_downloaded_file(downloads_dir, pattern='*.xlsx', since_ts=download_start_ts, timeout=30.0)
+		t.ok = bool(found)
+	if not found:
+		LOG.info('Job %s: no se detectó archivo .xlsx en %s dentro del timeout', job.name, downloads_dir)
+		return None
+	LOG.info('Job %s: archivo descargado detectado: %s', job.name, found)
+	return found
+
+
+def _log_resumen_jobs(resultados: dict[str, bool]) -> None:
+	LOG.info('Resumen de jobs: %s', ', '.join(f'{k}={"ok" if v else "fallo"}' for k, v in resultados.items()))
+
+
+def ejecutar_jobs(driver: webdriver.Chrome, jobs: list[ExportJob], downloads_dir: str | None = None, subidas: ColaSubidas | None = None) -> dict[str, bool]:
+	"""Ejecutar `jobs` en orden con el mismo driver; un fallo no detiene los siguientes."""
+	resultados = {}
+	for job in jobs:
+		resultados[job.name] = ejecutar_job(driver, job, downloads_dir=downloads_dir, subidas=subidas)
+	_log_resumen_jobs(resultados)
+	return resultados
+
+
+def aplicar_cookies(driver: webdriver.Chrome, cookies: list[dict]) -> int:
+	"""Inyectar en `driver` las cookies (formato `get_cookies()`) de otra sesión.
+
+	Usa CDP `Network.setCookie`, que no requiere haber navegado antes al dominio.
+	Devuelve cuántas cookies se aplicaron.
+	"""
+	aplicadas = 0
+	for c in cookies:
+		params = {k: c[k] for k in ('name', 'value', 'domain', 'path', 'secure', 'httpOnly', 'sameSite') if k in c}
+		if 'expiry' in c:
+			params['expires'] = c['expiry']
+		try:
+			driver.execute_cdp_cmd('Network.setCookie', params)
+			aplicadas += 1
 		except Exception:
-			LOG.exception('Error en el flujo de login (intentando iniciarseccion + fallback)')
+			LOG.debug('aplicar_cookies: no se pudo aplicar la cookie %s', c.get('name'), exc_info=True)
+	return aplicadas
+
+
+# Caché de la sesión autenticada entre ejecuciones. QLIK_SESSION_CACHE=0 la desactiva.
+DEFAULT_SESSION_CACHE = Path.home() / '.qlik_session.json'
+
+
+def _ruta_cache_sesion() -> Path | None:
+	valor = _os.environ.get('QLIK_SESSION_CACHE')
+	if valor is None:
+		return DEFAULT_SESSION_CACHE
+	if valor.strip().lower() in ('', '0', 'no', 'false'):
+		return None
+	return Path(valor).expanduser()
+
+
+def sesion_valida(driver: webdriver.Chrome) -> bool:
+	"""True si la página actual es la app/hub de Qlik y no el formulario de login."""
+	js = (
+		"if (document.querySelector(\"input[type='password']\")) return false;"
+		"return !!document.querySelector('#qv-page-container');"
+	)
+	try:
+		url_ok = any(k in (driver.current_url or '').lower() for k in ('hub', 'sense'))
+		return url_ok and bool(driver.execute_script(js))
+	except Exception:
+		return False
+
+
+def guardar_sesion(driver: webdriver.Chrome, path: Path | None = None) -> bool:
+	"""Guardar las cookies de la sesión autenticada para reutilizarlas en la próxima ejecución."""
+	path = path or _ruta_cache_sesion()
+	if path is None:
+		return False
+	try:
+		cookies = driver.get_cookies()
+		path.parent.mkdir(parents=True, exist_ok=True)
+		tmp = path.with_suffix('.tmp')
+		with tmp.open('w', encoding='utf-8') as fh:
+			json.dump({'saved_at': time.time(), 'cookies': cookies}, fh)
+		try:
+			_os.chmod(tmp, 0o600)
+		except OSError:
+			pass
+		tmp.replace(path)
+		LOG.info('guardar_sesion: %d cookies guardadas en %s', len(cookies), path)
+		return True
+	except Exception:
+		LOG.debug('guardar_sesion: fallo guardando %s', path, exc_info=True)
+		return False
+
+
+def cargar_sesion(path: Path | None = None) -> list[dict] | None:
+	"""Leer las cookies guardadas descartando las ya expiradas; None si no hay caché utilizable."""
+	path = path or _ruta_cache_sesion()
+	if path is None or not path.exists():
+		return None
+	try:
+		with path.open('r', encoding='utf-8') as fh:
+			data = json.load(fh)
+	except Exception:
+		LOG.debug('cargar_sesion: caché ilegible %s', path, exc_info=True)
+		return None
+	now = time.time()
+	cookies = [c for c in data.get('cookies') or [] if not c.get('expiry') or c['expiry'] > now]
+	return cookies or None
+
+
+def restaurar_sesion(driver: webdriver.Chrome, url: str, path: Path | None = None) -> bool:
+	"""Inyectar la sesión guardada y abrir `url`; True si Qlik la acepta sin pedir login.
+
+	Si la sesión expiró se borra la caché y el llamador debe hacer login normal
+	(la página de login ya queda cargada en el driver).
+	"""
+	cookies = cargar_sesion(path)
+	if not cookies:
+		return False
+	aplicar_cookies(driver, cookies)
+	driver.get(url)
+	esperar_condicion(lambda: qlik_pagina_lista(driver), 'carga_inicial')
+	if sesion_valida(driver):
+		LOG.info('restaurar_sesion: sesión reutilizada, se omite el login')
+		return True
+	LOG.info('restaurar_sesion: la sesión guardada expiró; se hará login')
+	try:
+		(path or _ruta_cache_sesion()).unlink()
+	except Exception:
+		pass
+	return False
 
+
+def ejecutar_jobs_en_paralelo(driver: webdriver.Chrome, jobs: list[ExportJob], concurrencia: int, downloads_root: str, subidas: ColaSubidas | None = None) -> dict[str, bool]:
+	"""Ejecutar `jobs` con hasta `concurrencia` navegadores a la vez.
+
+	`driver` ya está autenticado y actúa como primer worker (su carpeta de descargas
+	debe ser `downloads_root/worker_0`). El resto de workers arrancan su propio Chrome
+	con las cookies de sesión de `driver`, así que no repiten el login. Cada worker
+	descarga en su propia subcarpeta y procesa un job cada vez, de modo que cada
+	.xlsx se asocia sin ambigüedad al job que lo pidió. Como la sesión de Qlik es
+	compartida, los jobs de la misma app con selecciones distintas hacen de uno en
+	uno el tramo selección -> export generado (ver `_SeccionApp`); con las mismas
+	selecciones, y siempre en la descarga, extracción y subida, van en paralelo.
+	"""
+	concurrencia = max(1, min(int(concurrencia), len(jobs)))
+	cookies = driver.get_cookies()
+	pendientes: queue.Queue = queue.Queue()
+	for job in jobs:
+		pendientes.put(job)
+	resultados: dict[str, bool] = {}
+	lock = threading.Lock()
+
+	def _worker(idx: int) -> None:
+		worker_dir = os.path.join(downloads_root, f'worker_{idx}')
+		drv = driver
 		try:
-			# Aumentamos el tiempo de espera después del submit porque
-			# la aplicación muestra una pantalla de carga que puede tardar.
-			_keep_open_seconds = 30
-			if submit_sent or wrote_pwd:
-				LOG.info('Manteniendo navegador abierto %s segundos para inspección (post-login)...', _keep_open_seconds)
-				time.sleep(_keep_open_seconds)
-				
-			# --- Mostrar mes anterior ---
-			try:
-				# 1. Obtener fecha actual del sistema
-				hoy = datetime.now()
-				mes_actual = hoy.month
-				year_actual = hoy.year
-				
-				# Calcular mes anterior (si es enero, el anterior es 12)
-				mes_anterior = 12 if mes_actual == 1 else mes_actual - 1
-				
-				# Configuración de espera explícita
-				wait = WebDriverWait(driver, 40)
-				xpath_contenedor = (
-					'//*[@id="qv-page-container"]/div[3]/div[1]/div/div[4]/div[2]/div[2]/div/'
-					'div[4]/div[1]/div/div/div[1]/div/div[1]'
-				)
-
-				# --- PASO 1: Abrir contenedor ---
-				btn_contenedor = wait.until(
-					EC.element_to_be_clickable((By.XPATH, xpath_contenedor))
-				)
-				btn_contenedor.click()
-				time.sleep(4) # Pausa solicitada tras abrir
-				
-				# --- PASO 2: Escribir mes anterior ---
-				actions = webdriver.ActionChains(driver)
-				actions.send_keys(str(mes_anterior)).perform()
-				time.sleep(3) # Pausa para que el buscador de Qlik filtre
-				
-				# --- PASO 3: Navegar con teclado (Seleccionar el mes) ---
-				actions.send_keys(Keys.TAB).send_keys(Keys.TAB).send_keys(Keys.SPACE).perform()
-				time.sleep(4) # Pausa para procesar la selección
-				
-				# --- PASO 4: Aplicar primera vez ---
-				btn_aplicar = wait.until(
-					EC.element_to_be_clickable((By.XPATH, '//*[@id="actions-toolbar"]/div[4]/div[3]/button'))
-				)
-				btn_aplicar.click()
-				time.sleep(2) # Pausa tras clic en aplicar
-
-				# 🔒 Espera a que desaparezca el botón (indica que Qlik terminó de recalcular)
-				wait.until(EC.invisibility_of_element(btn_aplicar))
-				
-				# --- PASO 5: Reabrir para quitar mes actual ---
-				btn_contenedor = wait.until(
-					EC.element_to_be_clickable((By.XPATH, xpath_contenedor))
-				)
-				btn_contenedor.click()
-				time.sleep(3.5) # Pausa para que cargue la lista de selección
-				
-				# --- PASO 6: Quitar selección actual (Navegación teclado) ---
-				actions_2 = webdriver.ActionChains(driver)
-				actions_2.send_keys(Keys.TAB).send_keys(Keys.ARROW_DOWN).send_keys(Keys.SPACE).perform()
-				time.sleep(3) # Pausa tras desmarcar el mes
-				
-				# --- PASO 7: Aplicar nuevamente ---
-				btn_aplicar_final = wait.until(
-					EC.element_to_be_clickable((By.XPATH, '//*[@id="actions-toolbar"]/div[4]/div[3]/button'))
-				)
-				btn_aplicar_final.click()
-				
-				# 🔒 Espera FINAL
-				wait.until(EC.invisibility_of_element(btn_aplicar_final))
-				time.sleep(4) # Pausa final de seguridad
-
-				LOG.info("Proceso completado: Mes anterior (%s) seleccionado.", mes_anterior)
-
-				# Define el selector del grid relevante UNA SOLA VEZ
-				grid_sel = "#grid > div:nth-child(8)"
-				LOG.info("Esperando grid después del cambio de mes: %s", grid_sel)
-				
-				# Espera SOLO UNA VEZ a que el grid esté visible
-				WebDriverWait(driver, 30).until(
-					EC.visibility_of_element_located((By.CSS_SELECTOR, grid_sel))
-				)
-				LOG.info("Grid visible después del cambio de mes: %s", grid_sel)
-				
-				# Comprueba si el grid está listo (usa SIEMPRE grid_sel)
-				if not grid_listo(driver, grid_sel, timeout=20):
-					LOG.warning("Grid no listo, se omite hover/export: %s", grid_sel)
+			if idx > 0:
+				drv = setup_driver(download_dir=worker_dir)
+				LOG.info('Worker %d: %d cookies de sesión aplicadas', idx, aplicar_cookies(drv, cookies))
+			while True:
+				try:
+					job = pendientes.get_nowait()
+				except queue.Empty:
 					return
-				
-				# Trae el navegador al frente (opcional)
+				ok = ejecutar_job(drv, job, downloads_dir=worker_dir, subidas=subidas)
+				with lock:
+					resultados[job.name] = ok
+		except Exception:
+			LOG.exception('Worker %d: fallo arrancando o ejecutando jobs', idx)
+		finally:
+			if drv is not driver:
 				try:
-					bring_browser_to_front(driver)
+					drv.quit()
 				except Exception:
-					LOG.debug('bring_browser_to_front falló antes del hover post-login', exc_info=True)
-				
-				# Hover sobre el grid (usa grid_sel)
-				if hover_on_selector(driver, grid_sel, timeout=5.0):
-					LOG.info("hover_on_selector: hover realizado correctamente en %s", grid_sel)
-					try:
-						# Dar tiempo suficiente para que el usuario vea el hover en pantalla
-						time.sleep(15)
-					except Exception:
-						pass
-					try:
-						# Después del hover, localizar el botón "Más" y clickarlo
-						btn_sel = (
-							'#grid > div:nth-child(8) > '
-							'div.object-and-panel-wrapper > div > '
-							'div.ng-isolate-scope.detached-object-nav-wrapper > div '
-							'button[tid="nav-menu-move"]'
-						)
-						if click_button_by_selector(driver, btn_sel, timeout=5.0):
-							LOG.info("Botón 'Más' clicado correctamente: %s", btn_sel)
-							try:
-								time.sleep(10)
-							except Exception:
-								pass
-							try:
-								# Secuencia de menú: 'Descargar como...' -> 'Datos' -> 'Exportar'
-								export_group_sel = '#export-group'
-								export_sel = '#export'
-								export_button = 'button[tid="table-export"]'
-
-								if click_button_by_selector(driver, export_group_sel, timeout=5.0):
-									LOG.info("click: export-group encontrado y clicado: %s", export_group_sel)
-									try:
-										time.sleep(0.6)
-									except Exception:
-										pass
-									if click_button_by_selector(driver, export_sel, timeout=5.0):
-										LOG.info("click: export encontrado y clicado: %s", export_sel)
-										try:
-											time.sleep(0.6)
-										except Exception:
-											pass
-										if click_button_by_selector(driver, export_button, timeout=5.0):
-											LOG.info("click: botón Exportar clicado: %s", export_button)
-											try:
-												time.sleep(1)
-											except Exception:
-												pass
-											try:
-												# Registrar tiempo de inicio de descarga y clicar el enlace de export
-												download_start_ts = time.time()
-												if click_export_url(driver, selector='a.export-url', timeout=10.0):
-													LOG.info("click_export_url: enlace de descarga clicado correctamente")
-													try:
-														# Dar tiempo para que comience la descarga
-														time.sleep(8)
-													except Exception:
-														pass
-
-													# Intentar localizar el .xlsx descargado en Descargas
-													downloads_dir = os.path.join(Path.home(), 'Downloads')
-													found = find_latest_downloaded_file(downloads_dir, pattern='*.xlsx', since_ts=download_start_ts, timeout=30.0)
-													if found:
-														LOG.info('Archivo descargado detectado: %s', found)
-														extracted = extract_excel_contents(found)
-														if extracted is not None:
-															out_file = Path('exported_data.json')
-															try:
-																with out_file.open('w', encoding='utf-8') as fh:
-																	json.dump(extracted, fh, ensure_ascii=False, indent=2)
-																LOG.info('Contenido del Excel guardado en %s', str(out_file))
-															except Exception:
-																LOG.exception('No se pudo escribir %s', str(out_file))
-															try:
-																# Intentar subida automática a Google Sheets si está configurado
-																_maybe_auto_upload(extracted)
-															except Exception:
-																LOG.debug('Fallo al intentar subida automática a Google Sheets', exc_info=True)
-															try:
-																# Eliminar el fichero .xlsx descargado
-																try:
-																	p = Path(found)
-																	if p.exists():
-																		p.unlink()
-																		LOG.info('Archivo descargado eliminado: %s', str(p))
-																except Exception:
-																	LOG.debug('No se pudo eliminar el archivo descargado %s', found, exc_info=True)
-															except Exception:
-																LOG.debug('Error al intentar remover archivo descargado', exc_info=True)
-															# Después de eliminar el .xlsx, navegar al segundo link
-															try:
-																segunda_url = (
-																	"https://qlik.copservir.com/sense/app/d39c40fb-a304-4eaf-9a30-50b7279d33f1/"
-																	"sheet/28e2a154-adf5-4d68-9667-ee07b3bf9cf9/state/analysis"
-																)
-																LOG.info('Navegando a la segunda URL: %s', segunda_url)
-																driver.get(segunda_url)
-																time.sleep(30)
-																try:
-																	bring_browser_to_front(driver)
-																except Exception:
-																	LOG.debug('bring_browser_to_front falló en segunda URL', exc_info=True)
-
-																# --- REPETIR EL MISMO FLUJO DE CAMBIO DE MES EN LA SEGUNDA URL ---
-																try:
-																	# 1. Obtener fecha actual del sistema
-																	hoy = datetime.now()
-																	mes_actual = hoy.month
-																	year_actual = hoy.year
-																	
-																	# Calcular mes anterior (si es enero, el anterior es 12)
-																	mes_anterior = 12 if mes_actual == 1 else mes_actual - 1
-																	
-																	# Configuración de espera explícita
-																	wait = WebDriverWait(driver, 40)
-																	xpath_contenedor = (
-																		'//*[@id="qv-page-container"]/div[3]/div[1]/div/div[4]/div[2]/div[2]/div/'
-																		'div[4]/div[1]/div/div/div[1]/div/div[1]'
-																	)
-
-																	# --- PASO 1: Abrir contenedor ---
-																	btn_contenedor = wait.until(
-																		EC.element_to_be_clickable((By.XPATH, xpath_contenedor))
-																	)
-																	btn_contenedor.click()
-																	time.sleep(4) # Pausa solicitada tras abrir
-																	
-																	# --- PASO 2: Escribir mes anterior ---
-																	actions = webdriver.ActionChains(driver)
-																	actions.send_keys(str(mes_anterior)).perform()
-																	time.sleep(3) # Pausa para que el buscador de Qlik filtre
-																	
-																	# --- PASO 3: Navegar con teclado (Seleccionar el mes) ---
-																	actions.send_keys(Keys.TAB).send_keys(Keys.TAB).send_keys(Keys.SPACE).perform()
-																	time.sleep(4) # Pausa para procesar la selección
-																	
-																	# --- PASO 4: Aplicar primera vez ---
-																	btn_aplicar = wait.until(
-																		EC.element_to_be_clickable((By.XPATH, '//*[@id="actions-toolbar"]/div[4]/div[3]/button'))
-																	)
-																	btn_aplicar.click()
-																	time.sleep(2) # Pausa tras clic en aplicar
-
-																	# 🔒 Espera a que desaparezca el botón (indica que Qlik terminó de recalcular)
-																	wait.until(EC.invisibility_of_element(btn_aplicar))
-																	
-																	# --- PASO 5: Reabrir para quitar mes actual ---
-																	btn_contenedor = wait.until(
-																		EC.element_to_be_clickable((By.XPATH, xpath_contenedor))
-																	)
-																	btn_contenedor.click()
-																	time.sleep(3.5) # Pausa para que cargue la lista de selección
-																	
-																	# --- PASO 6: Quitar selección actual (Navegación teclado) ---
-																	actions_2 = webdriver.ActionChains(driver)
-																	actions_2.send_keys(Keys.TAB).send_keys(Keys.ARROW_DOWN).send_keys(Keys.SPACE).perform()
-																	time.sleep(3) # Pausa tras desmarcar el mes
-																	
-																	# --- PASO 7: Aplicar nuevamente ---
-																	btn_aplicar_final = wait.until(
-																		EC.element_to_be_clickable((By.XPATH, '//*[@id="actions-toolbar"]/div[4]/div[3]/button'))
-																	)
-																	btn_aplicar_final.click()
-																	
-																	# 🔒 Espera FINAL
-																	wait.until(EC.invisibility_of_element(btn_aplicar_final))
-																	time.sleep(4) # Pausa final de seguridad
-
-																	LOG.info("Proceso completado en segunda URL: Mes anterior (%s) seleccionado.", mes_anterior)
-
-																	# Define el selector del grid para la segunda URL
-																	grid_sel2 = '//*[@id="grid"]/div[17]'
-																	LOG.info("Esperando grid en segunda URL: %s", grid_sel2)
-																	
-																	# Espera SOLO UNA VEZ a que el grid esté visible en segunda URL
-																	WebDriverWait(driver, 30).until(
-																		EC.visibility_of_element_located((By.XPATH, grid_sel2))
-																	)
-																	LOG.info("Grid visible en segunda URL: %s", grid_sel2)
-																	
-																	# Comprueba si el grid está listo (usa SIEMPRE grid_sel2)
-																	if not grid_listo(driver, grid_sel2, selector_type='XPATH', timeout=20):
-																		LOG.warning("Grid no listo en segunda URL, se omite hover/export: %s", grid_sel2)
-																		return
-																	
-																	# Trae el navegador al frente (opcional)
-																	try:
-																		bring_browser_to_front(driver)
-																	except Exception:
-																		LOG.debug('bring_browser_to_front falló antes del hover en segunda URL', exc_info=True)
-																	
-																	# Hover sobre el grid en segunda URL
-																	if hover_on_xpath(driver, grid_sel2, timeout=5.0):
-																		LOG.info("hover_on_xpath: hover realizado correctamente en segunda URL: %s", grid_sel2)
-																		try:
-																			time.sleep(6)
-																		except Exception:
-																			pass
-
-																		try:
-																			# Después del hover, localizar el botón "Más" y clickarlo
-																			btn_sel2 = (
-																				'#grid > div:nth-child(17) > '
-																				'div.object-and-panel-wrapper > div > '
-																				'div.ng-isolate-scope.detached-object-nav-wrapper > div '
-																				'button[tid="nav-menu-move"]'
-																			)
-																			if click_button_by_selector(driver, btn_sel2, timeout=5.0):
-																				LOG.info("Botón 'Más' clicado correctamente en segunda URL: %s", btn_sel2)
-																				try:
-																					time.sleep(1)
-																				except Exception:
-																					pass
-																				try:
-																					# Secuencia de menú: 'Descargar como...' -> 'Datos' -> 'Exportar'
-																					export_group_sel2 = '#export-group'
-																					export_sel2 = '#export'
-
-																					if click_button_by_selector(driver, export_group_sel2, timeout=5.0):
-																						LOG.info("click: export-group encontrado y clicado en segunda URL: %s", export_group_sel2)
-																						try:
-																							time.sleep(0.6)
-																						except Exception:
-																							pass
-																						if click_button_by_selector(driver, export_sel2, timeout=5.0):
-																							LOG.info("click: export encontrado y clicado en segunda URL: %s", export_sel2)
-																							try:
-																								time.sleep(0.6)
-																							except Exception:
-																								pass
-
-																							# En esta segunda URL no existe el botón 'table-export'.
-																							# Directamente intentar clicar el enlace de descarga (a.export-url)
-																							try:
-																								download_start_ts2 = time.time()
-																								# Primero intentar el anchor conocido
-																								if click_export_url(driver, selector='a.export-url', timeout=6.0):
-																									LOG.info("click_export_url: enlace de descarga clicado correctamente en segunda URL")
-																									clicked_download = True
-																								else:
-																									# Fallback: buscar anchors con .xlsx o texto 'export'/'exportar'
-																									if click_export_link_with_fallback(driver, timeout=6.0):
-																										LOG.info("click_export_link_with_fallback: enlace de descarga clicado en segunda URL")
-																										clicked_download = True
-																									else:
-																										clicked_download = False
-
-																								if clicked_download:
-																									try:
-																										time.sleep(8)
-																									except Exception:
-																										pass
-
-																									downloads_dir2 = os.path.join(Path.home(), 'Downloads')
-																									found2 = find_latest_downloaded_file(downloads_dir2, pattern='*.xlsx', since_ts=download_start_ts2, timeout=30.0)
-																									if found2:
-																										LOG.info('Archivo descargado detectado en segunda URL: %s', found2)
-																										extracted2 = extract_excel_contents(found2)
-																										if extracted2 is not None:
-																											out_file2 = Path('exported_data_2.json')
-																											try:
-																												with out_file2.open('w', encoding='utf-8') as fh:
-																													json.dump(extracted2, fh, ensure_ascii=False, indent=2)
-																												LOG.info('Contenido del Excel guardado en %s', str(out_file2))
-																											except Exception:
-																												LOG.exception('No se pudo escribir %s', str(out_file2))
-
-																											# Subida automática con target tab por defecto en 'Sheet1'
-																											try:
-																												default_sa = r'C:\Users\jperdomolc\Pictures\Qlik\estados-475119-24642bda896a.json'
-																												default_sid = '1LTiGfBQd_Qd6zhmCGEHpX0Jgaa3KuMkuuE8oHwQ6x3M'
-																												sa = _os.environ.get('GOOGLE_SERVICE_ACCOUNT_JSON', default_sa)
-																												sid = _os.environ.get('GOOGLE_SHEET_ID', default_sid)
-																												target = _os.environ.get('GOOGLE_SHEET_TAB', 'Sheet1')
-
-																												if sa and sid:
-																													LOG.info('Intentando subida automática a Google Sheets (target tab=%s)...', target)
-																													ok = upload_to_google_sheets(extracted2, sid, sa, clear=True, target_sheet=target)
-																													if ok:
-																														LOG.info('Subida automática a Google Sheets (Sheet1) finalizada con éxito')
-																													else:
-																														LOG.info('Subida automática a Google Sheets (Sheet1) falló')
-																												else:
-																													LOG.debug('No hay credenciales/ID disponibles para Google Sheets (segunda URL)')
-																											except Exception:
-																												LOG.debug('Fallo al intentar subida automática a Google Sheets en segunda URL', exc_info=True)
-																											try:
-																												p2 = Path(found2)
-																												if p2.exists():
-																													p2.unlink()
-																													LOG.info('Archivo descargado eliminado en segunda URL: %s', str(p2))
-																											except Exception:
-																												LOG.debug('No se pudo eliminar el archivo descargado en segunda URL %s', found2, exc_info=True)
-																										else:
-																											LOG.info('No se pudo extraer contenido del Excel en segunda URL: %s', found2)
-																									else:
-																										LOG.info('No se detectó archivo .xlsx en %s dentro del timeout en segunda URL', downloads_dir2)
-																							except Exception:
-																								LOG.debug('Error al intentar click_export_url o procesar descarga en segunda URL', exc_info=True)
-																						else:
-																							LOG.info('No se pudo clicar el item export (%s) en segunda URL', export_sel2)
-																					else:
-																						LOG.info('No se pudo clicar el grupo export-group (%s) en segunda URL', export_group_sel2)
-																				except Exception:
-																					LOG.debug('Error al intentar clicar el botón Más en segunda URL', exc_info=True)
-																			else:
-																				LOG.info("No se pudo clicar el botón 'Más' (%s) en segunda URL", btn_sel2)
-																		except Exception:
-																			LOG.debug('Error al intentar clicar el botón Más en segunda URL', exc_info=True)
-																	else:
-																		LOG.info("hover_on_xpath: no se pudo hacer hover en %s en segunda URL (continuando)", grid_sel2)
-																except Exception:
-																	LOG.debug('Error en el flujo de cambio de mes en segunda URL', exc_info=True)
-															except Exception:
-																LOG.debug('Error navegando a la segunda URL', exc_info=True)
-														else:
-															LOG.info('No se pudo extraer contenido del Excel: %s', found)
-													else:
-														LOG.info('No se detectó archivo .xlsx en %s dentro del timeout', downloads_dir)
-												else:
-													LOG.info("click_export_url: no se encontró el enlace de descarga (a.export-url)")
-											except Exception:
-												LOG.debug('Error al intentar click_export_url o procesar descarga', exc_info=True)
-										else:
-											LOG.info("No se pudo clicar el botón Exportar (%s)", export_button)
-									else:
-										LOG.info("No se pudo clicar el item export (%s)", export_sel)
-								else:
-									LOG.info("No se pudo clicar el grupo export-group (%s)", export_group_sel)
-							except Exception:
-								LOG.debug('Error al intentar clicar el botón Más', exc_info=True)
-						else:
-							LOG.info("No se pudo clicar el botón 'Más' (%s)", btn_sel)
-					except Exception:
-						LOG.debug('Error al intentar clicar el botón Más', exc_info=True)
-				else:
-					LOG.info("hover_on_selector: no se pudo hacer hover en %s (continuando)", grid_sel)
-			except Exception:
-				LOG.debug('Error en el flujo post-cambio de mes', exc_info=True)
-		except Exception:
-			pass
-	finally:
-		driver.quit()
+					pass
 
+	LOG.info('Ejecutando %d jobs con concurrencia %d', len(jobs), concurrencia)
+	with ThreadPoolExecutor(max_workers=concurrencia, thread_name_prefix='qlik-export') as pool:
+		list(pool.map(_worker, range(concurrencia)))
+
+	# jobs que ningún worker llegó a ejecutar cuentan como fallidos
+	ordenados = {job.name: resultados.get(job.name, False) for job in jobs}
+	_log_resumen_jobs(ordenados)
+	return ordenados
+
+
+def _ejecutar_jobs_run(driver: webdriver.Chrome, jobs: list[ExportJob], concurrencia: int, downloads_root: str, subidas: ColaSubidas | None = None) -> dict[str, bool]:
+	if concurrencia > 1:
+		return ejecutar_jobs_en_paralelo(driver, jobs, concurrencia, downloads_root, subidas=subidas)
+	return ejecutar_jobs(driver, jobs, downloads_dir=os.path.join(downloads_root, 'worker_0'), subidas=subidas)
 
-def main() -> None:
-	"""Loop runner: ejecuta `run_once()` inmediatamente y luego espera hasta las 06:00 local siguiente para repetir.
 
-	Ctrl+C detiene el loop.
+DEFAULT_INFORMES_DIR = Path.home() / '.qlik_informes'
+
+
+def _ruta_informes() -> Path | None:
+	valor = _os.environ.get('QLIK_INFORMES_DIR')
+	if valor is None:
+		return DEFAULT_INFORMES_DIR
+	if valor.strip().lower() in ('', '0', 'no', 'false'):
+		return None
+	return Path(valor).expanduser()
+
+
+def emitir_informe(traza: trazas.Traza) -> Path | None:
+	"""Registrar la tabla de tiempos de la ejecución y guardar su informe JSON.
+
+	El JSON va a `QLIK_INFORMES_DIR` (por defecto ~/.qlik_informes; `0` lo
+	desactiva), un fichero por ejecución para poder comparar días.
 	"""
+	LOG.info('Tiempos de la ejecución (%.1f s):\n%s', time.time() - traza.inicio, traza.tabla())
+	directorio = _ruta_informes()
+	if directorio is None:
+		return None
 	try:
-		while True:
+		path = traza.guardar(directorio)
+		LOG.info('Informe de la ejecución guardado en %s', path)
+		return path
+	except Exception:
+		LOG.exception('No se pudo guardar el informe de la ejecución en %s', directorio)
+		return None
+
+
+def autenticar(driver: webdriver.Chrome, url: str) -> bool:
+	"""Dejar `driver` con sesión en `url`: con las cookies guardadas o con login completo."""
+	with trazas.tramo('restaurar_sesion') as t:
+		t.ok = restaurar_sesion(driver, url)
+	if t.ok:
+		return True
+	if en_pagina_de_login(driver):
+		# la sesión guardada expiró y restaurar_sesion ya dejó cargado el login
+		LOG.info('autenticar: se reutiliza la página de login ya cargada')
+	else:
+		LOG.info("Opening %s", url)
+		driver.get(url)
+		esperar_condicion(lambda: qlik_pagina_lista(driver), 'carga_inicial')
+
+	# Tras el submit la aplicación muestra una pantalla de carga que puede
+	# tardar: esperar a que la hoja esté montada y el motor inactivo.
+	if not iniciar_sesion(driver, url, QLIK_USUARIO, QLIK_CLAVE):
+		return False
+	esperar_motor_inactivo(driver, 'post_login')
+	if sesion_valida(driver):
+		guardar_sesion(driver)
+	return True
+
+
+# Ping de sesión: una petición con las cookies del navegador a la propia hoja
+# renueva la sesión del proxy de Qlik; si caducó, la respuesta acaba en el login.
+_JS_PING_SESION = """
+var listo = arguments[arguments.length - 1];
+fetch(arguments[0], {credentials: 'include', cache: 'no-store'}).then(
+  function (r) { listo({estado: r.status, url: r.url}); },
+  function (e) { listo({estado: 0, url: String(e)}); }
+);
+"""
+
+
+class NavegadorEnEspera:
+	"""Navegador autenticado que `main()` mantiene listo entre ejecuciones.
+
+	Unos minutos (`antelacion`) antes de cada franja se arranca y se autentica;
+	hasta la ejecución se hace un ping de sesión cada `intervalo_ping` segundos y
+	se recicla si su memoria pasa de `limite_mb`. `run_once` lo recibe con
+	`tomar()` (en frío si no estaba listo) y lo devuelve con `devolver()` sin
+	cerrarlo; lejos de la próxima franja se cierra para no ocupar memoria.
+	"""
+
+	def __init__(self, url: str, antelacion: float = 300.0, intervalo_ping: float = 120.0, limite_mb: float = 1500.0):
+		self.url = url
+		self.antelacion = antelacion
+		self.intervalo_ping = intervalo_ping
+		self.limite_mb = limite_mb
+		# carpeta de descargas de todas las ejecuciones (el navegador descarga en worker_0)
+		self.descargas = tempfile.mkdtemp(prefix='qlik_descargas_')
+		self.driver: webdriver.Chrome | None = None
+		self._ultimo_ping = 0.0
+
+	@classmethod
+	def desde_entorno(cls, url: str) -> NavegadorEnEspera | None:
+		"""Según QLIK_EN_ESPERA (0 lo desactiva) y QLIK_EN_ESPERA_ANTELACION / _PING / _MEMORIA_MB."""
+		if _os.environ.get('QLIK_EN_ESPERA', '1').strip().lower() in ('0', 'no', 'false'):
+			return None
+		valores = {}
+		for arg, var, defecto in (('antelacion', 'ANTELACION', 300.0), ('intervalo_ping', 'PING', 120.0), ('limite_mb', 'MEMORIA_MB', 1500.0)):
+			try:
+				valores[arg] = float(_os.environ.get(f'QLIK_EN_ESPERA_{var}', defecto))
+			except ValueError:
+				valores[arg] = defecto
+		return cls(url, **valores)
+
+	def _vivo(self) -> bool:
+		try:
+			self.driver.current_url
+			return True
+		except Exception:
+			return False
+
+	def preparar(self) -> bool:
+		"""Arrancar y autenticar el navegador si no hay uno vivo. True si queda listo."""
+		if self.driver is not None and self._vivo():
+			return True
+		self.liberar()
+		inicio = time.monotonic()
+		driver = setup_driver(download_dir=os.path.join(self.descargas, 'worker_0'))
+		try:
+			ok = autenticar(driver, self.url)
+		except Exception:
+			LOG.exception('NavegadorEnEspera: fallo autenticando')
+			ok = False
+		if not ok:
 			try:
-				run_once()
+				driver.quit()
 			except Exception:
-				LOG.exception('run_once: excepción no controlada durante la ejecución')
-
-			# calcular próxima ejecución a las 06:00, 06:30 o 12:30 local (12:30 solo fines de semana)
-			now = datetime.now()
-			next_run_6_exact = now.replace(hour=6, minute=0, second=0, microsecond=0)
-			next_run_6 = now.replace(hour=6, minute=30, second=0, microsecond=0)
-			next_run_12 = now.replace(hour=12, minute=30, second=0, microsecond=0)
-			
-			# encontrar la próxima hora de ejecución
-			candidates = [next_run_6_exact, next_run_6]
-			if now.weekday() in [5, 6]:  # 5=Saturday, 6=Sunday
-				candidates.append(next_run_12)
-			future_candidates = [t for t in candidates if t > now]
-			if future_candidates:
-				next_run = min(future_candidates)
-			else:
-				# todas pasaron hoy, tomar la primera de mañana
-				next_run = min(candidates) + timedelta(days=1)
-			
-			wait_seconds = (next_run - now).total_seconds()
-			LOG.info('Siguiente ejecución programada para %s (en %d segundos)', next_run.isoformat(), int(wait_seconds))
+				pass
+			return False
+		self.driver = driver
+		self._ultimo_ping = time.monotonic()
+		LOG.info('NavegadorEnEspera: navegador autenticado y en espera (%.1f s)', time.monotonic() - inicio)
+		return True
+
+	def memoria_mb(self) -> float | None:
+		"""Memoria del navegador: RSS de chromedriver y sus Chrome con `psutil`; si no, heap JS de la página."""
+		if self.driver is None:
+			return None
+		try:
+			import psutil
+			raiz = psutil.Process(self.driver.service.process.pid)
+			return sum(p.memory_info().rss for p in [raiz] + raiz.children(recursive=True)) / 2**20
+		except ImportError:
+			pass
+		except Exception:
+			LOG.debug('NavegadorEnEspera: no se pudo medir la memoria con psutil', exc_info=True)
+		try:
+			self.driver.execute_cdp_cmd('Performance.enable', {})
+			metricas = self.driver.execute_cdp_cmd('Performance.getMetrics', {}).get('metrics', [])
+			return next((m['value'] for m in metricas if m['name'] == 'JSHeapTotalSize'), 0) / 2**20
+		except Exception:
+			return None
+
+	def _ping(self) -> bool:
+		try:
+			_asegurar_timeout_script(self.driver, 30)
+			r = self.driver.execute_async_script(_JS_PING_SESION, self.url) or {}
+		except Exception:
+			return False
+		url_ok = any(k in str(r.get('url', '')).lower() for k in ('hub', 'sense'))
+		return 200 <= int(r.get('estado') or 0) < 400 and url_ok and sesion_valida(self.driver)
+
+	def _excede_memoria(self) -> bool:
+		mb = self.memoria_mb()
+		if mb is not None and mb > self.limite_mb:
+			LOG.info('NavegadorEnEspera: %.0f MB de memoria (límite %.0f); se recicla el navegador', mb, self.limite_mb)
+			return True
+		return False
+
+	def mantener(self) -> bool:
+		"""Ping de sesión y control de memoria (como mucho uno cada `intervalo_ping` s)."""
+		if self.driver is None:
+			return self.preparar()
+		if time.monotonic() - self._ultimo_ping < self.intervalo_ping:
+			return True
+		self._ultimo_ping = time.monotonic()
+		if not self._ping():
+			LOG.info('NavegadorEnEspera: la sesión no responde; se vuelve a preparar')
+		elif not self._excede_memoria():
+			return True
+		self.liberar()
+		return self.preparar()
+
+	def en_espera(self, proxima: datetime, ahora: datetime) -> None:
+		"""Gancho del planificador: preparar/mantener cerca de `proxima`, cerrar lejos de ella."""
+		if (proxima - ahora).total_seconds() > self.antelacion:
+			if self.driver is not None:
+				LOG.info('NavegadorEnEspera: se cierra hasta %s', (proxima - timedelta(seconds=self.antelacion)).isoformat(timespec='minutes'))
+				self.liberar()
+			return
+		self.mantener()
+
+	def tomar(self) -> webdriver.Chrome | None:
+		"""Driver autenticado para una ejecución (lo prepara en frío si hace falta)."""
+		caliente = self.driver is not None and self._vivo()
+		trazas.anotar_rama('caliente' if caliente else 'frio')
+		if not caliente and not self.preparar():
+			return None
+		return self.driver
+
+	def devolver(self) -> None:
+		"""Fin de una ejecución: el navegador se queda abierto salvo que pase del límite de memoria."""
+		if self.driver is None:
+			return
+		if not self._vivo() or self._excede_memoria():
+			self.liberar()
+		else:
+			self._ultimo_ping = time.monotonic()
 
+	def liberar(self) -> None:
+		if self.driver is not None:
 			try:
-				# dormir hasta la próxima ejecución (permitir interrumpir con Ctrl+C)
-				time.sleep(wait_seconds)
-			except KeyboardInterrupt:
-				LOG.info('Interrupción recibida durante la espera; terminando.')
-				break
+				self.driver.quit()
+			except Exception:
+				LOG.debug('NavegadorEnEspera: fallo cerrando el navegador', exc_info=True)
+			_DRIVERS_ACTIVOS.discard(self.driver)
+		self.driver = None
+
+	def cerrar(self) -> None:
+		self.liberar()
+		shutil.rmtree(self.descargas, ignore_errors=True)
+
+
+def run_once(jobs: list[ExportJob] | None = None, navegador: NavegadorEnEspera | None = None) -> trazas.Traza | None:
+	"""Ejecutar una vez todos los `jobs` (por defecto `cargar_jobs()`).
+
+	Con `navegador` se usa su driver ya autenticado y no se cierra al terminar.
+	Si no se consigue sesión no se ejecuta ningún job (todos cuentan como
+	fallidos). Devuelve la traza de tiempos de la ejecución (ver `emitir_informe`).
+	"""
+	logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+	LOG.info('Starting minimal Qlik autofill (single run)')
+	if jobs is None:
+		jobs = cargar_jobs()
+	if not jobs:
+		LOG.error('run_once: no hay jobs de exportación configurados')
+		return
+	url = jobs[0].url
+	# Cada navegador descarga en su propia carpeta temporal (worker_<n>) de esta ejecución
+	try:
+		concurrencia = int(_os.environ.get('QLIK_CONCURRENCIA', '1'))
+	except ValueError:
+		concurrencia = 1
+	downloads_root = navegador.descargas if navegador is not None else tempfile.mkdtemp(prefix='qlik_descargas_')
+	# Las subidas a Google Sheets van en segundo plano salvo QLIK_SUBIDA_ASINCRONA=0
+	asincrona = _os.environ.get('QLIK_SUBIDA_ASINCRONA', '1').strip().lower() not in ('0', 'no', 'false')
+	traza = trazas.iniciar_traza()
+	subidas = ColaSubidas() if asincrona else None
+	driver = None
+	try:
+		if navegador is not None:
+			with trazas.tramo('navegador_en_espera') as t:
+				driver = navegador.tomar()
+				t.ok = driver is not None
+		if driver is None:
+			driver = setup_driver(download_dir=os.path.join(downloads_root, 'worker_0'))
+			with trazas.tramo('autenticar') as t:
+				t.ok = autenticar(driver, url)
+			if not t.ok:
+				# sin sesión ningún job puede exportar: se dan todos por fallidos
+				LOG.error('run_once: no se pudo iniciar sesión en %s; no se ejecuta ningún job', url)
+				_log_resumen_jobs({job.name: False for job in jobs})
+				return traza
+
+		with trazas.tramo('jobs'):
+			resultados = _ejecutar_jobs_run(driver, jobs, concurrencia, downloads_root, subidas)
+		if subidas is not None:
+			# un job cuya subida en segundo plano falló no terminó bien
+			for estado in subidas.cerrar():
+				if not (estado.ok or estado.omitida):
+					resultados[estado.job] = False
+			subidas = None
+			_log_resumen_jobs(resultados)
+		return traza
+	finally:
+		if navegador is not None and driver is not None and driver is navegador.driver:
+			navegador.devolver()
+		elif driver is not None:
+			driver.quit()
+		if navegador is None:
+			shutil.rmtree(downloads_root, ignore_errors=True)
+		if subidas is not None:
+			subidas.cerrar()
+		trazas.terminar_traza()
+		emitir_informe(traza)
+
+
+def cancelar_ejecucion() -> int:
+	"""Cerrar todos los navegadores abiertos para que la ejecución en curso termine.
+
+	Las llamadas pendientes de WebDriver fallan y `run_once` sale por su `finally`.
+	Devuelve cuántos navegadores se cerraron.
+	"""
+	cerrados = 0
+	for driver in list(_DRIVERS_ACTIVOS):
+		try:
+			driver.quit()
+			cerrados += 1
+		except Exception:
+			LOG.debug('cancelar_ejecucion: fallo cerrando un navegador', exc_info=True)
+		_DRIVERS_ACTIVOS.discard(driver)
+	return cerrados
+
+
+# 06:00 y 06:30 todos los días, y 12:30 los fines de semana
+HORARIO_POR_DEFECTO = ('0 6 * * *', '30 6 * * *', '30 12 * * 0,6')
+# Estado del planificador (última franja atendida por job). Se puede cambiar con
+# QLIK_PLANIFICADOR_ESTADO (0 para no guardarlo).
+DEFAULT_PLANIFICADOR_ESTADO = Path.home() / '.qlik_planificador.json'
+
+
+def _ruta_estado_planificador() -> Path | None:
+	valor = _os.environ.get('QLIK_PLANIFICADOR_ESTADO')
+	if valor is None:
+		return DEFAULT_PLANIFICADOR_ESTADO
+	if valor.strip().lower() in ('', '0', 'no', 'false'):
+		return None
+	return Path(valor).expanduser()
+
+
+def tareas_de_jobs(jobs: list[ExportJob]) -> list[planificador.Tarea]:
+	"""Una tarea del planificador por job, con su cadencia (`schedule`) y límites."""
+	return [
+		planificador.Tarea(
+			j.name, list(j.schedule or HORARIO_POR_DEFECTO), timeout=j.schedule_timeout,
+			plazo=j.schedule_deadline, recuperar=j.catch_up, prioridad=j.priority,
+		)
+		for j in jobs
+	]
+
+
+def ejecutar_por_nombre(jobs: list[ExportJob], nombres: list[str], navegador: NavegadorEnEspera | None = None) -> dict[str, bool]:
+	"""`run_once` con los jobs `nombres` (en ese orden); resultado por job según la traza."""
+	por_nombre = {j.name: j for j in jobs}
+	traza = run_once([por_nombre[n] for n in nombres], navegador)
+	if traza is None:
+		return {n: False for n in nombres}
+	resultados = {n: False for n in nombres}
+	for t in traza.tramos:
+		if t.nombre == 'job' and t.job in resultados:
+			resultados[t.job] = t.ok
+	return resultados
+
+
+def main() -> None:
+	"""Demonio: ejecuta los jobs una vez al arrancar y después en las franjas de cada uno.
+
+	Cada job sigue su `schedule` (por defecto `HORARIO_POR_DEFECTO`); los que
+	vencen a la vez comparten ejecución y nunca hay dos a la vez. Antes de cada
+	franja se deja un navegador autenticado en espera (`NavegadorEnEspera`;
+	QLIK_EN_ESPERA=0 lo desactiva). Con QLIK_EJECUTAR_AL_INICIAR=0 no se ejecuta
+	nada al arrancar. Ctrl+C detiene el loop.
+	"""
+	logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+	jobs = cargar_jobs()
+	if not jobs:
+		LOG.error('main: no hay jobs de exportación configurados')
+		return
+	inmediato = _os.environ.get('QLIK_EJECUTAR_AL_INICIAR', '1').strip().lower() not in ('0', 'no', 'false')
+	navegador = NavegadorEnEspera.desde_entorno(jobs[0].url)
+	plan = planificador.Planificador(
+		tareas_de_jobs(jobs), lambda nombres: ejecutar_por_nombre(jobs, nombres, navegador),
+		estado=_ruta_estado_planificador(), cancelar=cancelar_ejecucion,
+		en_espera=navegador.en_espera if navegador is not None else None,
+	)
+	try:
+		plan.bucle(inmediato=inmediato)
 	except KeyboardInterrupt:
 		LOG.info('Interrupción recibida; saliendo')
+		plan.detener()
+	finally:
+		if navegador is not None:
+			navegador.cerrar()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,121 @@
+"""Hoja y spreadsheet simulados para los tests de escritura en Google Sheets.
+
+`HojaSimulada` aplica los cuerpos values:batchUpdate / spreadsheets:batchUpdate
+que compila `qliktabs` y hace también de worksheet de gspread; `LibroFalso`
+hace de spreadsheet y cuenta las llamadas a la API.
+"""
+from __future__ import annotations
+
+import re
+
+import qliktabs
+
+_RE_RANGO = re.compile(r"^'(?P<titulo>.+)'!(?P<col>[A-Z]+)(?P<fila>\d+)$")
+
+
+def _col(letras: str) -> int:
+	n = 0
+	for letra in letras:
+		n = n * 26 + ord(letra) - ord('A') + 1
+	return n - 1
+
+
+class HojaSimulada:
+	"""Celdas {(fila, col): valor} en base 0, con la semántica de la API de Sheets que usamos."""
+
+	def __init__(self, filas: int = 20, columnas: int = 10, titulo: str = 'Hoja', sheet_id: int = 7):
+		self.filas, self.columnas = filas, columnas
+		self.title, self.id = titulo, sheet_id
+		self.celdas: dict = {}
+		self.formatos: dict = {}
+
+	@property
+	def row_count(self) -> int:
+		return self.filas
+
+	def row_values(self, fila: int) -> list:
+		valores = [self.celdas.get((fila - 1, c), '') for c in range(self.columnas)]
+		while valores and valores[-1] == '':
+			valores.pop()
+		return valores
+
+	def aplicar(self, valores: dict | None, lote: dict | None) -> None:
+		# mismo orden que `_subir_hoja`: primero values:batchUpdate y luego batchUpdate
+		for bloque in (valores or {}).get('data', []):
+			self.escribir_rango(bloque)
+		for peticion in (lote or {}).get('requests', []):
+			self.aplicar_peticion(peticion)
+
+	def escribir_rango(self, bloque: dict) -> None:
+		m = _RE_RANGO.match(bloque['range'])
+		assert m and m['titulo'] == self.title
+		f0, c0 = int(m['fila']) - 1, _col(m['col'])
+		for i, fila in enumerate(bloque['values']):
+			for j, v in enumerate(fila):
+				if v is not None:
+					self.celdas[(f0 + i, c0 + j)] = v
+
+	def aplicar_peticion(self, peticion: dict) -> None:
+		if 'updateCells' in peticion:
+			assert peticion['updateCells']['fields'] == 'userEnteredValue'
+			for celda in self._rango(peticion['updateCells']['range']):
+				self.celdas.pop(celda, None)
+		else:
+			patron = peticion['repeatCell']['cell']['userEnteredFormat']['numberFormat']['pattern']
+			for celda in self._rango(peticion['repeatCell']['range']):
+				self.formatos[celda] = patron
+
+	def _rango(self, rango: dict):
+		assert rango['sheetId'] == self.id
+		for f in range(rango['startRowIndex'], min(rango['endRowIndex'], self.filas)):
+			for c in range(rango.get('startColumnIndex', 0), min(rango.get('endColumnIndex', self.columnas), self.columnas)):
+				yield f, c
+
+
+class LibroFalso:
+	"""Spreadsheet de gspread con las llamadas que usa `qliktabs`, sobre `HojaSimulada`s."""
+
+	def __init__(self, *hojas: HojaSimulada, libro_id: str = 'libro'):
+		self.id = libro_id
+		self.hojas = {h.title: h for h in hojas}
+		self.escrituras: list[dict] = []
+		self.lotes: list[dict] = []
+		self.metadata = 0
+		# próximas llamadas values:batchUpdate que fallan como un error de la API
+		self.fallar_escrituras = 0
+
+	def worksheets(self) -> list[HojaSimulada]:
+		self.metadata += 1
+		return list(self.hojas.values())
+
+	def worksheet(self, titulo: str) -> HojaSimulada:
+		self.metadata += 1
+		return self.hojas[titulo]
+
+	def add_worksheet(self, title: str, rows: int, cols: int) -> HojaSimulada:
+		hoja = HojaSimulada(rows, cols, title, sheet_id=100 + len(self.hojas))
+		self.hojas[title] = hoja
+		return hoja
+
+	def values_batch_update(self, cuerpo: dict) -> None:
+		if self.fallar_escrituras:
+			self.fallar_escrituras -= 1
+			raise RuntimeError('APIError: [503] The service is currently unavailable.')
+		self.escrituras.append(cuerpo)
+		for bloque in cuerpo['data']:
+			self.hojas[_RE_RANGO.match(bloque['range'])['titulo']].escribir_rango(bloque)
+
+	def batch_update(self, cuerpo: dict) -> None:
+		self.lotes.append(cuerpo)
+		por_id = {h.id: h for h in self.hojas.values()}
+		for peticion in cuerpo['requests']:
+			rango = next(iter(peticion.values()))['range']
+			por_id[rango['sheetId']].aplicar_peticion(peticion)
+
+
+def escribir(hoja: HojaSimulada, tabla: list[list], **kw) -> None:
+	hoja.aplicar(*qliktabs.compilar_escritura_sheets(hoja.title, hoja.id, hoja.filas, tabla, **kw))
+
+
+def tabla(filas: int, ancho: int = 3, base: int = 0) -> list[list]:
+	return [[f'r{i}c{j}' if j == 0 else base + i * 10 + j for j in range(ancho)] for i in range(filas)]
@@ -0,0 +1,55 @@
+"""autenticar: con la sesión guardada caducada se reutiliza el login ya cargado."""
+from __future__ import annotations
+
+import pytest
+
+import qliktabs
+
+
+class DriverFalso:
+	"""Driver que muestra el formulario de login si `login` es True."""
+
+	def __init__(self, login: bool):
+		self.login = login
+		self.visitas: list[str] = []
+		self.switch_to = self
+
+	def default_content(self):
+		pass
+
+	def get(self, url: str):
+		self.visitas.append(url)
+		self.login = True
+
+	def find_elements(self, *args):
+		return []
+
+	def execute_script(self, js, *args):
+		if js == qliktabs._JS_CAMPOS_LOGIN:
+			return ['usuario', 'clave'] if self.login else None
+		return True
+
+
+@pytest.fixture
+def login(monkeypatch):
+	llamadas = []
+	monkeypatch.setattr(qliktabs, 'restaurar_sesion', lambda driver, url: False)
+	monkeypatch.setattr(qliktabs, 'iniciar_sesion', lambda driver, url, u, c: llamadas.append(url) or True)
+	monkeypatch.setattr(qliktabs, 'esperar_motor_inactivo', lambda driver, nombre: True)
+	monkeypatch.setattr(qliktabs, 'sesion_valida', lambda driver: False)
+	return llamadas
+
+
+def test_sesion_caducada_reutiliza_la_pagina_de_login(login):
+	# restaurar_sesion navegó a la URL y encontró el formulario de login
+	driver = DriverFalso(login=True)
+	assert qliktabs.autenticar(driver, 'https://qlik/sense/app')
+	assert driver.visitas == []
+	assert login == ['https://qlik/sense/app']
+
+
+def test_sin_sesion_guardada_navega(login):
+	driver = DriverFalso(login=False)
+	assert qliktabs.autenticar(driver, 'https://qlik/sense/app')
+	assert driver.visitas == ['https://qlik/sense/app']
+	assert login == ['https://qlik/sense/app']
@@ -0,0 +1,94 @@
+"""Cliente, spreadsheet y metadata de Google Sheets reutilizados entre subidas."""
+from __future__ import annotations
+
+import pytest
+
+import qliktabs
+from sheets_simulados import HojaSimulada, LibroFalso
+
+gspread = pytest.importorskip('gspread')
+service_account = pytest.importorskip('google.oauth2.service_account')
+
+
+class ClienteFalso:
+	def __init__(self, contador: dict):
+		self.contador = contador
+
+	def open_by_key(self, clave: str) -> LibroFalso:
+		self.contador['open_by_key'] += 1
+		libro = LibroFalso(HojaSimulada(filas=40, titulo='Sheet2'), libro_id=clave)
+		libro.hojas['Sheet2'].celdas = {(0, 0): 'fecha', (0, 1): 'Zona', (0, 2): 'Ventas'}
+		self.contador['libros'].append(libro)
+		return libro
+
+
+@pytest.fixture
+def contador(monkeypatch):
+	contador = {'authorize': 0, 'open_by_key': 0, 'libros': []}
+
+	def _authorize(creds):
+		contador['authorize'] += 1
+		return ClienteFalso(contador)
+	monkeypatch.setattr(gspread, 'authorize', _authorize)
+	monkeypatch.setattr(service_account.Credentials, 'from_service_account_file', classmethod(lambda cls, *a, **kw: object()))
+	monkeypatch.setenv('QLIK_SHEETS_SNAPSHOT', '0')
+	qliktabs.invalidar_cache_sheets()
+	yield contador
+	qliktabs.invalidar_cache_sheets()
+
+
+_DATOS = {'Sheet1': [{'Zona': 'ZONA X', 'Ventas': '1'}, {'Zona': 'ZONA Y', 'Ventas': '2'}]}
+
+
+def _subir() -> bool:
+	return qliktabs.upload_to_google_sheets(_DATOS, 'libro-1', 'cuenta.json', target_sheet='Sheet2')
+
+
+def _metadata(contador: dict) -> int:
+	return sum(libro.metadata for libro in contador['libros'])
+
+
+def test_dos_subidas_reutilizan_cliente_spreadsheet_y_metadata(contador):
+	assert _subir() and _subir()
+	assert contador['authorize'] == 1
+	assert contador['open_by_key'] == 1
+	assert _metadata(contador) == 1
+	[libro] = contador['libros']
+	assert len(libro.escrituras) == 2
+
+
+def test_metadata_caducada_se_vuelve_a_pedir(contador, monkeypatch):
+	monkeypatch.setattr(qliktabs, 'SHEETS_METADATA_TTL', -1.0)
+	assert _subir() and _subir()
+	assert (contador['authorize'], contador['open_by_key'], _metadata(contador)) == (1, 1, 2)
+
+
+def test_error_de_la_api_fuerza_reabrir(contador):
+	assert _subir()
+	[libro] = contador['libros']
+	libro.fallar_escrituras = 1
+	assert not _subir()
+	assert contador['open_by_key'] == 1
+	# tras el error se reabre el spreadsheet y se relee la metadata, con el mismo cliente
+	assert _subir()
+	assert (contador['authorize'], contador['open_by_key'], _metadata(contador)) == (1, 2, 2)
+	assert len(contador['libros'][-1].escrituras) == 1
+
+
+def test_invalidar_todo_reabre(contador):
+	assert _subir()
+	qliktabs.invalidar_cache_sheets()
+	assert _subir()
+	assert (contador['authorize'], contador['open_by_key']) == (2, 2)
+
+
+def test_open_by_key_fallido_descarta_el_cliente(contador, monkeypatch):
+	abrir = ClienteFalso.open_by_key
+
+	def _fallar(self, clave):
+		raise RuntimeError('APIError: [403] The caller does not have permission')
+	monkeypatch.setattr(ClienteFalso, 'open_by_key', _fallar)
+	assert not _subir()
+	monkeypatch.setattr(ClienteFalso, 'open_by_key', abrir)
+	assert _subir()
+	assert contador['authorize'] == 2
@@ -0,0 +1,124 @@
+"""Modo delta de la subida a Sheets: `compilar_escritura_delta` y `_subir_hoja(delta=True)`."""
+from __future__ import annotations
+
+import json
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+import qliktabs
+from sheets_simulados import HojaSimulada, LibroFalso, escribir, tabla
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+
+@pytest.mark.parametrize('kw', [
+	{},
+	{'clear': False, 'limpiar_columnas': (1,)},
+	{'columnas_vacias': (2,)},
+])
+@pytest.mark.parametrize('anterior, nueva', [
+	(tabla(5), tabla(5)),
+	(tabla(5), tabla(8)),
+	(tabla(8), tabla(3)),
+	(tabla(5), [fila if i not in (1, 2, 4) else fila[:1] + ['x', fila[2]] for i, fila in enumerate(tabla(5))]),
+	(tabla(5), tabla(5, base=1)),
+	(tabla(0), tabla(4)),
+])
+def test_delta_equivale_a_escritura_completa(anterior, nueva, kw):
+	completa, delta = HojaSimulada(), HojaSimulada()
+	for hoja in (completa, delta):
+		escribir(hoja, anterior, **kw)
+	escribir(completa, nueva, **kw)
+	delta.aplicar(*qliktabs.compilar_escritura_delta('Hoja', 7, delta.filas, nueva, anterior, **kw))
+	assert delta.celdas == completa.celdas
+
+
+def test_delta_solo_envia_lo_que_cambia():
+	anterior = tabla(6)
+	nueva = [list(fila) for fila in anterior]
+	nueva[2][1] = nueva[3][1] = 'x'
+	valores, lote = qliktabs.compilar_escritura_delta('Hoja', 7, 20, nueva, anterior)
+	assert valores['data'] == [{'range': "'Hoja'!B4", 'values': [['x'], ['x']]}]
+	assert lote is None
+	assert qliktabs.compilar_escritura_delta('Hoja', 7, 20, anterior, anterior) == (None, None)
+
+
+@pytest.mark.parametrize('clave, esperada', [
+	(['Día', 'Ventas'], 'Día'),
+	(['Zona', 'FECHA corte'], 'FECHA corte'),
+	(['Zona', 'Ventas 2025', 'Cumplimiento'], None),
+])
+def test_clave_fecha_sin_acentos_ni_mayusculas(clave, esperada):
+	assert qliktabs.clave_fecha(clave) == esperada
+
+
+def test_conservar_columnas_ejecucion():
+	anterior = [['ayer', 'a', 1], ['ayer', 'b', 2]]
+	nueva = [['hoy', 'a', 1], ['hoy', 'b', 3], ['hoy', 'c', 4]]
+	assert qliktabs.conservar_columnas_ejecucion(nueva, anterior, (0,)) == [['ayer', 'a', 1], ['hoy', 'b', 3], ['hoy', 'c', 4]]
+	assert qliktabs.conservar_columnas_ejecucion(nueva, [], (0,)) is nueva
+
+
+class _Reloj(datetime):
+	ahora = datetime(2026, 2, 1, 6, 0, 0)
+
+	@classmethod
+	def now(cls, tz=None):
+		return cls.ahora
+
+
+@pytest.fixture
+def subir(monkeypatch, tmp_path):
+	"""`_subir_hoja` en modo delta con snapshot temporal y la fecha de ejecución de `_Reloj`."""
+	monkeypatch.setenv('QLIK_SHEETS_SNAPSHOT', str(tmp_path / 'snapshot.json'))
+	monkeypatch.setattr(qliktabs, 'datetime', _Reloj)
+
+	def _subir(sh, hoja: str, rows: list[dict], ahora: datetime) -> None:
+		_Reloj.ahora = ahora
+		assert qliktabs._subir_hoja(sh, hoja, rows, clear=True, destino=True, delta=True)
+	return _subir
+
+
+def _fixture(nombre: str) -> list[dict]:
+	return json.loads((RAIZ / nombre).read_text(encoding='utf-8'))['Sheet1']
+
+
+def test_delta_ignora_la_fecha_de_ejecucion(subir):
+	zonas = _fixture('exported_data.json')
+	hoja = HojaSimulada(filas=40, columnas=20, titulo='Sheet2')
+	hoja.celdas = {(0, c): h for c, h in enumerate(['fecha'] + list(zonas[0]))}
+	sh = LibroFalso(hoja)
+
+	subir(sh, 'Sheet2', zonas, datetime(2026, 2, 1, 6, 0))
+	assert len(sh.escrituras) == 1
+	assert all(hoja.celdas[(1 + i, 0)] == '2026-02-01 06:00:00' for i in range(len(zonas)))
+
+	# misma tabla en otra ejecución: nada que escribir ni borrar
+	subir(sh, 'Sheet2', zonas, datetime(2026, 2, 2, 6, 0))
+	assert len(sh.escrituras) == 1 and len(sh.lotes) == 1
+
+	# una zona cambia: sólo esa fila, con la nueva fecha de ejecución
+	cambiadas = [dict(f) for f in zonas]
+	cambiadas[4]['Ventas 2026'] = '1'
+	subir(sh, 'Sheet2', cambiadas, datetime(2026, 2, 3, 6, 0))
+	assert len(sh.escrituras) == 2
+	[bloque] = sh.escrituras[-1]['data']
+	assert bloque['range'] == "'Sheet2'!A6"
+	assert bloque['values'][0][0] == '2026-02-03 06:00:00'
+	assert hoja.celdas[(5, 0)] == '2026-02-03 06:00:00'
+	assert hoja.celdas[(4, 0)] == '2026-02-01 06:00:00'
+
+
+def test_delta_con_columna_dia(subir):
+	dias = _fixture('exported_data_2.json')
+	hoja = HojaSimulada(filas=40, columnas=10, titulo='Sheet1')
+	hoja.celdas = {(0, 0): 'fecha', (0, 1): 'Día', (0, 2): 'Ventas'}
+	sh = LibroFalso(hoja)
+
+	subir(sh, 'Sheet1', dias, datetime(2026, 2, 1, 6, 0))
+	# 'Día' (con tilde) es la columna de fecha de cada fila
+	assert [hoja.celdas[(1 + i, 0)] for i in range(3)] == ['01_Ene_26', '02_Ene_26', '03_Ene_26']
+	subir(sh, 'Sheet1', dias, datetime(2026, 2, 2, 6, 0))
+	assert len(sh.escrituras) == 1 and len(sh.lotes) == 1
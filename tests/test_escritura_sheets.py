@@ -0,0 +1,38 @@
+"""Cuerpos de `compilar_escritura_sheets` aplicados sobre una hoja simulada."""
+from __future__ import annotations
+
+import qliktabs
+from sheets_simulados import HojaSimulada, escribir, tabla
+
+
+def test_escritura_completa_deja_solo_la_tabla():
+	hoja = HojaSimulada()
+	# la fila 1 (encabezado) sólo la toca `header_row`
+	hoja.celdas = {(f, c): 'viejo' for f in range(1, hoja.filas) for c in range(5)}
+	escribir(hoja, tabla(3), header_row=['a', 'b', 'c'])
+	esperado = {(0, j): h for j, h in enumerate('abc')}
+	esperado.update({(1 + i, j): v for i, fila in enumerate(tabla(3)) for j, v in enumerate(fila)})
+	assert hoja.celdas == esperado
+
+
+def test_escritura_sin_clear_limpia_solo_las_columnas_pedidas():
+	hoja = HojaSimulada()
+	hoja.celdas = {(f, c): 'viejo' for f in range(1, 8) for c in range(5)}
+	escribir(hoja, tabla(3), clear=False, limpiar_columnas=(1, 4))
+	# bajo la tabla: sólo la columna 1; la 4 queda fuera del ancho y se limpia entera
+	assert all(hoja.celdas.get((f, 1)) is None for f in range(4, 8))
+	assert all(hoja.celdas.get((f, 4)) is None for f in range(1, 8))
+	assert hoja.celdas[(5, 0)] == 'viejo' and hoja.celdas[(5, 2)] == 'viejo'
+	assert hoja.celdas[(2, 1)] == 11
+
+
+def test_columnas_vacias_y_formato():
+	hoja = HojaSimulada()
+	hoja.celdas = {(f, 1): 'viejo' for f in range(1, hoja.filas)}
+	escribir(hoja, tabla(4), columnas_vacias=(1,), columnas_formato=(2,))
+	assert not any(c == 1 for _f, c in hoja.celdas)
+	assert hoja.formatos == {(f, 2): '#,##0' for f in range(1, hoja.filas)}
+
+
+def test_sin_nada_que_hacer_devuelve_none():
+	assert qliktabs.compilar_escritura_sheets('Hoja', 7, 10, [], clear=False) == (None, None)
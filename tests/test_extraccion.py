@@ -0,0 +1,60 @@
+"""`extract_excel_contents` reproduce los JSON dorados a partir de un .xlsx equivalente."""
+from __future__ import annotations
+
+import io
+import json
+import re
+from pathlib import Path
+
+import pytest
+from openpyxl import Workbook
+
+import qliktabs
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+_RE_ENTERO = re.compile(r'^-?\d+$')
+_RE_NUMERO_ES = re.compile(r'^-?\d{1,3}(?:\.\d{3})*(?:,\d+)?$')
+
+
+def _celda(texto: str) -> tuple[object, str]:
+	"""Valor y `number_format` que Qlik pondría en el .xlsx para mostrar `texto`."""
+	if texto.endswith('%'):
+		return float(texto[:-1].replace(',', '.')) / 100, '0.0%'
+	if _RE_ENTERO.match(texto):
+		# columnas de moneda: el export las muestra como número limpio
+		return int(texto), '"$"#,##0'
+	if _RE_NUMERO_ES.match(texto):
+		return float(texto.replace('.', '').replace(',', '.')), 'General'
+	return texto, 'General'
+
+
+def _libro(datos: dict) -> io.BytesIO:
+	wb = Workbook()
+	wb.remove(wb.active)
+	for hoja, filas in datos.items():
+		ws = wb.create_sheet(hoja)
+		cabecera = list(filas[0])
+		ws.append(cabecera)
+		for i, fila in enumerate(filas, start=2):
+			for j, col in enumerate(cabecera, start=1):
+				valor, formato = _celda(fila[col])
+				celda = ws.cell(row=i, column=j, value=valor)
+				celda.number_format = formato
+	buf = io.BytesIO()
+	wb.save(buf)
+	buf.seek(0)
+	return buf
+
+
+@pytest.mark.parametrize('fixture', ['exported_data.json', 'exported_data_2.json'])
+def test_extraccion_reproduce_fixture(fixture):
+	datos = json.loads((RAIZ / fixture).read_text(encoding='utf-8'))
+	assert qliktabs.extract_excel_contents(_libro(datos)) == datos
+
+
+def test_extraccion_desde_ruta(tmp_path):
+	datos = json.loads((RAIZ / 'exported_data_2.json').read_text(encoding='utf-8'))
+	ruta = tmp_path / 'export.xlsx'
+	ruta.write_bytes(_libro(datos).getvalue())
+	assert qliktabs.extract_excel_contents(str(ruta)) == datos
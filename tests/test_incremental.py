@@ -0,0 +1,130 @@
+"""Serie diaria incremental: días, marca, fusión con la serie previa y subida en delta."""
+from __future__ import annotations
+
+import json
+from datetime import date, datetime
+from pathlib import Path
+
+import pytest
+
+import qliktabs
+from sheets_simulados import HojaSimulada, LibroFalso
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+
+def _dias() -> list[dict]:
+	return json.loads((RAIZ / 'exported_data_2.json').read_text(encoding='utf-8'))['Sheet1']
+
+
+def _job(tmp_path, **kw) -> qliktabs.ExportJob:
+	datos = dict(name='ventas_diarias', app_id='app', sheet_id='hoja', grid_selector='#grid',
+		output_json=str(tmp_path / 'serie.json'), sheet_tab='Sheet1', incremental=True)
+	datos.update(kw)
+	return qliktabs.ExportJob(**datos)
+
+
+@pytest.fixture(autouse=True)
+def rutas(monkeypatch, tmp_path):
+	monkeypatch.setenv('QLIK_INCREMENTAL', str(tmp_path / 'marcas.json'))
+	monkeypatch.setenv('QLIK_SHEETS_SNAPSHOT', str(tmp_path / 'snapshot.json'))
+
+
+@pytest.mark.parametrize('valor, esperada', [
+	('01_Ene_26', date(2026, 1, 1)),
+	('31_Dic_25', date(2025, 12, 31)),
+	('29_Feb_24', date(2024, 2, 29)),
+	(' 28-feb-2026 ', date(2026, 2, 28)),
+	('2026-01-31', date(2026, 1, 31)),
+	(datetime(2026, 3, 1, 12, 0), date(2026, 3, 1)),
+	('30_Feb_26', None),
+	('01_Foo_26', None),
+	('Total', None),
+	('', None),
+	(None, None),
+])
+def test_fecha_de_dia(valor, esperada):
+	assert qliktabs.fecha_de_dia(valor) == esperada
+
+
+def test_formato_dia_ida_y_vuelta():
+	for dia in (date(2026, 1, 1), date(2025, 12, 31), date(2024, 2, 29)):
+		assert qliktabs.fecha_de_dia(qliktabs.formato_dia(dia)) == dia
+
+
+def _preparar_serie(job, filas: list[dict], marca: date) -> None:
+	Path(job.output_json).write_text(json.dumps({'Sheet1': filas}), encoding='utf-8')
+	qliktabs.guardar_marca_incremental(job.name, marca)
+
+
+def test_serie_incremental_en_el_cambio_de_mes(tmp_path):
+	job = _job(tmp_path)
+	enero = _dias()
+	_preparar_serie(job, enero, date(2026, 1, 31))
+	# el 1 de febrero se sigue leyendo enero (mes anterior): la serie vale
+	serie = qliktabs.serie_incremental(job, hoy=datetime(2026, 2, 1, 6, 0))
+	assert serie is not None and serie.marca == date(2026, 1, 31) and len(serie.filas) == 31
+	# en marzo el periodo es febrero: se lee el mes completo
+	assert qliktabs.serie_incremental(job, hoy=datetime(2026, 3, 1, 6, 0)) is None
+	# la serie previa no llega a la marca
+	_preparar_serie(job, enero[:20], date(2026, 1, 31))
+	assert qliktabs.serie_incremental(job, hoy=datetime(2026, 2, 1, 6, 0)) is None
+
+
+def test_serie_incremental_sin_marca_o_sin_modo(tmp_path):
+	job = _job(tmp_path)
+	Path(job.output_json).write_text(json.dumps({'Sheet1': _dias()}), encoding='utf-8')
+	assert qliktabs.serie_incremental(job, hoy=datetime(2026, 2, 1)) is None
+	qliktabs.guardar_marca_incremental(job.name, date(2026, 1, 31))
+	assert qliktabs.serie_incremental(_job(tmp_path, incremental=False), hoy=datetime(2026, 2, 1)) is None
+
+
+def test_selecciones_incrementales(tmp_path):
+	serie = qliktabs.SerieIncremental('Sheet1', _dias(), date(2026, 1, 29))
+	assert qliktabs.selecciones_incrementales(_job(tmp_path), serie) == {}
+	assert qliktabs.selecciones_incrementales(_job(tmp_path, day_field='Dia'), serie) == {
+		'Dia': ['29_Ene_26', '30_Ene_26', '31_Ene_26']}
+
+
+def test_fusionar_solapes_dias_nuevos_y_totales(tmp_path):
+	job = _job(tmp_path)
+	previas = _dias()[:10]
+	serie = qliktabs.SerieIncremental('Sheet1', previas, date(2026, 1, 10))
+	extraidas = [
+		{'Día': '10_Ene_26', 'Ventas': '1,00'},  # la marca se relee y se sustituye
+		{'Día': '11_Ene_26', 'Ventas': '2,00'},
+		{'Día': 'Total', 'Ventas': '3,00'},
+	]
+	fusion = qliktabs.fusionar_incremental(job, {'Sheet1': extraidas}, serie)['Sheet1']
+	assert fusion[:9] == previas[:9]
+	assert fusion[9:] == extraidas
+
+
+def test_fusionar_sin_serie_o_vacia(tmp_path):
+	job = _job(tmp_path)
+	extraidas = {'Sheet1': _dias()[:3]}
+	assert qliktabs.fusionar_incremental(job, extraidas, None) is extraidas
+	vacia = qliktabs.SerieIncremental('Sheet1', [], date(2026, 1, 10))
+	assert qliktabs.fusionar_incremental(job, extraidas, vacia) == extraidas
+	# sin filas nuevas se conserva la serie previa hasta la marca
+	serie = qliktabs.SerieIncremental('Sheet1', _dias()[:10], date(2026, 1, 10))
+	assert qliktabs.fusionar_incremental(job, {'Sheet1': []}, serie) == {'Sheet1': _dias()[:9]}
+
+
+def test_fusion_y_delta_solo_suben_los_dias_que_cambian(tmp_path):
+	job = _job(tmp_path)
+	hoja = HojaSimulada(filas=40, titulo='Sheet1')
+	hoja.celdas = {(0, 0): 'fecha', (0, 1): 'Día', (0, 2): 'Ventas'}
+	sh = LibroFalso(hoja)
+	previas = _dias()[:10]
+	assert qliktabs._subir_hoja(sh, 'Sheet1', previas, clear=True, destino=True, delta=True)
+
+	serie = qliktabs.SerieIncremental('Sheet1', previas, date(2026, 1, 10))
+	extraidas = [dict(previas[9], Ventas='1,00')] + _dias()[10:12]
+	fusion = qliktabs.fusionar_incremental(job, {'Sheet1': extraidas}, serie)['Sheet1']
+	assert qliktabs._subir_hoja(sh, 'Sheet1', fusion, clear=True, destino=True, delta=True)
+
+	# sólo el día 10 (releído con otro valor) y los días 11 y 12 (nuevos)
+	assert [b['range'] for b in sh.escrituras[-1]['data']] == ["'Sheet1'!C11", "'Sheet1'!A12"]
+	assert len(sh.escrituras[-1]['data'][1]['values']) == 2
+	assert [hoja.celdas[(f, 1)] for f in (10, 11, 12)] == ['10_Ene_26', '11_Ene_26', '12_Ene_26']
@@ -0,0 +1,32 @@
+"""Selección del mes anterior (`selecciones_mes_anterior`) y el cambio de año."""
+from __future__ import annotations
+
+from datetime import datetime
+
+import pytest
+
+import qliktabs
+
+
+def _job(**kw) -> qliktabs.ExportJob:
+	return qliktabs.ExportJob(name='zonas', app_id='app', sheet_id='hoja', grid_selector='#grid',
+		output_json='zonas.json', sheet_tab='Sheet2', **kw)
+
+
+def test_mes_anterior():
+	assert qliktabs.mes_anterior(datetime(2026, 3, 5)) == (2026, 2)
+	assert qliktabs.mes_anterior(datetime(2026, 1, 5)) == (2025, 12)
+
+
+def test_selecciones_dentro_del_anio():
+	assert qliktabs.selecciones_mes_anterior(_job(), datetime(2026, 3, 5)) == {'Mes': [2]}
+	assert qliktabs.selecciones_mes_anterior(_job(year_field='Año'), datetime(2026, 3, 5)) == {'Mes': [2], 'Año': [2026]}
+
+
+def test_enero_selecciona_el_anio_anterior():
+	assert qliktabs.selecciones_mes_anterior(_job(year_field='Año'), datetime(2026, 1, 5)) == {'Mes': [12], 'Año': [2025]}
+
+
+def test_enero_sin_year_field_falla():
+	with pytest.raises(ValueError, match='year_field'):
+		qliktabs.selecciones_mes_anterior(_job(), datetime(2026, 1, 5))
@@ -0,0 +1,275 @@
+"""Planificador: expresiones cron, recuperación de franjas, timeouts y estado persistido."""
+from __future__ import annotations
+
+import json
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+import planificador
+from planificador import Cron, Planificador, Tarea
+
+
+class Reloj:
+	"""Hora local inyectable que el test avanza a mano."""
+
+	def __init__(self, ahora: datetime):
+		self.ahora = ahora
+
+	def __call__(self) -> datetime:
+		return self.ahora
+
+
+class Ejecuciones:
+	"""`ejecutar` que anota cada lote y cuántos corren a la vez."""
+
+	def __init__(self, ok: bool = True):
+		self.ok = ok
+		self.lotes: list[list[str]] = []
+		self.activas = 0
+		self.max_activas = 0
+		self._lock = threading.Lock()
+
+	def __call__(self, nombres: list[str]) -> dict[str, bool]:
+		with self._lock:
+			self.activas += 1
+			self.max_activas = max(self.max_activas, self.activas)
+			self.lotes.append(list(nombres))
+		try:
+			return {n: self.ok for n in nombres}
+		finally:
+			with self._lock:
+				self.activas -= 1
+
+
+def _franja(p: Planificador, nombre: str) -> str:
+	return p.estado[nombre]['ultima_franja']
+
+
+# --- expresiones cron ---
+
+def test_alias():
+	assert Cron('@daily').siguiente(datetime(2026, 3, 1, 10, 5)) == datetime(2026, 3, 2, 0, 0)
+	assert Cron('@hourly').siguiente(datetime(2026, 3, 1, 10, 0)) == datetime(2026, 3, 1, 11, 0)
+	assert Cron('@weekly').siguiente(datetime(2026, 10, 14, 9, 0)) == datetime(2026, 10, 18, 0, 0)
+	assert Cron('@monthly').siguiente(datetime(2026, 10, 14)) == datetime(2026, 11, 1, 0, 0)
+
+
+def test_rangos_y_pasos():
+	c = Cron('*/15 9-17 * * 1-5')
+	assert c.minutos == [0, 15, 30, 45]
+	assert c.horas == list(range(9, 18))
+	# viernes 17:50 -> lunes 09:00
+	assert c.siguiente(datetime(2026, 10, 16, 17, 50)) == datetime(2026, 10, 19, 9, 0)
+	assert c.siguiente(datetime(2026, 10, 19, 9, 0)) == datetime(2026, 10, 19, 9, 15)
+	# `a/paso` va de `a` hasta el máximo del campo; las listas se combinan
+	assert Cron('5/20 * * * *').minutos == [5, 25, 45]
+	assert Cron('0,30 1-3/2 * * *').horas == [1, 3]
+
+
+def test_domingo_como_0_y_7():
+	assert Cron('0 0 * * 0').dias_semana == Cron('0 0 * * 7').dias_semana == frozenset({7})
+
+
+def test_dia_del_mes_o_de_la_semana():
+	# con ambos restringidos basta con uno: viernes o día 13
+	c = Cron('0 12 13 * 5')
+	assert c.siguiente(datetime(2026, 10, 1, 13, 0)) == datetime(2026, 10, 2, 12, 0)  # viernes 2
+	assert c.siguiente(datetime(2026, 10, 10, 13, 0)) == datetime(2026, 10, 13, 12, 0)  # martes 13
+	# con el día de la semana libre sólo cuenta el día del mes
+	assert Cron('0 12 13 * *').siguiente(datetime(2026, 10, 1)) == datetime(2026, 10, 13, 12, 0)
+	# con el día del mes libre sólo cuenta el día de la semana
+	assert Cron('0 12 * * 5').siguiente(datetime(2026, 10, 3)) == datetime(2026, 10, 9, 12, 0)
+
+
+@pytest.mark.parametrize('texto', ['60 * * * *', '* 24 * * *', '* * 0 * *', '* * * *', '5-1 * * * *', 'x * * * *', '*/0 * * * *'])
+def test_expresiones_invalidas(texto):
+	with pytest.raises(ValueError):
+		Cron(texto)
+
+
+def test_expresion_sin_ocurrencias():
+	with pytest.raises(ValueError):
+		Cron('0 0 31 2 *').siguiente(datetime(2026, 1, 1))
+
+
+def test_tarea_valida_politica():
+	with pytest.raises(ValueError):
+		Tarea('t', '@daily', recuperar='alguna')
+	assert Tarea('t', '0 8 * * *').cron == ['0 8 * * *']
+
+
+# --- recuperación de franjas tras una caída ---
+
+def _caida(recuperar: str, plazo: float | None = None, hasta: datetime = datetime(2026, 10, 16, 12, 10)):
+	"""Planificador horario creado a las 08:30 cuyo reloj salta a `hasta` (equipo apagado entretanto)."""
+	reloj = Reloj(datetime(2026, 10, 16, 8, 30))
+	ejecutar = Ejecuciones()
+	p = Planificador([Tarea('t', '0 * * * *', plazo=plazo, recuperar=recuperar)], ejecutar, reloj=reloj)
+	reloj.ahora = hasta
+	return p, ejecutar
+
+
+def test_recuperar_ultima():
+	p, ejecutar = _caida('ultima')
+	assert p.ciclo() == ['t']
+	assert ejecutar.lotes == [['t']]
+	assert _franja(p, 't') == '2026-10-16T12:00:00'
+	assert p.ciclo() == []
+
+
+def test_recuperar_todas():
+	p, ejecutar = _caida('todas')
+	franjas = []
+	while p.ciclo():
+		franjas.append(_franja(p, 't'))
+	assert franjas == [f'2026-10-16T{h:02d}:00:00' for h in (9, 10, 11, 12)]
+	assert len(ejecutar.lotes) == 4
+
+
+def test_recuperar_todas_dentro_del_plazo():
+	# 90 minutos de plazo a las 12:10: 09:00 y 10:00 caducan, 11:00 y 12:00 se ejecutan
+	p, ejecutar = _caida('todas', plazo=5400)
+	assert p.ciclo() == ['t']
+	assert _franja(p, 't') == '2026-10-16T11:00:00'
+	assert p.ciclo() == ['t']
+	assert p.ciclo() == []
+	assert len(ejecutar.lotes) == 2
+	assert p.estado['t']['resultado'] == 'ok'
+
+
+def test_recuperar_ninguna():
+	p, ejecutar = _caida('ninguna')
+	assert p.ciclo() == []
+	assert ejecutar.lotes == []
+	assert p.estado['t']['resultado'] == 'caducada'
+	assert _franja(p, 't') == '2026-10-16T12:00:00'
+
+
+def test_ninguna_ejecuta_la_franja_a_su_hora():
+	p, ejecutar = _caida('ninguna', hasta=datetime(2026, 10, 16, 12, 1))
+	assert p.ciclo() == ['t']
+	assert _franja(p, 't') == '2026-10-16T12:00:00'
+
+
+def test_tarea_nueva_no_recupera_franjas_anteriores():
+	reloj = Reloj(datetime(2026, 10, 16, 8, 30))
+	p = Planificador([Tarea('t', '0 * * * *')], Ejecuciones(), reloj=reloj)
+	assert p.ciclo() == []
+	assert p.proxima() == datetime(2026, 10, 16, 9, 0)
+
+
+# --- una sola ejecución a la vez ---
+
+def test_tareas_que_vencen_juntas_van_en_un_lote_por_prioridad():
+	reloj = Reloj(datetime(2026, 10, 16, 8, 30))
+	ejecutar = Ejecuciones()
+	tareas = [Tarea('baja', '0 9 * * *'), Tarea('alta', '0 9 * * *', prioridad=5), Tarea('otra', '0 10 * * *')]
+	p = Planificador(tareas, ejecutar, reloj=reloj)
+	reloj.ahora = datetime(2026, 10, 16, 9, 0, 20)
+	assert p.ciclo() == ['alta', 'baja']
+	assert ejecutar.lotes == [['alta', 'baja']]
+	assert ejecutar.max_activas == 1
+
+
+def test_nombres_repetidos():
+	with pytest.raises(ValueError):
+		Planificador([Tarea('t', '@daily'), Tarea('t', '@hourly')], Ejecuciones())
+
+
+def test_ejecutar_ahora_no_mueve_las_franjas():
+	reloj = Reloj(datetime(2026, 10, 16, 8, 30))
+	p = Planificador([Tarea('t', '0 * * * *')], Ejecuciones(ok=False), reloj=reloj)
+	assert p.ejecutar_ahora() == {'t': False}
+	assert _franja(p, 't') == '2026-10-16T08:30:00'
+	assert p.estado['t']['resultado'] == 'fallo'
+
+
+# --- timeout y cancelación ---
+
+def test_timeout_cancela_y_espera_al_final_de_la_ejecucion():
+	liberar = threading.Event()
+	terminada = threading.Event()
+	cancelaciones = []
+
+	def ejecutar(nombres):
+		liberar.wait(5.0)
+		time.sleep(0.05)  # la ejecución tarda algo en salir tras la cancelación
+		terminada.set()
+		return {n: True for n in nombres}
+
+	def cancelar():
+		cancelaciones.append(time.monotonic())
+		liberar.set()
+
+	reloj = Reloj(datetime(2026, 10, 16, 8, 30))
+	p = Planificador([Tarea('t', '0 9 * * *', timeout=0.1)], ejecutar, cancelar=cancelar, reloj=reloj)
+	reloj.ahora = datetime(2026, 10, 16, 9, 0)
+	assert p.ejecutar_ahora() == {'t': False}
+	assert len(cancelaciones) == 1
+	# sin solapes: no se vuelve hasta que la ejecución cancelada ha terminado
+	assert terminada.is_set()
+	assert p.estado['t']['resultado'] == 'timeout'
+	assert 'en_curso' not in p.estado['t']
+
+
+def test_timeout_del_lote_es_la_suma(monkeypatch):
+	esperas = []
+	join = threading.Thread.join
+
+	def _join(hilo, timeout=None):
+		esperas.append(timeout)
+		return join(hilo, timeout)
+	monkeypatch.setattr(threading.Thread, 'join', _join)
+	p = Planificador([Tarea('a', '@daily', timeout=30), Tarea('b', '@daily', timeout=12), Tarea('c', '@daily')], Ejecuciones())
+	p.ejecutar_ahora()
+	assert esperas[0] == 42
+
+
+def test_excepcion_en_ejecutar_cuenta_como_fallo():
+	def ejecutar(nombres):
+		raise RuntimeError('navegador caído')
+	p = Planificador([Tarea('t', '@daily')], ejecutar)
+	assert p.ejecutar_ahora() == {'t': False}
+	assert p.estado['t']['resultado'] == 'fallo'
+
+
+# --- estado persistido ---
+
+def test_estado_recupera_franjas_tras_reinicio(tmp_path):
+	ruta = tmp_path / 'estado' / 'planificador.json'
+	reloj = Reloj(datetime(2026, 10, 16, 8, 30))
+	p = Planificador([Tarea('t', '0 * * * *')], Ejecuciones(), estado=ruta, reloj=reloj)
+	reloj.ahora = datetime(2026, 10, 16, 9, 0, 30)
+	assert p.ciclo() == ['t']
+	guardado = json.loads(ruta.read_text(encoding='utf-8'))
+	assert guardado['t']['ultima_franja'] == '2026-10-16T09:00:00'
+	assert guardado['t']['resultado'] == 'ok'
+
+	# el proceso se reinicia a las 11:30: se recupera la última franja perdida, no se empieza desde ahora
+	reloj.ahora = datetime(2026, 10, 16, 11, 30)
+	ejecutar = Ejecuciones()
+	p = Planificador([Tarea('t', '0 * * * *'), Tarea('nueva', '0 * * * *')], ejecutar, estado=ruta, reloj=reloj)
+	assert _franja(p, 'nueva') == '2026-10-16T11:30:00'
+	assert p.ciclo() == ['t']
+	assert _franja(p, 't') == '2026-10-16T11:00:00'
+
+
+def test_estado_con_ejecucion_interrumpida(tmp_path, caplog):
+	ruta = tmp_path / 'planificador.json'
+	ruta.write_text(json.dumps({'t': {'ultima_franja': '2026-10-16T09:00:00', 'en_curso': '2026-10-16T09:00:05'}}), encoding='utf-8')
+	with caplog.at_level('WARNING', logger=planificador.__name__):
+		p = Planificador([Tarea('t', '0 * * * *')], Ejecuciones(), estado=ruta, reloj=Reloj(datetime(2026, 10, 16, 9, 30)))
+	assert 'en_curso' not in p.estado['t']
+	assert 'no terminó' in caplog.text
+	assert 'en_curso' not in json.loads(ruta.read_text(encoding='utf-8'))['t']
+
+
+def test_estado_ilegible_empieza_de_cero(tmp_path):
+	ruta = tmp_path / 'planificador.json'
+	ruta.write_text('{roto', encoding='utf-8')
+	p = Planificador([Tarea('t', '0 * * * *')], Ejecuciones(), estado=ruta, reloj=Reloj(datetime(2026, 10, 16, 9, 30)))
+	assert _franja(p, 't') == '2026-10-16T09:30:00'
+	assert json.loads(ruta.read_text(encoding='utf-8'))['t']['ultima_franja'] == '2026-10-16T09:30:00'
@@ -0,0 +1,180 @@
+"""`qlik_engine` contra un motor simulado: se sustituye `QixSession.call`, sin WebSocket."""
+from __future__ import annotations
+
+import pytest
+
+import qlik_engine
+import qliktabs
+
+
+class MotorFalso:
+	"""Respuestas del motor para un objeto con hipercubo de `filas` (lista de filas de celdas qMatrix)."""
+
+	def __init__(self, info: list[dict], filas: list[list[dict]], column_order: list | None = None,
+			open_doc_error: int | None = None, active_id: str = 'app-1', total: int | None = None,
+			rechazar: bool = False):
+		self.info, self.filas = info, filas
+		self.rechazar = rechazar
+		self.total = len(filas) if total is None else total
+		self.column_order = column_order
+		self.open_doc_error = open_doc_error
+		self.active_id = active_id
+		self.llamadas: list[tuple] = []
+
+	def call(self, method: str, handle: int, params=None) -> dict:
+		self.llamadas.append((method, handle, params))
+		if method == 'OpenDoc':
+			if self.open_doc_error is not None:
+				raise qlik_engine.QixError('OpenDoc: App already open', self.open_doc_error)
+			return {'qReturn': {'qHandle': 1}}
+		if method == 'GetActiveDoc':
+			return {'qReturn': {'qHandle': 1, 'qGenericId': self.active_id}}
+		if method == 'GetObject':
+			return {'qReturn': {'qHandle': 2}}
+		if method == 'GetField':
+			return {'qReturn': {'qHandle': 3}}
+		if method == 'SelectValues':
+			return {'qReturn': not self.rechazar}
+		if method == 'Clear':
+			return {'qReturn': True}
+		if method == 'GetLayout':
+			cubo = {
+				'qDimensionInfo': [i for i in self.info if i.get('dim')],
+				'qMeasureInfo': [i for i in self.info if not i.get('dim')],
+				'qSize': {'qcx': len(self.info), 'qcy': self.total},
+			}
+			if self.column_order is not None:
+				cubo['qColumnOrder'] = self.column_order
+			return {'qLayout': {'qHyperCube': cubo}}
+		if method == 'GetHyperCubeData':
+			pagina = params['qPages'][0]
+			return {'qDataPages': [{'qMatrix': self.filas[pagina['qTop']:pagina['qTop'] + pagina['qHeight']]}]}
+		raise AssertionError(f'llamada inesperada {method}')
+
+
+def _sesion(motor: MotorFalso) -> qlik_engine.QixSession:
+	sesion = qlik_engine.QixSession.__new__(qlik_engine.QixSession)
+	sesion.call = motor.call
+	sesion._ws = None
+	return sesion
+
+
+def _texto(t: str) -> dict:
+	return {'qText': t, 'qNum': 'NaN'}
+
+
+def _paginas(motor: MotorFalso) -> list[tuple[int, int]]:
+	return [(p['qPages'][0]['qTop'], p['qPages'][0]['qHeight']) for m, _h, p in motor.llamadas if m == 'GetHyperCubeData']
+
+
+def test_paginacion(monkeypatch):
+	monkeypatch.setattr(qlik_engine, 'MAX_CELDAS_PAGINA', 30)
+	info = [{'qFallbackTitle': t, 'dim': True} for t in ('A', 'B', 'C')]
+	filas = [[_texto(f'{i}-{j}') for j in range(3)] for i in range(25)]
+	motor = MotorFalso(info, filas)
+	headers, rows = qlik_engine.extract_hypercube(_sesion(motor), 2)
+	assert headers == ['A', 'B', 'C']
+	assert rows == [[f'{i}-{j}' for j in range(3)] for i in range(25)]
+	# 30 celdas por página con 3 columnas: páginas de 10 filas
+	assert _paginas(motor) == [(0, 10), (10, 10), (20, 5)]
+
+
+def test_pagina_vacia_corta_la_lectura():
+	# qcy dice 3, pero el motor sólo devuelve una fila
+	motor = MotorFalso([{'qFallbackTitle': 'A', 'dim': True}], [[_texto('x')]], total=3)
+	_headers, rows = qlik_engine.extract_hypercube(_sesion(motor), 2)
+	assert rows == [['x']]
+	assert _paginas(motor) == [(0, 3), (1, 2)]
+
+
+@pytest.mark.parametrize('orden, esperado', [
+	([2, 0, 1], ['Medida', 'Zona', 'Mes']),
+	(None, ['Zona', 'Mes', 'Medida']),
+	([0, 0, 1], ['Zona', 'Mes', 'Medida']),  # orden inválido: se ignora
+])
+def test_column_order(orden, esperado):
+	info = [{'qFallbackTitle': 'Zona', 'dim': True}, {'qFallbackTitle': 'Mes', 'dim': True}, {'qFallbackTitle': 'Medida'}]
+	fila = {'Zona': _texto('ZONA X'), 'Mes': _texto('Ene'), 'Medida': {'qText': '$ 1.234', 'qNum': 1234}}
+	motor = MotorFalso(info, [[fila['Zona'], fila['Mes'], fila['Medida']]], column_order=orden)
+	headers, rows = qlik_engine.extract_hypercube(_sesion(motor), 2)
+	assert headers == esperado
+	# sin `formatear`: qText, con la moneda como número limpio
+	textos = {'Zona': 'ZONA X', 'Mes': 'Ene', 'Medida': '1234'}
+	assert rows == [[textos[h] for h in esperado]]
+
+
+def test_formato_como_el_xlsx():
+	info = [
+		{'qFallbackTitle': 'Zona', 'dim': True},
+		{'qFallbackTitle': 'Ventas', 'qNumFormat': {'qType': 'M', 'qnDec': 0, 'qFmt': '$#.##0'}},
+		{'qFallbackTitle': 'Crec.', 'qNumFormat': {'qType': 'F', 'qnDec': 1, 'qFmt': '0,0%'}},
+		{'qFallbackTitle': 'Importe', 'qNumFormat': {'qType': 'F', 'qnDec': 2, 'qFmt': '#.##0,00'}},
+		{'qFallbackTitle': 'Fecha', 'qNumFormat': {'qType': 'D', 'qFmt': 'DD/MM/YYYY'}},
+		{'qFallbackTitle': 'Nota'},
+	]
+	filas = [[
+		_texto('ZONA X'),
+		{'qText': '$5.392.953', 'qNum': 5392953},
+		{'qText': '-3,2%', 'qNum': -0.032},
+		{'qText': '3.522.290,60', 'qNum': 3522290.6},
+		{'qText': '01/01/2026', 'qNum': 46023},
+		{'qText': '-', 'qIsNull': True},
+	]]
+	motor = MotorFalso(info, filas)
+	_headers, rows = qlik_engine.extract_hypercube(_sesion(motor), 2, qliktabs.format_cell_display)
+	assert rows == [['ZONA X', '5392953', '-3,2%', '3.522.290,60', '2026-01-01T00:00:00', '']]
+
+
+@pytest.mark.parametrize('num_format, esperado', [
+	(None, 'General'),
+	({'qType': 'M', 'qnDec': 2}, '"$"#,##0.00'),
+	({'qType': 'F', 'qFmt': '#.##0,0%'}, '0.0%'),
+	({'qType': 'F', 'qFmt': '0%'}, '0%'),
+	({'qType': 'TS'}, 'yyyy-mm-dd hh:mm:ss'),
+	({'qType': 'T'}, 'hh:mm:ss'),
+])
+def test_formato_excel(num_format, esperado):
+	assert qlik_engine.formato_excel(num_format) == esperado
+
+
+def test_open_or_get_active_doc():
+	motor = MotorFalso([], [], open_doc_error=qlik_engine.APP_YA_ABIERTA)
+	assert _sesion(motor).open_or_get_active_doc('app-1') == 1
+	assert [m for m, _h, _p in motor.llamadas] == ['OpenDoc', 'GetActiveDoc']
+
+	with pytest.raises(qlik_engine.QixError):
+		_sesion(MotorFalso([], [], open_doc_error=qlik_engine.APP_YA_ABIERTA, active_id='otra')).open_or_get_active_doc('app-1')
+	with pytest.raises(qlik_engine.QixError):
+		_sesion(MotorFalso([], [], open_doc_error=1001)).open_or_get_active_doc('app-1')
+
+
+def test_extract_object_contents_limpia_campos_aunque_falle(monkeypatch):
+	motor = MotorFalso([{'qFallbackTitle': 'A', 'dim': True}], [[_texto('x')]])
+	monkeypatch.setattr(qlik_engine.QixSession, '__init__', lambda self, *a, **kw: None)
+	monkeypatch.setattr(qlik_engine.QixSession, 'call', lambda self, *a: motor.call(*a))
+	monkeypatch.setattr(qlik_engine.QixSession, 'close', lambda self: None)
+
+	datos = qlik_engine.extract_object_contents('https://qlik', 'app-1', 'obj', selections={'Día': [1, 2]}, clear_fields=['Día'])
+	assert datos == {'Sheet1': [{'A': 'x'}]}
+	metodos = [m for m, _h, _p in motor.llamadas]
+	assert metodos.index('SelectValues') < metodos.index('GetHyperCubeData') < metodos.index('Clear')
+
+	motor.llamadas.clear()
+	monkeypatch.setattr(qlik_engine, 'extract_hypercube', lambda *a: 1 / 0)
+	with pytest.raises(ZeroDivisionError):
+		qlik_engine.extract_object_contents('https://qlik', 'app-1', 'obj', clear_fields=['Día'])
+	assert [m for m, _h, _p in motor.llamadas][-2:] == ['GetField', 'Clear']
+
+
+def test_extract_object_contents_falla_si_se_rechaza_la_seleccion(monkeypatch):
+	motor = MotorFalso([{'qFallbackTitle': 'A', 'dim': True}], [[_texto('x')]], rechazar=True)
+	monkeypatch.setattr(qlik_engine.QixSession, '__init__', lambda self, *a, **kw: None)
+	monkeypatch.setattr(qlik_engine.QixSession, 'call', lambda self, *a: motor.call(*a))
+	monkeypatch.setattr(qlik_engine.QixSession, 'close', lambda self: None)
+
+	with pytest.raises(qlik_engine.QixError, match='Mes'):
+		qlik_engine.extract_object_contents('https://qlik', 'app-1', 'obj', selections={'Mes': [12]}, clear_fields=['Día'])
+	metodos = [m for m, _h, _p in motor.llamadas]
+	# no se lee el hipercubo, pero sí se limpian los campos
+	assert 'GetHyperCubeData' not in metodos
+	assert metodos[-1] == 'Clear'
@@ -0,0 +1,60 @@
+"""run_once: una ejecución sin sesión no ejecuta jobs y los da por fallidos."""
+from __future__ import annotations
+
+import pytest
+
+import qliktabs
+
+
+class DriverFalso:
+	def __init__(self):
+		self.cerrado = False
+
+	def quit(self):
+		self.cerrado = True
+
+
+@pytest.fixture
+def entorno(monkeypatch):
+	monkeypatch.setenv('QLIK_INFORMES_DIR', '0')
+	monkeypatch.setenv('QLIK_SUBIDA_ASINCRONA', '0')
+	drivers, lotes = [], []
+
+	def _setup_driver(download_dir=None):
+		drivers.append(DriverFalso())
+		return drivers[-1]
+
+	def _ejecutar_jobs_run(driver, jobs, concurrencia, downloads_root, subidas=None):
+		lotes.append([j.name for j in jobs])
+		resultados = {}
+		for j in jobs:
+			with qliktabs.trazas.tramo('job', job=j.name):
+				resultados[j.name] = True
+		return resultados
+	monkeypatch.setattr(qliktabs, 'setup_driver', _setup_driver)
+	monkeypatch.setattr(qliktabs, '_ejecutar_jobs_run', _ejecutar_jobs_run)
+	return drivers, lotes
+
+
+def _jobs() -> list[qliktabs.ExportJob]:
+	return [qliktabs.ExportJob(name=n, app_id='app', sheet_id='hoja', grid_selector='#grid', output_json=f'{n}.json', sheet_tab='Sheet1') for n in ('ventas', 'stock')]
+
+
+def test_login_fallido_no_ejecuta_jobs(monkeypatch, entorno, caplog):
+	drivers, lotes = entorno
+	monkeypatch.setattr(qliktabs, 'autenticar', lambda driver, url: False)
+	with caplog.at_level('INFO', logger=qliktabs.LOG.name):
+		traza = qliktabs.run_once(_jobs())
+	assert lotes == []
+	assert drivers[0].cerrado
+	assert [(t.nombre, t.ok) for t in traza.tramos] == [('autenticar', False)]
+	assert 'ventas=fallo, stock=fallo' in caplog.text
+	assert qliktabs.ejecutar_por_nombre(_jobs(), ['ventas', 'stock']) == {'ventas': False, 'stock': False}
+
+
+def test_login_correcto_ejecuta_jobs(monkeypatch, entorno):
+	drivers, lotes = entorno
+	monkeypatch.setattr(qliktabs, 'autenticar', lambda driver, url: True)
+	assert qliktabs.ejecutar_por_nombre(_jobs(), ['stock', 'ventas']) == {'stock': True, 'ventas': True}
+	assert lotes == [['stock', 'ventas']]
+	assert drivers[0].cerrado
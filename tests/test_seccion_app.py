@@ -0,0 +1,56 @@
+"""Tramo selección -> exportación compartido por los workers paralelos (`_seccion_app`)."""
+from __future__ import annotations
+
+import threading
+import time
+
+import qliktabs
+
+
+def _entrar(app_id: str, selecciones: dict, dentro: list, salida: threading.Event) -> None:
+	with qliktabs._seccion_app(app_id, selecciones):
+		dentro.append(selecciones)
+		salida.wait(5)
+
+
+def _hilo(*args) -> threading.Thread:
+	hilo = threading.Thread(target=_entrar, args=args, daemon=True)
+	hilo.start()
+	return hilo
+
+
+def _esperar(condicion, limite: float = 2.0) -> bool:
+	fin = time.monotonic() + limite
+	while time.monotonic() < fin:
+		if condicion():
+			return True
+		time.sleep(0.01)
+	return condicion()
+
+
+def test_mismas_selecciones_entran_a_la_vez():
+	dentro, salida = [], threading.Event()
+	hilos = [_hilo('app-mismas', {'Mes': [12]}, dentro, salida) for _ in range(3)]
+	assert _esperar(lambda: len(dentro) == 3)
+	salida.set()
+	for h in hilos:
+		h.join(5)
+
+
+def test_selecciones_distintas_esperan():
+	dentro, salida = [], threading.Event()
+	primero = _hilo('app-distintas', {'Mes': [12]}, dentro, salida)
+	assert _esperar(lambda: len(dentro) == 1)
+	hecho = threading.Event()
+	hecho.set()
+	segundo = _hilo('app-distintas', {'Mes': [12], 'Día': ['30_Dic_25']}, dentro, hecho)
+	# otra app no se ve afectada
+	otra = _hilo('app-otra', {'Mes': [11]}, dentro, salida)
+	assert _esperar(lambda: len(dentro) == 2)
+	time.sleep(0.1)
+	assert {'Mes': [12], 'Día': ['30_Dic_25']} not in dentro
+	salida.set()
+	primero.join(5)
+	otra.join(5)
+	assert _esperar(lambda: len(dentro) == 3)
+	segundo.join(5)
@@ -0,0 +1,78 @@
+"""Cola de subidas a Google Sheets (`ColaSubidas`)."""
+from __future__ import annotations
+
+import time
+from datetime import date
+
+import pytest
+
+import qliktabs
+import trazas
+
+
+def _job(nombre: str = 'zonas', **kw) -> qliktabs.ExportJob:
+	datos = dict(name=nombre, app_id='app', sheet_id='hoja', grid_selector='#grid',
+		output_json=f'{nombre}.json', sheet_tab='Sheet2')
+	datos.update(kw)
+	return qliktabs.ExportJob(**datos)
+
+
+def test_sin_credenciales_se_omite_sin_reintentos(monkeypatch):
+	monkeypatch.setenv('GOOGLE_SERVICE_ACCOUNT_JSON', '')
+	traza = trazas.iniciar_traza()
+	try:
+		inicio = time.monotonic()
+		cola = qliktabs.ColaSubidas(reintentos=3)
+		cola.enviar(_job(), {'Sheet1': [{'a': 1}]})
+		[estado] = cola.cerrar(timeout=10)
+	finally:
+		trazas.terminar_traza()
+	assert estado.omitida and not estado.ok and estado.intentos == 1
+	assert time.monotonic() - inicio < 1.0
+	[tramo] = [t for t in traza.tramos if t.nombre == 'subida']
+	assert tramo.ok and tramo.rama == 'omitida' and tramo.reintentos == 0
+
+
+def test_fallo_se_reintenta(monkeypatch):
+	llamadas = []
+	monkeypatch.setattr(qliktabs, '_maybe_auto_upload', lambda *a, **kw: llamadas.append(a) or len(llamadas) == 2)
+	cola = qliktabs.ColaSubidas(reintentos=3, espera_base=0.0)
+	cola.enviar(_job(), {'Sheet1': []})
+	[estado] = cola.cerrar(timeout=10)
+	assert estado.ok and not estado.omitida and estado.intentos == 2
+
+
+def _job_incremental(tmp_path) -> qliktabs.ExportJob:
+	return _job('ventas_diarias', incremental=True, output_json=str(tmp_path / 'serie.json'))
+
+
+@pytest.fixture
+def marcas(monkeypatch, tmp_path):
+	monkeypatch.setenv('QLIK_INCREMENTAL', str(tmp_path / 'marcas.json'))
+
+
+_SERIE = {'Sheet1': [{'Día': '01_Ene_26', 'Ventas': '1'}, {'Día': '02_Ene_26', 'Ventas': '2'}]}
+
+
+@pytest.mark.parametrize('subida, marca, ok', [
+	(True, date(2026, 1, 2), True),
+	(None, date(2026, 1, 2), True),
+	(False, None, False),
+])
+def test_marca_tras_subida_sincrona(monkeypatch, tmp_path, marcas, subida, marca, ok):
+	monkeypatch.setattr(qliktabs, '_maybe_auto_upload', lambda *a, **kw: subida)
+	job = _job_incremental(tmp_path)
+	assert qliktabs._publicar_resultado(job, _SERIE) is ok
+	assert qliktabs.cargar_marca_incremental(job.name) == marca
+
+
+@pytest.mark.parametrize('subida, marca', [(True, date(2026, 1, 2)), (False, None)])
+def test_marca_tras_subida_encolada(monkeypatch, tmp_path, marcas, subida, marca):
+	monkeypatch.setattr(qliktabs, '_maybe_auto_upload', lambda *a, **kw: subida)
+	job = _job_incremental(tmp_path)
+	cola = qliktabs.ColaSubidas(reintentos=2, espera_base=0.0)
+	assert qliktabs._publicar_resultado(job, _SERIE, subidas=cola)
+	# encolada: la marca espera a la subida
+	[estado] = cola.cerrar(timeout=10)
+	assert estado.ok is subida
+	assert qliktabs.cargar_marca_incremental(job.name) == marca
@@ -0,0 +1,138 @@
+"""Trazas: anidamiento de tramos, hilos, `medido` y anotaciones."""
+from __future__ import annotations
+
+import json
+import threading
+
+import pytest
+
+import trazas
+from trazas import anotar_rama, anotar_reintento, medido, tramo
+
+
+@pytest.fixture
+def traza():
+	t = trazas.iniciar_traza()
+	yield t
+	trazas.terminar_traza()
+
+
+def _por_nombre(traza) -> dict:
+	return {t.nombre: t for t in traza.tramos}
+
+
+def test_tramos_anidados_heredan_job_y_padre(traza):
+	with tramo('job', job='ventas') as exterior:
+		with tramo('extraccion') as medio:
+			assert trazas._pila() == [exterior, medio]
+			with tramo('descarga', job='otro'):
+				pass
+	assert trazas._pila() == []
+	t = _por_nombre(traza)
+	assert (t['job'].padre, t['job'].job) == (None, 'ventas')
+	assert (t['extraccion'].padre, t['extraccion'].job) == ('job', 'ventas')
+	assert (t['descarga'].padre, t['descarga'].job) == ('extraccion', 'otro')
+	# se registran al cerrarse: de dentro hacia fuera
+	assert [x.nombre for x in traza.tramos] == ['descarga', 'extraccion', 'job']
+	assert t['job'].segundos >= t['extraccion'].segundos >= t['descarga'].segundos
+
+
+def test_excepcion_marca_el_tramo_y_vacia_la_pila(traza):
+	with pytest.raises(RuntimeError):
+		with tramo('job'):
+			with tramo('paso'):
+				raise RuntimeError('fallo')
+	assert trazas._pila() == []
+	assert [(x.nombre, x.ok) for x in traza.tramos] == [('paso', False), ('job', False)]
+
+
+def test_sin_traza_no_se_registra():
+	assert trazas.terminar_traza() is None
+	with tramo('suelto') as t:
+		pass
+	assert t.segundos >= 0
+	assert trazas.terminar_traza() is None
+
+
+def test_tramos_de_varios_hilos_en_la_traza_compartida(traza):
+	hilos, por_hilo = 8, 50
+	barrera = threading.Barrier(hilos)
+
+	def trabajar(i: int):
+		barrera.wait()
+		for _ in range(por_hilo):
+			with tramo('job', job=f'job{i}'):
+				with tramo('paso'):
+					anotar_reintento()
+	workers = [threading.Thread(target=trabajar, args=(i,), name=f'worker-{i}') for i in range(hilos)]
+	with tramo('ejecucion'):
+		for w in workers:
+			w.start()
+		for w in workers:
+			w.join()
+	assert len(traza.tramos) == hilos * por_hilo * 2 + 1
+	# cada hilo tiene su propia pila: los pasos no cuelgan de 'ejecucion' ni de jobs de otro hilo
+	for t in traza.tramos:
+		if t.nombre == 'paso':
+			assert t.padre == 'job'
+			assert t.job == f'job{t.hilo.rsplit("-", 1)[1]}'
+		elif t.nombre == 'job':
+			assert t.padre is None
+	resumen = {g['paso']: g for g in traza.resumen()}
+	assert resumen['paso']['veces'] == hilos * por_hilo
+	assert resumen['paso']['reintentos'] == hilos * por_hilo
+
+
+@pytest.mark.parametrize('valor, ok', [(None, False), (False, False), (True, True), (0, True), ([], True), ('ruta', True)])
+def test_medido_cuenta_none_y_false_como_fallo(traza, valor, ok):
+	@medido('paso')
+	def paso():
+		return valor
+	assert paso() is valor
+	[t] = traza.tramos
+	assert (t.nombre, t.ok) == ('paso', ok)
+
+
+def test_medido_conserva_nombre_y_propaga_excepciones(traza):
+	@medido('paso')
+	def extraer():
+		"""Doc."""
+		raise ValueError('x')
+	assert extraer.__name__ == 'extraer'
+	with pytest.raises(ValueError):
+		extraer()
+	assert not traza.tramos[0].ok
+
+
+def test_anotaciones_van_al_tramo_en_curso(traza):
+	anotar_reintento()
+	anotar_rama('sin tramo')  # fuera de un tramo no hace nada
+	with tramo('job'):
+		with tramo('descarga'):
+			anotar_reintento()
+			anotar_reintento(2)
+			anotar_rama('http')
+			anotar_rama('navegador')
+		anotar_rama('motor')
+	t = _por_nombre(traza)
+	assert (t['descarga'].reintentos, t['descarga'].rama) == (3, 'navegador')
+	assert (t['job'].reintentos, t['job'].rama) == (0, 'motor')
+
+
+def test_resumen_informe_y_guardar(traza, tmp_path):
+	for rama in ('http', 'http', 'navegador'):
+		with tramo('descarga') as t:
+			anotar_rama(rama)
+		t.segundos = 0.0
+	with tramo('subida') as t:
+		t.ok = False
+	[subida] = [g for g in traza.resumen() if g['paso'] == 'subida']
+	assert subida['fallos'] == 1
+	[descarga] = [g for g in traza.resumen() if g['paso'] == 'descarga']
+	assert (descarga['veces'], descarga['ramas']) == (3, {'http': 2, 'navegador': 1})
+	assert 'descarga' in traza.tabla() and 'http=2' in traza.tabla()
+	ruta = traza.guardar(tmp_path / 'trazas')
+	informe = json.loads(ruta.read_text(encoding='utf-8'))
+	assert ruta.name.startswith('run_')
+	assert [t['nombre'] for t in informe['tramos']] == ['descarga'] * 3 + ['subida']
+	assert all(t['inicio'] >= 0 for t in informe['tramos'])
@@ -0,0 +1,187 @@
+"""Tiempos por paso de una ejecución de `qliktabs.run_once`.
+
+Cada paso se envuelve en `tramo(nombre)` (context manager) o `@medido(nombre)`
+(decorador). Un tramo guarda su inicio, la duración, si terminó bien, los
+reintentos y la rama/fallback que se tomó; el propio paso los anota con
+`anotar_reintento` / `anotar_rama`. Los tramos anidados heredan el job del padre.
+
+`iniciar_traza()` abre la traza de la ejecución, compartida por todos los hilos
+(workers paralelos y cola de subidas); sin traza abierta los tramos se miden
+pero no se guardan. Al terminar, `Traza.informe()` da el JSON de la ejecución y
+`Traza.tabla()` el resumen por paso para el log.
+"""
+from __future__ import annotations
+
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+
+
+@dataclass
+class Tramo:
+	"""Un paso medido de la ejecución (`inicio` en epoch, `segundos` de duración)."""
+	nombre: str
+	inicio: float
+	segundos: float = 0.0
+	ok: bool = True
+	reintentos: int = 0
+	rama: str | None = None
+	job: str | None = None
+	padre: str | None = None
+	hilo: str = ''
+
+
+class Traza:
+	"""Tramos registrados durante una ejecución; segura entre hilos."""
+
+	def __init__(self):
+		self.inicio = time.time()
+		self.tramos: list[Tramo] = []
+		self._lock = threading.Lock()
+
+	def registrar(self, t: Tramo) -> None:
+		with self._lock:
+			self.tramos.append(t)
+
+	def resumen(self) -> list[dict]:
+		"""Agregado por nombre de paso, de mayor a menor tiempo total."""
+		with self._lock:
+			tramos = list(self.tramos)
+		grupos: dict[str, dict] = {}
+		for t in tramos:
+			g = grupos.setdefault(t.nombre, {
+				'paso': t.nombre, 'veces': 0, 'total': 0.0, 'media': 0.0, 'max': 0.0,
+				'fallos': 0, 'reintentos': 0, 'ramas': {},
+			})
+			g['veces'] += 1
+			g['total'] += t.segundos
+			g['max'] = max(g['max'], t.segundos)
+			g['fallos'] += 0 if t.ok else 1
+			g['reintentos'] += t.reintentos
+			if t.rama:
+				g['ramas'][t.rama] = g['ramas'].get(t.rama, 0) + 1
+		filas = sorted(grupos.values(), key=lambda g: g['total'], reverse=True)
+		for g in filas:
+			g['media'] = round(g['total'] / g['veces'], 3)
+			g['total'] = round(g['total'], 3)
+			g['max'] = round(g['max'], 3)
+		return filas
+
+	def informe(self) -> dict:
+		with self._lock:
+			tramos = sorted(self.tramos, key=lambda t: t.inicio)
+		return {
+			'inicio': datetime.fromtimestamp(self.inicio).isoformat(timespec='seconds'),
+			'segundos': round(time.time() - self.inicio, 3),
+			'resumen': self.resumen(),
+			'tramos': [
+				dict(asdict(t), inicio=round(t.inicio - self.inicio, 3), segundos=round(t.segundos, 3))
+				for t in tramos
+			],
+		}
+
+	def tabla(self) -> str:
+		"""Resumen por paso en texto, para el log."""
+		lineas = ['%-28s %6s %9s %9s %9s %6s %6s  %s' % ('paso', 'veces', 'total s', 'media s', 'max s', 'fallos', 'reint', 'ramas')]
+		for g in self.resumen():
+			ramas = ', '.join(f'{k}={v}' for k, v in g['ramas'].items())
+			lineas.append('%-28s %6d %9.2f %9.2f %9.2f %6d %6d  %s' % (
+				g['paso'][:28], g['veces'], g['total'], g['media'], g['max'], g['fallos'], g['reintentos'], ramas))
+		return '\n'.join(lineas)
+
+	def guardar(self, directorio: Path) -> Path:
+		"""Escribir el informe como `run_<AAAAMMDD_HHMMSS>.json` en `directorio`."""
+		directorio.mkdir(parents=True, exist_ok=True)
+		path = directorio / f'run_{datetime.fromtimestamp(self.inicio):%Y%m%d_%H%M%S}.json'
+		path.write_text(json.dumps(self.informe(), ensure_ascii=False, indent=2), encoding='utf-8')
+		return path
+
+
+_TRAZA: Traza | None = None
+_LOCAL = threading.local()
+
+
+def iniciar_traza() -> Traza:
+	"""Abrir la traza de la ejecución en curso (sustituye a la anterior)."""
+	global _TRAZA
+	_TRAZA = Traza()
+	return _TRAZA
+
+
+def terminar_traza() -> Traza | None:
+	"""Cerrar y devolver la traza en curso."""
+	global _TRAZA
+	traza, _TRAZA = _TRAZA, None
+	return traza
+
+
+def _pila() -> list[Tramo]:
+	pila = getattr(_LOCAL, 'pila', None)
+	if pila is None:
+		pila = _LOCAL.pila = []
+	return pila
+
+
+@contextmanager
+def tramo(nombre: str, job: str | None = None):
+	"""Medir el bloque como un tramo `nombre`; una excepción lo marca como fallido.
+
+	El bloque puede marcar `t.ok = False` si el paso falla sin excepción.
+	"""
+	pila = _pila()
+	padre = pila[-1] if pila else None
+	t = Tramo(
+		nombre, time.time(),
+		job=job or (padre.job if padre else None),
+		padre=padre.nombre if padre else None,
+		hilo=threading.current_thread().name,
+	)
+	pila.append(t)
+	inicio = time.perf_counter()
+	try:
+		yield t
+	except BaseException:
+		t.ok = False
+		raise
+	finally:
+		t.segundos = time.perf_counter() - inicio
+		pila.pop()
+		traza = _TRAZA
+		if traza is not None:
+			traza.registrar(t)
+
+
+def medido(nombre: str):
+	"""Decorador: ejecutar la función dentro de `tramo(nombre)`.
+
+	Si la función devuelve False o None el tramo cuenta como fallido.
+	"""
+	def decorador(fn):
+		@functools.wraps(fn)
+		def envoltura(*args, **kwargs):
+			with tramo(nombre) as t:
+				resultado = fn(*args, **kwargs)
+				if resultado is False or resultado is None:
+					t.ok = False
+				return resultado
+		return envoltura
+	return decorador
+
+
+def anotar_reintento(n: int = 1) -> None:
+	"""Sumar `n` reintentos al tramo en curso de este hilo (si lo hay)."""
+	pila = _pila()
+	if pila:
+		pila[-1].reintentos += n
+
+
+def anotar_rama(rama: str) -> None:
+	"""Registrar en el tramo en curso qué rama o fallback se tomó."""
+	pila = _pila()
+	if pila:
+		pila[-1].rama = rama